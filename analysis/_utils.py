@@ -0,0 +1,31 @@
+"""
+Вспомогательные функции для анализа текстов.
+"""
+import re
+
+TOKEN_RE = re.compile(r'\b\w+\b')
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Разбивает текст на слова в нижнем регистре.
+
+    Токенизация совпадает с ``re.findall(r'\\b\\w+\\b', text.lower())``,
+    которая используется в m2.py, m3.py, m4.py и e4.py.
+
+    :param text: Исходный текст.
+    :return: Список токенов.
+    """
+    return TOKEN_RE.findall(text.lower())
+
+
+def normalize_phrase(phrase: str) -> tuple[str, ...]:
+    """
+    Приводит фразу из словаря к последовательности токенов. Фраза делится
+    так же, как текст в :func:`tokenize`, иначе статьи с дефисом или
+    запятой ("ich-bewusst") не совпали бы ни с одним отрывком текста.
+
+    :param phrase: Слово или словосочетание из словаря.
+    :return: Кортеж токенов в нижнем регистре.
+    """
+    return tuple(tokenize(phrase))
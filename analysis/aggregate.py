@@ -0,0 +1,271 @@
+"""
+Итоги анализа, обновляемые по документам.
+
+Для каждого документа хранилища сохраняются частичные результаты:
+счётчики анализаторов общего прохода (эмоции, эмоции в контексте
+ключевых слов, модальные частицы) и категории словаря в окнах вокруг
+ключевых слов (``cooccurrence``: ключевое слово -> категории). Рядом
+хранятся итоги по каждому источнику. При обновлении анализируются только
+новые и изменённые документы (по хэшу текста из docs.json), а частичные
+результаты изменённых и удалённых документов вычитаются из итогов,
+поэтому время обновления растёт с числом новых страниц, а не с размером
+корпуса.
+
+Документ определяется источником, id и адресом статьи, а не номером в
+хранилище, так что результаты переживают пересборку корпуса. Адрес нужен
+потому, что все статьи одного видео хранятся под его id. Файл итогов лежит в
+каталоге хранилища, его имя содержит хэш словарей, ключевых слов и
+окна: при их смене итоги считаются заново в новом файле.
+
+Источники bt и bt.txt содержат одни и те же речи, поэтому итоги
+складываются только внутри источника.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Hashable, Iterable, NamedTuple, Optional
+
+from analysis._utils import normalize_phrase
+from analysis.cooccur import CategoryPrefixSums
+from analysis.corpus import CorpusStore
+from analysis.index import PositionalIndex
+from analysis.lexicon import CompiledLexicon
+from analysis.metrics import metrics
+from analysis.pipeline import FusedPipeline, Results
+
+logger = logging.getLogger(__name__)
+
+# Меняется вместе с устройством частичных результатов
+AGGREGATES_VERSION = 3
+COOCCURRENCE = 'cooccurrence'
+
+DocKey = tuple[str, Hashable, Optional[str]]
+
+
+class AggregateDelta(NamedTuple):
+    """
+    Изменения корпуса с прошлого обновления.
+
+    :var added: Новые документы.
+    :var changed: Документы с изменённым текстом.
+    :var removed: Удалённые документы.
+    """
+
+    added: list[DocKey]
+    changed: list[DocKey]
+    removed: list[DocKey]
+
+
+def document_digest(store: CorpusStore, doc_id: int) -> str:
+    """
+    Хэш текста документа из docs.json; для хранилищ, собранных без него, —
+    хэш токенов.
+
+    :param store: Хранилище корпуса.
+    :param doc_id: Номер документа.
+    :return: Хэш.
+    """
+    digest = store.documents[doc_id].get('digest')
+    if digest is None:
+        digest = hashlib.sha256('\n'.join(store.words(doc_id)).encode('utf-8')).hexdigest()
+    return digest
+
+
+def document_analyzer(
+        store: CorpusStore,
+        index: PositionalIndex,
+        pipeline: FusedPipeline,
+        keywords: Iterable[str] = (),
+        lexicon: Optional[CompiledLexicon] = None,
+        window_size: int = 150
+) -> Callable[[int], Results]:
+    """
+    Анализ одного документа: общий проход и категории в окнах вокруг
+    ключевых слов.
+
+    :param store: Хранилище корпуса.
+    :param index: Позиционный индекс хранилища.
+    :param pipeline: Анализаторы общего прохода.
+    :param keywords: Ключевые слова или словосочетания.
+    :param lexicon: Словарь категорий для окон (нужен, если есть ключевые слова);
+        слова считаются по его обратному словарю, как в m2 и m4.
+    :param window_size: Число токенов слева и справа от ключевого слова.
+    :return: Функция: номер документа -> частичные счётчики.
+    """
+    keywords = list(dict.fromkeys(' '.join(normalize_phrase(keyword)) for keyword in keywords))
+    postings: dict[str, dict[int, list[int]]] = {}
+
+    def analyze(doc_id: int) -> Results:
+        words = store.words(doc_id)
+        results = pipeline.process_document(words)
+        if keywords:
+            # Вхождения берутся из индекса один раз на все документы обновления
+            if not postings:
+                postings.update((keyword, index.postings(keyword)) for keyword in keywords)
+            hits = {keyword: postings[keyword][doc_id] for keyword in keywords if doc_id in postings[keyword]}
+            if hits:
+                prefix_sums = CategoryPrefixSums.from_words(words, lexicon.words)
+                results[COOCCURRENCE] = {
+                    keyword: Counter(prefix_sums.window_counts(positions, window_size))
+                    for keyword, positions in hits.items()
+                }
+        return results
+
+    return analyze
+
+
+class DocumentAggregates:
+    """
+    Частичные результаты по документам и итоги по источникам.
+
+    :val path: Файл итогов.
+    :val documents: (источник, id, адрес) -> (хэш текста, частичные счётчики).
+    :val totals: Источник -> суммарные счётчики.
+    """
+
+    path: Path
+    documents: dict[DocKey, tuple[str, Results]]
+    totals: dict[str, Results]
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.documents = {}
+        self.totals = {}
+
+    @classmethod
+    def load(cls, path: Path) -> 'DocumentAggregates':
+        """
+        Читает итоги; при отсутствии или повреждении файла итоги пусты.
+
+        :param path: Файл итогов.
+        :return: Итоги.
+        """
+        aggregates = cls(path)
+        try:
+            with aggregates.path.open('rb') as f:
+                aggregates.documents, aggregates.totals = pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Файл итогов {path} повреждён, итоги будут посчитаны заново: {e}")
+            aggregates.documents, aggregates.totals = {}, {}
+        return aggregates
+
+    def save(self) -> None:
+        tmp = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        with tmp.open('wb') as f:
+            pickle.dump((self.documents, self.totals), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+
+    def _add(self, key: DocKey, digest: str, results: Results) -> None:
+        self.documents[key] = (digest, results)
+        FusedPipeline.merge(self.totals.setdefault(key[0], {}), results)
+
+    def _remove(self, key: DocKey) -> None:
+        _, results = self.documents.pop(key)
+        FusedPipeline.subtract(self.totals[key[0]], results)
+
+    def update(self, store: CorpusStore, analyze: Callable[[int], Results]) -> AggregateDelta:
+        """
+        Приводит итоги в соответствие с хранилищем: анализирует новые и
+        изменённые документы и вычитает результаты изменённых и удалённых.
+
+        :param store: Хранилище корпуса.
+        :param analyze: Анализ документа (см. :func:`document_analyzer`).
+        :return: Изменения корпуса.
+        """
+        current = {}
+        for doc_id, meta in enumerate(store.documents):
+            current[(meta['source'], meta['id'], meta.get('url'))] = doc_id
+
+        removed = [key for key in self.documents if key not in current]
+        for key in removed:
+            self._remove(key)
+
+        added, changed = [], []
+        for key, doc_id in current.items():
+            digest = document_digest(store, doc_id)
+            known = self.documents.get(key)
+            if known is not None and known[0] == digest:
+                continue
+            if known is None:
+                added.append(key)
+            else:
+                changed.append(key)
+                self._remove(key)
+            self._add(key, digest, analyze(doc_id))
+
+        metrics.count('aggregate_documents', len(added) + len(changed))
+        logger.info(f"Итоги обновлены: новых {len(added)}, изменённых {len(changed)}, удалённых {len(removed)}.")
+        return AggregateDelta(added, changed, removed)
+
+    def results(self, source: Optional[str] = None) -> Results:
+        """
+        Итоги по источнику.
+
+        :param source: Имя источника; None — единственный источник корпуса.
+        :return: Суммарные счётчики.
+        """
+        if source is not None:
+            return self.totals.get(source, {})
+        if len(self.totals) > 1:
+            # Сумма по bt и bt.txt посчитала бы каждую речь дважды
+            raise ValueError(f"В корпусе несколько источников ({', '.join(sorted(self.totals))}), укажите один")
+        return next(iter(self.totals.values()), {})
+
+
+def aggregates_path(
+        store: CorpusStore,
+        pipeline: FusedPipeline,
+        keywords: Iterable[str] = (),
+        lexicon: Optional[CompiledLexicon] = None,
+        window_size: int = 150
+) -> Path:
+    """
+    Файл итогов для словарей и параметров анализа.
+
+    :return: Путь в каталоге хранилища.
+    """
+    keywords = list(dict.fromkeys(' '.join(normalize_phrase(keyword)) for keyword in keywords))
+    signature = json.dumps([
+        AGGREGATES_VERSION,
+        [(name, type(analyzer).__qualname__) for name, analyzer in pipeline.analyzers.items()],
+        pipeline.matcher.digest,
+        keywords,
+        lexicon.digest if keywords and lexicon is not None else None,
+        window_size if keywords else None,
+    ])
+    return store.path / f'aggregates-{hashlib.sha256(signature.encode()).hexdigest()[:16]}.pickle'
+
+
+def update_aggregates(
+        store: CorpusStore,
+        index: PositionalIndex,
+        pipeline: FusedPipeline,
+        keywords: Iterable[str] = (),
+        lexicon: Optional[CompiledLexicon] = None,
+        window_size: int = 150
+) -> tuple[DocumentAggregates, AggregateDelta]:
+    """
+    Загружает итоги, обновляет их по хранилищу и сохраняет.
+
+    :param store: Хранилище корпуса.
+    :param index: Позиционный индекс хранилища.
+    :param pipeline: Анализаторы общего прохода.
+    :param keywords: Ключевые слова для категорий в окнах.
+    :param lexicon: Словарь категорий для окон из :func:`analysis.lexicon.load_compiled`.
+    :param window_size: Число токенов слева и справа от ключевого слова.
+    :return: Итоги и изменения корпуса.
+    """
+    keywords = list(keywords)
+    if keywords and lexicon is None:
+        raise ValueError("Для категорий в окнах нужен словарь, загруженный через load_compiled")
+    aggregates = DocumentAggregates.load(aggregates_path(store, pipeline, keywords, lexicon, window_size))
+    delta = aggregates.update(store, document_analyzer(store, index, pipeline, keywords, lexicon, window_size))
+    if delta.added or delta.changed or delta.removed:
+        aggregates.save()
+    return aggregates, delta
@@ -0,0 +1,320 @@
+"""
+Размеченные отрезки контекстов — общий промежуточный формат вывода.
+
+Разметка (поиск вхождений, категории слов окна, класс цвета по первой
+букве категории) выполняется один раз, а результат — последовательность
+разделов :class:`Section` — передаётся любому числу вариантов вывода
+(:mod:`analysis.render`: ANSI, DOCX, HTML, таблицы). Разделы можно
+сохранить в JSON Lines и вывести позже без повторного анализа.
+"""
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Mapping, NamedTuple, Optional, Sequence
+
+from analysis._utils import normalize_phrase
+from analysis.concordance import Concordance, KwicLine, word_annotations
+from analysis.cooccur import KeywordHits
+from analysis.corpus import CorpusStore
+
+# Класс цвета по первой букве категории
+COLOR_CLASSES = {
+    'v': 'blue',
+    'g': 'green',
+    'r': 'red',
+    'b': 'yellow',
+}
+
+
+def color_class(category: Optional[str]) -> Optional[str]:
+    """
+    Класс цвета категории по её первой букве.
+
+    :param category: Категория словаря или None.
+    :return: ``blue``, ``green``, ``red``, ``yellow`` или None.
+    """
+    return COLOR_CLASSES.get(category[:1].lower()) if category else None
+
+
+class Span(NamedTuple):
+    """
+    Отрезок слов [start, end) строки контекста с одной категорией.
+
+    :var start: Начало отрезка (номер слова в окне).
+    :var end: Конец отрезка.
+    :var category: Категория словаря или None.
+    :var color: Класс цвета категории или None.
+    :var keyword: Входит ли отрезок во вхождение ключевого слова.
+    """
+
+    start: int
+    end: int
+    category: Optional[str]
+    color: Optional[str]
+    keyword: bool = False
+
+
+class AnnotatedLine(NamedTuple):
+    """
+    Строка контекста: слова окна и их разметка.
+
+    :var start: Позиция первого слова окна в документе.
+    :var position: Позиция вхождения в документе.
+    :var words: Слова окна.
+    :var spans: Отрезки, покрывающие окно по порядку.
+    """
+
+    start: int
+    position: int
+    words: tuple[str, ...]
+    spans: tuple[Span, ...]
+
+    def segments(self) -> Iterator[tuple[Sequence[str], Span]]:
+        """
+        Перебирает отрезки вместе с их словами.
+        """
+        for span in self.spans:
+            yield self.words[span.start:span.end], span
+
+
+def annotate_line(words: Sequence[str], line: KwicLine) -> AnnotatedLine:
+    """
+    Размечает строку конкорданса, метки которого — категории словаря.
+
+    :param words: Слова документа.
+    :param line: Строка конкорданса.
+    :return: Размеченная строка.
+    """
+    spans = []
+    start, key = 0, None
+    for offset, (word, category, is_keyword) in enumerate(line.tokens(words)):
+        if offset and (category, is_keyword) != key:
+            spans.append(Span(start, offset, key[0], color_class(key[0]), key[1]))
+            start = offset
+        key = (category, is_keyword)
+    if key is not None:
+        spans.append(Span(start, line.end - line.start, key[0], color_class(key[0]), key[1]))
+    return AnnotatedLine(line.start, line.position, tuple(words[line.start:line.end]), tuple(spans))
+
+
+class SectionTask(NamedTuple):
+    """
+    Раздел вывода по одному документу до разметки.
+
+    :var keyword: Ключевое слово, заголовок которого выводится перед
+        разделом, или None.
+    :var doc_id: Номер документа в хранилище; None — только заголовок.
+    :var date: Дата документа.
+    :var positions: Позиции ключевого слова в документе.
+    :var counts: Категории словаря в окнах вокруг вхождений.
+    :var width: Число слов ключевого слова (выделяются все).
+    """
+
+    keyword: Optional[str]
+    doc_id: Optional[int] = None
+    date: Optional[str] = None
+    positions: Sequence[int] = ()
+    counts: Optional[Mapping[str, int]] = None
+    width: int = 1
+
+
+class Section(NamedTuple):
+    """
+    Размеченный раздел вывода. Пустые поля не выводятся: раздел m2 — только
+    ключевое слово и таблица, раздел m3 — только строки контекста.
+
+    :var keyword: Ключевое слово для заголовка или None.
+    :var doc_id: Номер документа или None.
+    :var date: Дата документа или None.
+    :var counts: Категории в окнах вокруг вхождений или None.
+    :var lines: Размеченные строки контекста.
+    """
+
+    keyword: Optional[str] = None
+    doc_id: Optional[int] = None
+    date: Optional[str] = None
+    counts: Optional[Mapping[str, int]] = None
+    lines: Sequence[AnnotatedLine] = ()
+
+
+def section_tasks(
+        store: CorpusStore,
+        results: Mapping[str, Sequence[KeywordHits]],
+        headings: bool = False
+) -> Iterator[SectionTask]:
+    """
+    Разделы по результатам :func:`analysis.cooccur.batch_cooccurrence`.
+
+    :param store: Хранилище корпуса.
+    :param results: Ключевое слово -> вхождения по документам.
+    :param headings: Выводить заголовок ключевого слова (пакетный режим).
+    :return: Итератор разделов в порядке вывода.
+    """
+    for keyword, documents in results.items():
+        heading = keyword if headings else None
+        if not documents and heading is not None:
+            yield SectionTask(heading)
+
+        width = max(len(normalize_phrase(keyword)), 1)
+        for hits in documents:
+            date = store.documents[hits.doc_id].get('date') or 'Дата не указана'
+            yield SectionTask(heading, hits.doc_id, date, hits.positions, hits.counts, width)
+            heading = None
+
+
+class Annotator:
+    """
+    Размечает разделы. Конкорданс документа общий для всех ключевых слов.
+
+    :val categories: Словарь: слово -> категория.
+    :val context_words: Число слов контекста слева и справа.
+    """
+
+    categories: Mapping[str, str]
+    context_words: int
+
+    def __init__(
+            self,
+            words_of: Callable[[int], Sequence[str]],
+            categories: Mapping[str, str],
+            context_words: int
+    ) -> None:
+        """
+        Создаёт разметчик.
+
+        :param words_of: Функция: номер документа -> слова.
+        :param categories: Словарь: слово -> категория.
+        :param context_words: Число слов контекста слева и справа.
+        """
+        self.categories = categories
+        self.context_words = context_words
+        self._words_of = words_of
+        self.concordance = lru_cache(maxsize=256)(self._concordance)
+
+    def _concordance(self, doc_id: int) -> Concordance:
+        words = self._words_of(doc_id)
+        return Concordance(words, word_annotations(words, self.categories))
+
+    def lines(self, concordance: Concordance, positions: Iterable[int], width: int = 1) -> list[AnnotatedLine]:
+        return [
+            annotate_line(concordance.words, line)
+            for line in concordance.lines(positions, self.context_words, width)
+        ]
+
+    def section(self, task: SectionTask) -> Section:
+        """
+        Размечает раздел.
+
+        :param task: Раздел до разметки.
+        :return: Размеченный раздел.
+        """
+        if task.doc_id is None:
+            return Section(task.keyword)
+        lines = tuple(self.lines(self.concordance(task.doc_id), task.positions, task.width))
+        return Section(task.keyword, task.doc_id, task.date, task.counts, lines)
+
+
+_worker_state: dict[str, Any] = {}
+
+
+def init_annotator(corpus_path: Path, categories: Mapping[str, str], context_words: int) -> None:
+    """
+    Открывает хранилище корпуса в процессе пула.
+
+    :param corpus_path: Каталог хранилища корпуса.
+    :param categories: Словарь: слово -> категория.
+    :param context_words: Число слов контекста слева и справа.
+    :return: None
+    """
+    store = CorpusStore(corpus_path)
+    _worker_state['store'] = store
+    _worker_state['annotator'] = Annotator(store.words, categories, context_words)
+
+
+def annotate_section(task: SectionTask) -> Section:
+    return _worker_state['annotator'].section(task)
+
+
+def map_parallel(
+        func: Callable[[Any], Any],
+        tasks: Iterable[Any],
+        workers: int = 1,
+        initializer: Optional[Callable[..., None]] = None,
+        initargs: tuple = ()
+) -> Iterator[Any]:
+    """
+    Выполняет задачи в пуле процессов и отдаёт результаты в порядке задач.
+    Одновременно в работе не больше 2 * workers задач, поэтому задачи и
+    результаты не накапливаются в памяти.
+
+    :param func: Функция задачи (должна импортироваться в процессе пула).
+    :param tasks: Задачи.
+    :param workers: Число процессов; 1 — без пула.
+    :param initializer: Подготовка процесса.
+    :param initargs: Аргументы подготовки.
+    :return: Итератор результатов.
+    """
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        yield from map(func, tasks)
+        return
+
+    with ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(func, task))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def section_record(section: Section) -> dict[str, Any]:
+    """
+    Раздел в виде словаря для JSON.
+
+    :param section: Раздел.
+    :return: Словарь полей раздела.
+    """
+    record = section._asdict()
+    record['lines'] = [
+        {'start': line.start, 'position': line.position, 'words': line.words, 'spans': line.spans}
+        for line in section.lines
+    ]
+    return record
+
+
+def write_sections(path: Path, sections: Iterable[Section]) -> Iterator[Section]:
+    """
+    Сохраняет разделы в JSON Lines (по разделу на строку) и передаёт их
+    дальше, так что запись можно встроить в вывод.
+
+    :param path: Файл разметки.
+    :param sections: Разделы.
+    :return: Итератор тех же разделов.
+    """
+    with Path(path).open('w', encoding='utf-8') as f:
+        for section in sections:
+            f.write(json.dumps(section_record(section), ensure_ascii=False) + '\n')
+            yield section
+
+
+def read_sections(path: Path) -> Iterator[Section]:
+    """
+    Читает разделы, сохранённые :func:`write_sections`.
+
+    :param path: Файл разметки.
+    :return: Итератор разделов.
+    """
+    with Path(path).open(encoding='utf-8') as f:
+        for row in f:
+            record = json.loads(row)
+            record['lines'] = tuple(
+                AnnotatedLine(line['start'], line['position'], tuple(line['words']),
+                              tuple(Span(*span) for span in line['spans']))
+                for line in record['lines']
+            )
+            yield Section(**record)
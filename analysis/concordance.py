@@ -0,0 +1,178 @@
+"""
+Конкорданс (ключевое слово в контексте, KWIC).
+
+Позиции вхождений и разметка категорий считаются заранее (позиционным
+индексом, поиском, :class:`analysis.lexicon.PhraseMatcher`), а конкорданс
+только нарезает окна. Строка конкорданса хранит лишь границы окна и
+попавшие в него метки; слова берутся срезами исходного списка при выводе,
+поэтому текст не копируется и не приводится к нижнему регистру заново.
+
+Один и тот же конкорданс документа обслуживает любые ключевые слова и
+размеры окна (m3 — ±12 слов, m4 — ±15, e4 — ±50).
+"""
+from bisect import bisect_left
+from operator import attrgetter
+from typing import Callable, Hashable, Iterable, Iterator, Mapping, NamedTuple, Optional, Sequence, Union
+
+from analysis._utils import normalize_phrase
+from analysis.lexicon import PhraseMatcher
+
+
+class Annotation(NamedTuple):
+    """
+    Метка категории на отрезке токенов [start, end).
+    """
+
+    start: int
+    end: int
+    category: Hashable
+
+
+class KwicLine(NamedTuple):
+    """
+    Строка конкорданса: окно [start, end) вокруг вхождения
+    [position, position + width) и метки, пересекающие окно.
+    """
+
+    position: int
+    width: int
+    start: int
+    end: int
+    tags: tuple[Annotation, ...]
+
+    @property
+    def hit_end(self) -> int:
+        return self.position + self.width
+
+    def left(self, words: Sequence[str]) -> Sequence[str]:
+        return words[self.start:self.position]
+
+    def hit(self, words: Sequence[str]) -> Sequence[str]:
+        return words[self.position:self.hit_end]
+
+    def right(self, words: Sequence[str]) -> Sequence[str]:
+        return words[self.hit_end:self.end]
+
+    def tokens(self, words: Sequence[str]) -> Iterator[tuple[str, Optional[Hashable], bool]]:
+        """
+        Перебирает слова окна с их метками.
+
+        :param words: Слова документа.
+        :return: Итератор троек (слово, категория или None, входит ли
+            слово во вхождение ключевого слова).
+        """
+        categories = {}
+        for start, end, category in self.tags:
+            for index in range(max(start, self.start), min(end, self.end)):
+                categories[index] = category
+        hit_end = self.hit_end
+        for index in range(self.start, self.end):
+            yield words[index], categories.get(index), self.position <= index < hit_end
+
+
+def word_annotations(words: Sequence[str], categories: Mapping[str, Hashable]) -> list[Annotation]:
+    """
+    Размечает отдельные слова по словарю слово -> категория.
+
+    :param words: Слова документа в нижнем регистре.
+    :param categories: Словарь: слово -> категория (цвет и т. п.).
+    :return: Метки в порядке слов.
+    """
+    return [Annotation(index, index + 1, categories[word]) for index, word in enumerate(words) if word in categories]
+
+
+def phrase_annotations(words: Sequence[str], matcher: PhraseMatcher) -> list[Annotation]:
+    """
+    Размечает слова и словосочетания скомпилированным словарём.
+
+    :param words: Слова документа в нижнем регистре.
+    :param matcher: Скомпилированный словарь категорий.
+    :return: Метки в порядке начала.
+    """
+    return sorted((Annotation(start, end, category) for category, start, end in matcher.finditer(words)),
+                  key=attrgetter('start'))
+
+
+class Concordance:
+    """
+    Конкорданс одного документа (или сплошного списка слов).
+
+    :val words: Слова документа.
+    :val annotations: Метки категорий, отсортированные по началу.
+    """
+
+    words: Sequence[str]
+    annotations: list[Annotation]
+
+    def __init__(self, words: Sequence[str], annotations: Iterable[Annotation] = ()) -> None:
+        """
+        Создаёт конкорданс.
+
+        :param words: Слова документа.
+        :param annotations: Метки категорий.
+        """
+        self.words = words
+        self.annotations = sorted(annotations, key=attrgetter('start'))
+        self._starts = [annotation.start for annotation in self.annotations]
+        self._longest = max((annotation.end - annotation.start for annotation in self.annotations), default=1)
+
+    def line(self, position: int, window: int, width: int = 1) -> KwicLine:
+        """
+        Возвращает окно вокруг одного вхождения.
+
+        :param position: Позиция первого слова вхождения.
+        :param window: Число слов слева и справа.
+        :param width: Число слов во вхождении.
+        :return: Строка конкорданса.
+        """
+        start = max(position - window, 0)
+        end = min(position + width + window, len(self.words))
+        low = bisect_left(self._starts, start - self._longest + 1)
+        high = bisect_left(self._starts, end)
+        tags = tuple(annotation for annotation in self.annotations[low:high] if annotation.end > start)
+        return KwicLine(position, width, start, end, tags)
+
+    def lines(self, positions: Iterable[int], window: int, width: int = 1) -> list[KwicLine]:
+        """
+        Возвращает окна вокруг вхождений; позиции вне документа пропускаются.
+
+        :param positions: Позиции вхождений.
+        :param window: Число слов слева и справа.
+        :param width: Число слов во вхождении.
+        :return: Строки конкорданса.
+        """
+        total = len(self.words)
+        return [self.line(position, window, width) for position in positions if 0 <= position < total]
+
+
+def batch_concordance(
+        words_of: Callable[[int], Sequence[str]],
+        postings: Mapping[str, Mapping[int, Sequence[int]]],
+        windows: Union[int, Iterable[int]],
+        annotate: Optional[Callable[[Sequence[str]], Iterable[Annotation]]] = None
+) -> dict[str, dict[int, dict[int, list[KwicLine]]]]:
+    """
+    Строит конкорданс для нескольких ключевых слов и размеров окна.
+    Слова и разметка каждого документа получаются один раз.
+
+    :param words_of: Функция: номер документа -> слова.
+    :param postings: Ключевое слово -> документ -> позиции вхождений (как
+        :meth:`analysis.index.PositionalIndex.postings`).
+    :param windows: Размер окна или несколько размеров.
+    :param annotate: Функция разметки слов документа.
+    :return: Ключевое слово -> размер окна -> документ -> строки.
+    """
+    windows = [windows] if isinstance(windows, int) else list(windows)
+    concordances: dict[int, Concordance] = {}
+    result = {}
+    for keyword, documents in postings.items():
+        width = max(len(normalize_phrase(keyword)), 1)
+        by_window = result[keyword] = {window: {} for window in windows}
+        for doc_id, positions in documents.items():
+            concordance = concordances.get(doc_id)
+            if concordance is None:
+                words = words_of(doc_id)
+                concordance = concordances[doc_id] = Concordance(words, annotate(words) if annotate else ())
+            for window in windows:
+                by_window[window][doc_id] = concordance.lines(positions, window, width)
+    return result
@@ -0,0 +1,297 @@
+"""
+Подсчёт категорий словаря в окне вокруг ключевого слова.
+
+Для потока токенов один раз строятся накопленные суммы вхождений каждой
+категории (массив NumPy int32 формы ``(категории, токены + 1)``). После
+этого число вхождений категорий в любом окне — это разность двух столбцов,
+то есть O(число категорий) независимо от ширины окна. Суммы строятся по
+документу (:func:`batch_cooccurrence`) или по блокам длинного потока
+(:func:`blocked_window_counts`, m2), а не по всему корпусу сразу.
+
+Скрипты m2, m4 и e4 считают, как и раньше, отдельные слова по обратному
+словарю (:attr:`analysis.lexicon.CompiledLexicon.words`): слово из
+нескольких категорий относится к последней, многословные статьи не
+учитываются. Категории в результатах идут в порядке первой встречи в окнах.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Hashable, Iterable, Mapping, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from analysis._utils import normalize_phrase
+from analysis.corpus import CorpusStore
+from analysis.index import PositionalIndex
+from analysis.lexicon import CompiledLexicon, PhraseMatcher
+from analysis.results import ResultCache
+
+# Токенов в блоке потока для blocked_window_counts: при десятках категорий
+# накопленные суммы блока занимают единицы мегабайт
+BLOCK_SIZE = 1 << 16
+
+
+class CategoryPrefixSums:
+    """
+    Накопленные счётчики категорий над потоком токенов.
+
+    Вхождение фразы словаря относится к позиции её первого токена.
+
+    :val categories: Категории в порядке строк массива.
+    :val prefix: Накопленные суммы, ``prefix[c, i]`` — число вхождений
+        категории ``c`` среди первых ``i`` токенов.
+    """
+
+    categories: list[str]
+    prefix: np.ndarray
+
+    def __init__(
+            self,
+            matches: Iterable[tuple[str, int, int]],
+            categories: Sequence[str],
+            length: int
+    ) -> None:
+        """
+        Строит накопленные суммы по найденным вхождениям.
+
+        :param matches: Вхождения (категория, начало, конец).
+        :param categories: Все категории словаря.
+        :param length: Число токенов в потоке.
+        """
+        self.categories = list(categories)
+        rows = {category: row for row, category in enumerate(self.categories)}
+
+        marks = np.zeros((len(self.categories), length + 1), dtype=np.int32)
+        found = [(rows[category], start + 1) for category, start, _ in matches]
+        if found:
+            row_idx, col_idx = np.array(found).T
+            np.add.at(marks, (row_idx, col_idx), 1)
+        self.prefix = np.cumsum(marks, axis=1, dtype=np.int32)
+        # Начала вхождений по категориям — для порядка первой встречи
+        self._starts = [np.flatnonzero(row) for row in marks[:, 1:]]
+
+    @classmethod
+    def from_tokens(cls, tokens: Sequence[str], matcher: PhraseMatcher) -> 'CategoryPrefixSums':
+        """
+        Строит накопленные суммы для последовательности токенов.
+
+        :param tokens: Токены в нижнем регистре.
+        :param matcher: Скомпилированный словарь категорий.
+        :return: Накопленные суммы.
+        """
+        return cls(matcher.finditer(tokens), matcher.categories, len(tokens))
+
+    @classmethod
+    def from_words(cls, tokens: Sequence[str], words: Mapping[str, Hashable]) -> 'CategoryPrefixSums':
+        """
+        Строит накопленные суммы по обратному словарю: каждый токен относится
+        не более чем к одной категории, как в исходных скриптах.
+
+        :param tokens: Токены в нижнем регистре.
+        :param words: Обратный словарь слово -> категория.
+        :return: Накопленные суммы.
+        """
+        matches = []
+        for i, token in enumerate(tokens):
+            category = words.get(token)
+            if category is not None:
+                matches.append((category, i, i + 1))
+        return cls(matches, dict.fromkeys(words.values()), len(tokens))
+
+    def __len__(self) -> int:
+        return self.prefix.shape[1] - 1
+
+    def window(self, start: int, end: int) -> np.ndarray:
+        """
+        Возвращает счётчики категорий в полуинтервале токенов.
+
+        :param start: Начало окна.
+        :param end: Конец окна (не включается).
+        :return: Вектор счётчиков по категориям.
+        """
+        start, end = max(start, 0), min(end, len(self))
+        return self.prefix[:, end] - self.prefix[:, start]
+
+    def windows(self, centers: Sequence[int], size: int) -> np.ndarray:
+        """
+        Суммирует счётчики категорий в окнах ±size вокруг каждого центра.
+
+        Сам центральный токен (ключевое слово) не учитывается, пересекающиеся
+        окна учитываются каждое отдельно, как в исходных скриптах.
+
+        :param centers: Позиции ключевых слов.
+        :param size: Число токенов слева и справа от центра.
+        :return: Вектор счётчиков по категориям.
+        """
+        centers = np.asarray(centers, dtype=np.int64)
+        if not centers.size:
+            return np.zeros(len(self.categories), dtype=np.int32)
+
+        starts = np.clip(centers - size, 0, len(self))
+        ends = np.clip(centers + size + 1, 0, len(self))
+        prefix = self.prefix
+        total = (prefix[:, ends] - prefix[:, starts]).sum(axis=1)
+        own = (prefix[:, centers + 1] - prefix[:, centers]).sum(axis=1)
+        return total - own
+
+    def window_counts(self, centers: Sequence[int], size: int) -> dict[str, int]:
+        """
+        То же, что :meth:`windows`, но в виде словаря ненулевых категорий.
+
+        :param centers: Позиции ключевых слов.
+        :param size: Число токенов слева и справа от центра.
+        :return: Словарь: категория -> количество.
+        """
+        counts = self.windows(centers, size)
+        rows = self._encounter_order(centers, size, np.flatnonzero(counts))
+        return {self.categories[row]: int(counts[row]) for row in rows}
+
+    def _encounter_order(self, centers: Sequence[int], size: int, rows: Iterable[int]) -> list[int]:
+        """
+        Упорядочивает категории по первой встрече: окна просматриваются по
+        порядку центров, каждое слева направо, центр пропускается.
+
+        :param centers: Позиции ключевых слов по возрастанию.
+        :param size: Число токенов слева и справа от центра.
+        :param rows: Строки категорий с ненулевыми счётчиками.
+        :return: Строки в порядке первой встречи.
+        """
+        pending = set(int(row) for row in rows)
+        order = []
+        for center in centers:
+            if not pending:
+                break
+            start, end = max(center - size, 0), min(center + size + 1, len(self))
+            first = []
+            for row in pending:
+                starts = self._starts[row]
+                i = np.searchsorted(starts, start)
+                if i < len(starts) and starts[i] == center:
+                    i += 1
+                if i < len(starts) and starts[i] < end:
+                    first.append((int(starts[i]), row))
+            for _, row in sorted(first):
+                order.append(row)
+                pending.discard(row)
+        return order
+
+    def first_hit(self, centers: Sequence[int], size: int) -> Optional[int]:
+        """
+        Первый центр, в окне которого есть хотя бы одно вхождение категории.
+
+        :param centers: Позиции ключевых слов по возрастанию.
+        :param size: Число токенов слева и справа от центра.
+        :return: Позиция центра или None.
+        """
+        for center in centers:
+            if self.windows([center], size).any():
+                return center
+        return None
+
+
+def blocked_window_counts(
+        tokens: Sequence[str],
+        words: Mapping[str, Hashable],
+        positions: Mapping[str, Sequence[int]],
+        size: int,
+        block_size: int = BLOCK_SIZE
+) -> dict[str, tuple[Optional[int], dict[str, int]]]:
+    """
+    Категории в окнах вокруг ключевых слов в длинном потоке токенов (весь
+    bt.txt в m2). Накопленные суммы строятся по блокам потока с запасом
+    ``size`` токенов по краям, поэтому окна считаются так же, как по всему
+    потоку, а память ограничена размером блока.
+
+    :param tokens: Токены в нижнем регистре.
+    :param words: Обратный словарь слово -> категория.
+    :param positions: Ключевое слово -> позиции по возрастанию.
+    :param size: Число токенов слева и справа от центра.
+    :param block_size: Число центров окон в блоке (по позициям потока).
+    :return: Ключевое слово -> (первый центр, в окне которого есть
+        категории, или None; категории в порядке первой встречи).
+    """
+    results = {keyword: (None, {}) for keyword in positions}
+    for block_start in range(0, len(tokens), block_size):
+        block_end = min(block_start + block_size, len(tokens))
+        centers = {}
+        for keyword, keyword_positions in positions.items():
+            low = bisect_left(keyword_positions, block_start)
+            high = bisect_left(keyword_positions, block_end)
+            if low < high:
+                centers[keyword] = keyword_positions[low:high]
+        if not centers:
+            continue
+
+        start, end = max(block_start - size, 0), min(block_end + size, len(tokens))
+        prefix_sums = CategoryPrefixSums.from_words(tokens[start:end], words)
+        for keyword, block_centers in centers.items():
+            local = [center - start for center in block_centers]
+            first, counts = results[keyword]
+            if first is None:
+                hit = prefix_sums.first_hit(local, size)
+                first = None if hit is None else hit + start
+            for category, count in prefix_sums.window_counts(local, size).items():
+                counts[category] = counts.get(category, 0) + count
+            results[keyword] = (first, counts)
+    return results
+
+
+class KeywordHits(NamedTuple):
+    """
+    Вхождения ключевого слова в одном документе.
+
+    :var doc_id: Номер документа в хранилище.
+    :var positions: Позиции ключевого слова в документе.
+    :var counts: Категории словаря в окнах вокруг вхождений.
+    """
+
+    doc_id: int
+    positions: list[int]
+    counts: dict[str, int]
+
+
+def batch_cooccurrence(
+        store: CorpusStore,
+        index: PositionalIndex,
+        keywords: Iterable[str],
+        lexicon: CompiledLexicon,
+        window_size: int = 150,
+        source: Optional[str] = None,
+        cache: Optional[ResultCache] = None
+) -> dict[str, list[KeywordHits]]:
+    """
+    Считает категории вокруг всех ключевых слов за один проход по корпусу.
+
+    Вхождения берутся из позиционного индекса, документы группируются, и
+    накопленные суммы строятся один раз на документ для всех ключевых слов,
+    поэтому стоимость растёт с размером корпуса, а не с произведением
+    размера корпуса на число слов.
+
+    :param store: Хранилище корпуса.
+    :param index: Позиционный индекс хранилища.
+    :param keywords: Ключевые слова или словосочетания.
+    :param lexicon: Словарь категорий из :func:`analysis.lexicon.load_compiled`;
+        слова считаются по его обратному словарю.
+    :param window_size: Число токенов слева и справа от ключевого слова.
+    :param source: Учитывать только документы этого источника.
+    :param cache: Кэш результатов; ключ — содержимое хранилища, хэш
+        словаря, ключевые слова, окно и источник.
+    :return: Словарь: ключевое слово -> вхождения по документам.
+    """
+    keywords = list(dict.fromkeys(' '.join(normalize_phrase(keyword)) for keyword in keywords))
+    if cache is not None:
+        key = cache.key('cooccurrence', store.files, lexicon.digest, keywords, window_size, source)
+        return cache.cached(key, lambda: batch_cooccurrence(store, index, keywords, lexicon, window_size, source))
+
+    by_doc: dict[int, dict[str, list[int]]] = defaultdict(dict)
+    for keyword in keywords:
+        for doc_id, positions in index.postings(keyword).items():
+            if source is None or store.documents[doc_id]['source'] == source:
+                by_doc[doc_id][keyword] = positions
+
+    results: dict[str, list[KeywordHits]] = {keyword: [] for keyword in keywords}
+    for doc_id in sorted(by_doc):
+        prefix_sums = CategoryPrefixSums.from_words(store.words(doc_id), lexicon.words)
+        for keyword, positions in by_doc[doc_id].items():
+            counts = prefix_sums.window_counts(positions, window_size)
+            results[keyword].append(KeywordHits(doc_id, positions, counts))
+    return results
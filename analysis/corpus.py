@@ -0,0 +1,368 @@
+"""
+Хранилище корпуса в виде идентификаторов токенов.
+
+Корпус токенизируется один раз (см. :func:`build_corpus`) и сохраняется
+в каталог из пяти файлов:
+
+* ``vocab.txt`` — словарь, номер строки равен идентификатору токена;
+* ``tokens.i32`` — идентификаторы всех токенов подряд (int32);
+* ``offsets.i64`` — границы документов в ``tokens.i32`` (int64, n + 1);
+* ``docs.json`` — метаданные документов (источник, id, дата, заголовок,
+  хэш текста);
+* ``sources.json`` — из каких страниц и bt.txt собран корпус (пути и
+  отпечаток их файлов, см. :func:`source_signature`).
+
+:class:`CorpusStore` открывает массивы через mmap, поэтому повторный анализ
+не требует ни токенизации, ни загрузки корпуса в память.
+"""
+import hashlib
+import json
+import logging
+import mmap
+from array import array
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from analysis._utils import tokenize
+from pars.columns import ColumnarCorpus, is_columnar
+
+logger = logging.getLogger(__name__)
+
+PAGES_DIR = Path('pars/pages/bt')
+TEXT_PATH = Path('pars/pages/bt.txt')
+CORPUS_DIR = Path('pars/pages/corpus')
+
+VOCAB_FILE = 'vocab.txt'
+TOKENS_FILE = 'tokens.i32'
+OFFSETS_FILE = 'offsets.i64'
+DOCS_FILE = 'docs.json'
+SOURCES_FILE = 'sources.json'
+
+
+def _iter_sources(pages_dir: Optional[Path], text_path: Optional[Path]) -> Iterator[tuple[dict[str, Any], str]]:
+    """
+    Перебирает документы корпуса.
+
+    :param pages_dir: Каталог страниц: колоночный корпус (pars.columns) или
+        JSON-файлы.
+    :param text_path: Файл bt.txt, одна страница на строку.
+    :return: Итератор пар (метаданные, текст).
+    """
+    if pages_dir is not None and is_columnar(pages_dir):
+        # Читаются только нужные колонки, ссылки и изображения не трогаются
+        with ColumnarCorpus(pages_dir) as corpus:
+            for id_, url, title, date, text in corpus.rows('id', 'url', 'title', 'date', 'text'):
+                meta = {'source': pages_dir.name, 'id': id_, 'url': url, 'title': title, 'date': date}
+                yield meta, text or ''
+    elif pages_dir is not None and pages_dir.exists():
+        for file_path in sorted(pages_dir.glob('*.json')):
+            with file_path.open(encoding='utf-8') as f:
+                data = json.load(f)
+            meta = {
+                'source': pages_dir.name,
+                'id': file_path.stem,
+                'url': data.get('url'),
+                'title': data.get('title'),
+                'date': data.get('date'),
+            }
+            yield meta, data.get('text') or ''
+
+    if text_path is not None and text_path.exists():
+        with text_path.open(encoding='utf-8') as f:
+            for line_no, line in enumerate(f):
+                yield {'source': text_path.name, 'id': str(line_no)}, line
+
+
+def source_signature(pages_dir: Optional[Path], text_path: Optional[Path]) -> dict[str, Any]:
+    """
+    Описание входных данных корпуса: пути к страницам и bt.txt и
+    отпечаток их файлов (имя, размер, время изменения). Отпечаток меняется
+    и при удалении страницы, которое по времени изменения не видно.
+
+    :param pages_dir: Каталог страниц.
+    :param text_path: Файл bt.txt.
+    :return: Пути и хэш отпечатка.
+    """
+    files = [text_path] if text_path is not None and text_path.exists() else []
+    if pages_dir is not None and pages_dir.is_dir():
+        files.extend(sorted(path for path in pages_dir.rglob('*') if path.is_file()))
+    digest = hashlib.sha256()
+    for path in files:
+        stat = path.stat()
+        digest.update(f'{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n'.encode('utf-8'))
+    return {
+        'pages_dir': str(Path(pages_dir).resolve()) if pages_dir is not None else None,
+        'text_path': str(Path(text_path).resolve()) if text_path is not None else None,
+        'files': digest.hexdigest(),
+    }
+
+
+def build_corpus(
+        out_dir: Path = CORPUS_DIR,
+        pages_dir: Optional[Path] = PAGES_DIR,
+        text_path: Optional[Path] = TEXT_PATH
+) -> 'CorpusStore':
+    """
+    Токенизирует страницы и bt.txt и сохраняет корпус на диск.
+
+    Токены пишутся в файл по мере обработки документов, поэтому в памяти
+    держится только словарь.
+
+    :param out_dir: Каталог хранилища.
+    :param pages_dir: Каталог страниц (колоночный корпус или JSON-файлы).
+    :param text_path: Файл bt.txt.
+    :return: Открытое хранилище.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # Снимается до чтения: изменения во время сборки сделают корпус устаревшим
+    sources = source_signature(pages_dir, text_path)
+    vocab: dict[str, int] = {}
+    offsets = array('q', [0])
+    docs = []
+
+    with (out_dir / TOKENS_FILE).open('wb') as tokens_file:
+        for meta, text in _iter_sources(pages_dir, text_path):
+            # Хэш текста позволяет анализировать заново только изменённые документы (analysis.aggregate)
+            meta['digest'] = hashlib.sha256(text.encode('utf-8')).hexdigest()
+            ids = array('i', (vocab.setdefault(token, len(vocab)) for token in tokenize(text)))
+            ids.tofile(tokens_file)
+            offsets.append(offsets[-1] + len(ids))
+            docs.append(meta)
+
+    with (out_dir / OFFSETS_FILE).open('wb') as f:
+        offsets.tofile(f)
+    with (out_dir / VOCAB_FILE).open('w', encoding='utf-8') as f:
+        f.writelines(f'{token}\n' for token in vocab)
+    with (out_dir / DOCS_FILE).open('w', encoding='utf-8') as f:
+        json.dump(docs, f, ensure_ascii=False)
+    # Пишется последним: прерванная сборка не будет принята за готовую
+    with (out_dir / SOURCES_FILE).open('w', encoding='utf-8') as f:
+        json.dump(sources, f, ensure_ascii=False)
+
+    logger.info(f"Корпус собран: {len(docs)} документов, {offsets[-1]} токенов, {len(vocab)} словоформ.")
+    return CorpusStore(out_dir)
+
+
+def corpus_stale(
+        out_dir: Path = CORPUS_DIR,
+        pages_dir: Optional[Path] = PAGES_DIR,
+        text_path: Optional[Path] = TEXT_PATH
+) -> bool:
+    """
+    Проверяет, что хранилище не собрано, собрано из других страниц или
+    bt.txt либо их файлы с тех пор изменились (:func:`source_signature`).
+
+    :param out_dir: Каталог хранилища.
+    :param pages_dir: Каталог страниц.
+    :param text_path: Файл bt.txt.
+    :return: True, если корпус нужно собрать заново.
+    """
+    try:
+        with (Path(out_dir) / SOURCES_FILE).open(encoding='utf-8') as f:
+            sources = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return True
+    return sources != source_signature(pages_dir, text_path)
+
+
+class CorpusStore:
+    """
+    Корпус, открытый только для чтения через mmap.
+
+    :val path: Каталог хранилища.
+    :val vocab: Словарь: идентификатор -> словоформа.
+    :val documents: Метаданные документов.
+    """
+
+    path: Path
+    vocab: list[str]
+    documents: list[dict[str, Any]]
+
+    def __init__(self, path: Path = CORPUS_DIR) -> None:
+        """
+        Открывает хранилище.
+
+        :param path: Каталог, созданный :func:`build_corpus`.
+        """
+        self.path = Path(path)
+        with (self.path / VOCAB_FILE).open(encoding='utf-8') as f:
+            self.vocab = f.read().splitlines()
+        with (self.path / DOCS_FILE).open(encoding='utf-8') as f:
+            self.documents = json.load(f)
+        self._term_ids: Optional[dict[str, int]] = None
+
+        self._mmaps = []
+        self.tokens = self.map_array(TOKENS_FILE, 'i')
+        self.offsets = self.map_array(OFFSETS_FILE, 'q')
+
+    def map_array(self, name: str, fmt: str) -> memoryview:
+        """
+        Отображает файл в память как типизированный массив.
+
+        :param name: Имя файла в каталоге хранилища.
+        :param fmt: Код типа элементов (как в модуле struct).
+        :return: Представление массива.
+        """
+        with (self.path / name).open('rb') as f:
+            if not f.seek(0, 2):
+                return memoryview(array(fmt))
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mm)
+        array_view = view.cast(fmt)
+        self._mmaps.append((mm, view, array_view))
+        return array_view
+
+    @classmethod
+    def open_or_build(cls, path: Path = CORPUS_DIR, **kwargs: Any) -> 'CorpusStore':
+        """
+        Открывает хранилище; если его нет или оно собрано из других или
+        изменившихся страниц и bt.txt (:func:`corpus_stale`), собирает
+        корпус заново.
+
+        :param path: Каталог хранилища.
+        :param kwargs: Аргументы для :func:`build_corpus`.
+        :return: Открытое хранилище.
+        """
+        pages_dir = kwargs.get('pages_dir', PAGES_DIR)
+        text_path = kwargs.get('text_path', TEXT_PATH)
+        if not corpus_stale(Path(path), pages_dir, text_path):
+            return cls(path)
+        return build_corpus(Path(path), **kwargs)
+
+    def close(self) -> None:
+        """
+        Освобождает отображения файлов.
+
+        :return: None
+        """
+        self.tokens.release()
+        self.offsets.release()
+        # Представления, выданные индексу, освобождаются вместе с хранилищем
+        for mm, view, array_view in self._mmaps:
+            array_view.release()
+            view.release()
+            mm.close()
+        self._mmaps.clear()
+
+    def __enter__(self) -> 'CorpusStore':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @property
+    def files(self) -> list[Path]:
+        """
+        Файлы хранилища (по их содержимому строятся ключи кэша результатов).
+
+        :return: Пути к файлам.
+        """
+        return [self.path / name for name in (DOCS_FILE, VOCAB_FILE, TOKENS_FILE, OFFSETS_FILE)]
+
+    @property
+    def term_ids(self) -> dict[str, int]:
+        """
+        Обратный словарь: словоформа -> идентификатор.
+
+        :return: Словарь идентификаторов.
+        """
+        if self._term_ids is None:
+            self._term_ids = {term: index for index, term in enumerate(self.vocab)}
+        return self._term_ids
+
+    def term_id(self, term: str) -> Optional[int]:
+        """
+        Возвращает идентификатор словоформы.
+
+        :param term: Словоформа.
+        :return: Идентификатор или None, если слова нет в корпусе.
+        """
+        return self.term_ids.get(term.lower())
+
+    def span(self, doc_id: int) -> tuple[int, int]:
+        """
+        Возвращает границы документа в общем массиве токенов.
+
+        :param doc_id: Номер документа.
+        :return: Пара (начало, конец).
+        """
+        return self.offsets[doc_id], self.offsets[doc_id + 1]
+
+    def doc_tokens(self, doc_id: int) -> memoryview:
+        """
+        Возвращает идентификаторы токенов документа без копирования.
+
+        :param doc_id: Номер документа.
+        :return: Срез отображённого массива.
+        """
+        start, end = self.span(doc_id)
+        return self.tokens[start:end]
+
+    def words(self, doc_id: int) -> list[str]:
+        """
+        Возвращает токены документа в виде строк.
+
+        :param doc_id: Номер документа.
+        :return: Список словоформ.
+        """
+        vocab = self.vocab
+        return [vocab[token] for token in self.doc_tokens(doc_id)]
+
+    def doc_ids(self, source: Optional[str] = None) -> list[int]:
+        """
+        Возвращает номера документов, отобранных по источнику.
+
+        :param source: Имя источника ('bt' или 'bt.txt'), None — все.
+        :return: Список номеров документов.
+        """
+        return [
+            index for index, meta in enumerate(self.documents)
+            if source is None or meta['source'] == source
+        ]
+
+    def iter_words(self, source: Optional[str] = None) -> Iterator[list[str]]:
+        """
+        Перебирает документы в виде списков словоформ.
+
+        :param source: Имя источника, None — все документы.
+        :return: Итератор списков словоформ.
+        """
+        for doc_id in self.doc_ids(source):
+            yield self.words(doc_id)
+
+
+def load_words(
+        text_path: Path = TEXT_PATH,
+        corpus_dir: Path = CORPUS_DIR,
+        pages_dir: Optional[Path] = PAGES_DIR
+) -> list[str]:
+    """
+    Возвращает токены текстового файла корпуса.
+
+    Если хранилище уже собрано, токены берутся из него без токенизации
+    (устаревшее хранилище сначала собирается заново), иначе файл читается
+    и токенизируется как раньше.
+
+    :param text_path: Файл bt.txt.
+    :param corpus_dir: Каталог хранилища.
+    :param pages_dir: Каталог страниц, с которым собирается хранилище.
+    :return: Список словоформ в нижнем регистре.
+    """
+    if (corpus_dir / DOCS_FILE).exists():
+        if corpus_stale(corpus_dir, pages_dir, text_path):
+            store = build_corpus(corpus_dir, pages_dir, text_path)
+        else:
+            store = CorpusStore(corpus_dir)
+        with store:
+            return [word for words in store.iter_words(text_path.name) for word in words]
+
+    with text_path.open(encoding='utf-8') as f:
+        return tokenize(f.read())
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    build_corpus()
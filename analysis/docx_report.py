@@ -0,0 +1,271 @@
+"""
+Запись больших отчётов DOCX (e4).
+
+python-docx строит весь документ объектами в памяти и создаёт отдельный
+run на каждое слово. Здесь размеченные разделы (:mod:`analysis.annotate`:
+дата, таблица категорий, контексты) переводятся сразу в разметку
+WordprocessingML, а соседние слова с одинаковым оформлением объединяются в
+один run. Разделы документов размечаются параллельно в пуле процессов
+(:func:`analysis.annotate.map_parallel`). Готовые разделы дописываются
+потоком в ``word/document.xml`` внутри zip-архива, поэтому память не
+зависит от размера отчёта. Остальные части пакета (стили, тема, настройки)
+берутся из шаблона python-docx, и стили заголовков и таблиц совпадают с
+прежними. Большой отчёт можно разбить на тома по числу контекстов.
+"""
+import zipfile
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Iterable, Optional, Sequence
+from xml.sax.saxutils import escape
+
+from docx import Document
+
+from analysis.annotate import AnnotatedLine, Section
+
+DOCUMENT_PART = 'word/document.xml'
+TABLE_STYLE = 'LightList-Accent1'  # 'Light List Accent 1' шаблона python-docx
+TABLE_COLUMN_WIDTH = 4320
+
+# Оформление вхождения ключевого слова: полужирный на жёлтом фоне
+KEYWORD = 'keyword'
+
+# Цвет шрифта по классу цвета категории
+DOCX_COLORS = {
+    'blue': '0000FF',
+    'green': '008000',
+    'red': 'FF0000',
+    'yellow': 'FFFF00',
+}
+
+RULE_XML = ('<w:p><w:pPr><w:pBdr><w:bottom w:val="single" w:sz="6" w:space="1" w:color="000000"/>'
+            '</w:pBdr></w:pPr><w:r/></w:p>')
+EMPTY_PARAGRAPH_XML = '<w:p/>'
+
+
+def run_xml(text: str, style: Optional[str] = None) -> str:
+    """
+    Разметка одного run.
+
+    :param text: Текст.
+    :param style: :data:`KEYWORD`, цвет шрифта (``FF0000``) или None.
+    :return: Элемент ``w:r``.
+    """
+    if style == KEYWORD:
+        properties = '<w:rPr><w:b/><w:highlight w:val="yellow"/></w:rPr>'
+    elif style:
+        properties = f'<w:rPr><w:color w:val="{style}"/></w:rPr>'
+    else:
+        properties = ''
+    space = ' xml:space="preserve"' if text != text.strip() else ''
+    return f'<w:r>{properties}<w:t{space}>{escape(text)}</w:t></w:r>'
+
+
+def paragraph_xml(runs: Iterable[tuple[str, Optional[str]]] = (), style: Optional[str] = None) -> str:
+    """
+    Разметка абзаца.
+
+    :param runs: Пары (текст, оформление).
+    :param style: Идентификатор стиля абзаца (``Heading1``) или None.
+    :return: Элемент ``w:p``.
+    """
+    properties = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ''
+    return f'<w:p>{properties}{"".join(run_xml(text, run_style) for text, run_style in runs)}</w:p>'
+
+
+def heading_xml(text: str, level: int = 1) -> str:
+    return paragraph_xml([(text, None)], f'Heading{level}')
+
+
+def table_xml(rows: Iterable[Sequence[str]], columns: int = 2, style: str = TABLE_STYLE) -> str:
+    """
+    Разметка таблицы (как ``Document.add_table`` с заполненными ячейками).
+
+    :param rows: Строки таблицы, первая — заголовок.
+    :param columns: Число колонок.
+    :param style: Идентификатор стиля таблицы.
+    :return: Элемент ``w:tbl``.
+    """
+    cell_properties = f'<w:tcPr><w:tcW w:type="dxa" w:w="{TABLE_COLUMN_WIDTH}"/></w:tcPr>'
+    parts = [
+        f'<w:tbl><w:tblPr><w:tblStyle w:val="{style}"/><w:tblW w:type="auto" w:w="0"/>'
+        '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" w:noHBand="0" '
+        'w:noVBand="1" w:val="04A0"/></w:tblPr><w:tblGrid>',
+        f'<w:gridCol w:w="{TABLE_COLUMN_WIDTH}"/>' * columns,
+        '</w:tblGrid>',
+    ]
+    for row in rows:
+        parts.append('<w:tr>')
+        for text in row:
+            paragraph = paragraph_xml([(text, None)]) if text else EMPTY_PARAGRAPH_XML
+            parts.append(f'<w:tc>{cell_properties}{paragraph}</w:tc>')
+        parts.append('</w:tr>')
+    parts.append('</w:tbl>')
+    return ''.join(parts)
+
+
+def merge_runs(tokens: Iterable[tuple[str, Optional[str]]]) -> list[tuple[str, Optional[str]]]:
+    """
+    Объединяет соседние слова с одинаковым оформлением. После каждого
+    слова (или группы слов) ставится пробел, как при выводе по слову.
+
+    :param tokens: Пары (слово, оформление).
+    :return: Пары (текст, оформление).
+    """
+    runs = []
+    words: list[str] = []
+    current = None
+    for word, style in tokens:
+        if words and style != current:
+            runs.append((''.join(words), current))
+            words = []
+        current = style
+        words.append(word + ' ')
+    if words:
+        runs.append((''.join(words), current))
+    return runs
+
+
+def line_runs(line: AnnotatedLine) -> list[tuple[str, Optional[str]]]:
+    """
+    Runs размеченной строки: вхождение — :data:`KEYWORD`, слова категорий —
+    цветом категории.
+
+    :param line: Размеченная строка контекста.
+    :return: Пары (текст, оформление).
+    """
+    return merge_runs(
+        (' '.join(words), KEYWORD if span.keyword else DOCX_COLORS.get(span.color))
+        for words, span in line.segments()
+    )
+
+
+def section_xml(section: Section) -> str:
+    """
+    Разметка раздела отчёта: заголовок ключевого слова, дата, таблица
+    категорий и контексты вхождений, каждый с чертой после него.
+
+    :param section: Размеченный раздел.
+    :return: Элементы тела документа.
+    """
+    parts = [heading_xml(f"Ключевое слово: {section.keyword}", 1)] if section.keyword is not None else []
+    if section.date is not None:
+        parts.append(heading_xml(f"Дата: {section.date}", 2))
+    if section.counts is not None:
+        rows = [('Группа', 'Количество')]
+        if section.counts:
+            rows.extend((category, str(count)) for category, count in section.counts.items())
+        else:
+            rows.append(("Нет связанных слов в контексте.", ""))
+        parts.append(table_xml(rows))
+        parts.append(EMPTY_PARAGRAPH_XML)
+    for line in section.lines:
+        parts.append(paragraph_xml(line_runs(line)))
+        parts.append(RULE_XML)
+    return ''.join(parts)
+
+
+class DocxReportWriter:
+    """
+    Потоковая запись отчёта в один или несколько файлов DOCX.
+
+    :val path: Файл отчёта; тома получают номер перед расширением.
+    :val title: Заголовок первого уровня в начале каждого тома.
+    :val volume_size: Число контекстов в томе (None — один файл).
+    :val paths: Записанные файлы.
+    """
+
+    path: Path
+    title: Optional[str]
+    volume_size: Optional[int]
+    paths: list[Path]
+
+    def __init__(
+            self,
+            path: Path,
+            title: Optional[str] = None,
+            volume_size: Optional[int] = None,
+            template: Optional[Path] = None
+    ) -> None:
+        """
+        Подготавливает запись.
+
+        :param path: Файл отчёта.
+        :param title: Заголовок отчёта.
+        :param volume_size: Число контекстов в томе.
+        :param template: Шаблон DOCX; по умолчанию шаблон python-docx.
+        """
+        self.path = Path(path)
+        self.title = title
+        self.volume_size = volume_size
+        self.paths = []
+
+        buffer = BytesIO()
+        Document(template).save(buffer)
+        self._template = buffer.getvalue()
+        with zipfile.ZipFile(BytesIO(self._template)) as package:
+            document = package.read(DOCUMENT_PART).decode('utf-8')
+        # Разделы дописываются перед свойствами раздела в конце тела
+        split = document.rindex('<w:sectPr')
+        self._head, self._tail = document[:split].encode('utf-8'), document[split:].encode('utf-8')
+
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._stream = None
+        self._contexts = 0
+
+    def _volume_path(self) -> Path:
+        if self.volume_size is None:
+            return self.path
+        return self.path.with_name(f'{self.path.stem}.{len(self.paths) + 1:03d}{self.path.suffix}')
+
+    def _open_volume(self) -> None:
+        path = self._volume_path()
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        with zipfile.ZipFile(BytesIO(self._template)) as package:
+            for item in package.infolist():
+                if item.filename != DOCUMENT_PART:
+                    self._zip.writestr(item, package.read(item))
+        self._stream = self._zip.open(DOCUMENT_PART, 'w', force_zip64=True)
+        self._stream.write(self._head)
+        if self.title is not None:
+            self._stream.write(heading_xml(self.title, 1).encode('utf-8'))
+        self._contexts = 0
+        self.paths.append(path)
+
+    def _close_volume(self) -> None:
+        self._stream.write(self._tail)
+        self._stream.close()
+        self._zip.close()
+        self._stream = self._zip = None
+
+    def add(self, fragment: str, contexts: int = 0) -> None:
+        """
+        Дописывает раздел отчёта. Раздел целиком попадает в один том.
+
+        :param fragment: Разметка элементов тела документа.
+        :param contexts: Число контекстов в разделе.
+        :return: None
+        """
+        if self._stream is None:
+            self._open_volume()
+        self._stream.write(fragment.encode('utf-8'))
+        self._contexts += contexts
+        if self.volume_size is not None and self._contexts >= self.volume_size:
+            self._close_volume()
+
+    def close(self) -> list[Path]:
+        """
+        Завершает запись.
+
+        :return: Записанные файлы.
+        """
+        if self._stream is None and not self.paths:
+            self._open_volume()
+        if self._stream is not None:
+            self._close_volume()
+        return self.paths
+
+    def __enter__(self) -> 'DocxReportWriter':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,182 @@
+"""
+Позиционный инвертированный индекс поверх хранилища корпуса.
+
+Для каждой словоформы хранятся пары (документ, позиция токена в документе),
+отсортированные по документу и позиции. Индекс лежит рядом с корпусом:
+
+* ``postings.i64`` — границы списков вхождений по идентификатору словоформы;
+* ``postings_docs.i32`` — номера документов;
+* ``postings_pos.i32`` — позиции токенов внутри документа;
+* ``postings.json`` — число документов и токенов и хэш docs.json
+  хранилища, по которому построен индекс.
+
+Запрос по слову читает только его список вхождений, то есть стоит
+O(число вхождений), и не затрагивает документы без вхождений.
+"""
+import hashlib
+import json
+import logging
+from array import array
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Iterator
+
+from analysis._utils import normalize_phrase
+from analysis.corpus import DOCS_FILE as CORPUS_DOCS_FILE, CorpusStore
+
+logger = logging.getLogger(__name__)
+
+OFFSETS_FILE = 'postings.i64'
+DOCS_FILE = 'postings_docs.i32'
+POSITIONS_FILE = 'postings_pos.i32'
+META_FILE = 'postings.json'
+
+
+def store_signature(store: CorpusStore) -> dict[str, Any]:
+    """
+    Описание хранилища, по которому проверяется, что индекс построен по нему.
+
+    :param store: Открытое хранилище корпуса.
+    :return: Число документов и токенов и хэш docs.json.
+    """
+    with (store.path / CORPUS_DOCS_FILE).open('rb') as f:
+        digest = hashlib.file_digest(f, 'sha256').hexdigest()
+    return {'documents': len(store), 'tokens': len(store.tokens), 'docs_digest': digest}
+
+
+def build_index(store: CorpusStore) -> 'PositionalIndex':
+    """
+    Строит индекс по корпусу сортировкой подсчётом.
+
+    :param store: Открытое хранилище корпуса.
+    :return: Открытый индекс.
+    """
+    counts = array('q', bytes(8 * (len(store.vocab) + 1)))
+    for token in store.tokens:
+        counts[token + 1] += 1
+    for term in range(len(store.vocab)):
+        counts[term + 1] += counts[term]
+
+    total = counts[-1]
+    docs = array('i', bytes(4 * total))
+    positions = array('i', bytes(4 * total))
+    cursor = array('q', counts[:-1])
+    for doc_id in range(len(store)):
+        for position, token in enumerate(store.doc_tokens(doc_id)):
+            slot = cursor[token]
+            docs[slot] = doc_id
+            positions[slot] = position
+            cursor[token] = slot + 1
+
+    for name, data in ((OFFSETS_FILE, counts), (DOCS_FILE, docs), (POSITIONS_FILE, positions)):
+        with (store.path / name).open('wb') as f:
+            data.tofile(f)
+    # Описание хранилища пишется последним: прерванная сборка индекса не
+    # будет принята за готовую
+    with (store.path / META_FILE).open('w', encoding='utf-8') as f:
+        json.dump(store_signature(store), f)
+
+    logger.info(f"Индекс построен: {len(store.vocab)} словоформ, {total} вхождений.")
+    return PositionalIndex(store)
+
+
+class PositionalIndex:
+    """
+    Позиционный индекс, открытый через mmap.
+
+    :val store: Хранилище корпуса, по которому построен индекс.
+    """
+
+    store: CorpusStore
+
+    def __init__(self, store: CorpusStore) -> None:
+        """
+        Открывает индекс, лежащий в каталоге хранилища.
+
+        :param store: Хранилище корпуса.
+        """
+        self.store = store
+        self._offsets = store.map_array(OFFSETS_FILE, 'q')
+        self._docs = store.map_array(DOCS_FILE, 'i')
+        self._positions = store.map_array(POSITIONS_FILE, 'i')
+
+    @classmethod
+    def open_or_build(cls, store: CorpusStore) -> 'PositionalIndex':
+        """
+        Открывает индекс; если его нет или он построен по другому
+        состоянию хранилища (после пересборки корпуса), строит заново.
+
+        :param store: Хранилище корпуса.
+        :return: Открытый индекс.
+        """
+        try:
+            with (store.path / META_FILE).open(encoding='utf-8') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            meta = None
+        if meta == store_signature(store) and (store.path / POSITIONS_FILE).exists():
+            return cls(store)
+        logger.info("Индекс отсутствует или устарел, строится заново.")
+        return build_index(store)
+
+    def hits(self, term: str) -> Iterator[tuple[int, int]]:
+        """
+        Перебирает вхождения словоформы.
+
+        :param term: Словоформа.
+        :return: Итератор пар (документ, позиция).
+        """
+        term_id = self.store.term_id(term)
+        if term_id is None:
+            return
+        start, end = self._offsets[term_id], self._offsets[term_id + 1]
+        yield from zip(self._docs[start:end], self._positions[start:end])
+
+    def phrase_hits(self, phrase: str) -> Iterator[tuple[int, int]]:
+        """
+        Перебирает вхождения многословной фразы.
+
+        Кандидаты берутся из списка первого слова и проверяются по спискам
+        остальных слов.
+
+        :param phrase: Слово или словосочетание.
+        :return: Итератор пар (документ, позиция первого слова).
+        """
+        tokens = normalize_phrase(phrase)
+        if len(tokens) <= 1:
+            yield from self.hits(tokens[0] if tokens else '')
+            return
+
+        rest = [set(self.hits(token)) for token in tokens[1:]]
+        for doc_id, position in self.hits(tokens[0]):
+            if all((doc_id, position + shift) in hits for shift, hits in enumerate(rest, 1)):
+                yield doc_id, position
+
+    def postings(self, phrase: str) -> dict[int, list[int]]:
+        """
+        Группирует вхождения по документам.
+
+        :param phrase: Слово или словосочетание.
+        :return: Словарь: документ -> позиции вхождений.
+        """
+        return {
+            doc_id: [position for _, position in group]
+            for doc_id, group in groupby(self.phrase_hits(phrase), key=itemgetter(0))
+        }
+
+    def doc_freq(self, term: str) -> int:
+        """
+        Возвращает число документов, содержащих словоформу.
+
+        :param term: Словоформа.
+        :return: Число документов.
+        """
+        return len(set(doc_id for doc_id, _ in self.hits(term)))
+
+    def __contains__(self, term: str) -> bool:
+        return self.store.term_id(term) is not None
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    build_index(CorpusStore.open_or_build())
@@ -0,0 +1,317 @@
+"""
+Компиляция словарей (es.json, ev.json, mp.json) в автомат Ахо — Корасик.
+
+Автомат работает над последовательностью токенов, а не символов, поэтому
+многословные статьи словаря ("hin und", "festen Kurs halten") находятся
+так же, как и отдельные слова, за один линейный проход по тексту.
+
+Построение автомата для большого словаря занимает секунды, поэтому
+скомпилированные словари (данные, обратный словарь слово -> категория и
+автомат) сохраняются в двоичный кэш (``CL_LEXICON_CACHE``, по умолчанию
+.cache/lexicons). Ключ кэша — хэш содержимого исходных файлов, так что
+изменённый словарь пересобирается сам.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+from collections import Counter, deque
+from pathlib import Path
+from typing import Callable, Hashable, Iterable, Iterator, Mapping, NamedTuple, Optional, Sequence, TypeVar, Union
+
+from analysis._utils import normalize_phrase
+from analysis.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+Lexicon = Union[Mapping[str, Sequence[str]], Sequence[str]]
+
+CACHE_DIR = Path(os.environ.get('CL_LEXICON_CACHE', '.cache/lexicons'))
+# Меняется вместе с устройством PhraseMatcher, чтобы старый кэш не читался
+CACHE_VERSION = 3
+
+T = TypeVar('T')
+
+
+class PhraseMatcher:
+    """
+    Автомат Ахо — Корасик над токенами.
+
+    :val categories: Список категорий в порядке добавления.
+    :val digest: Хэш словарей, из которых собран автомат (его задают
+        :func:`load_compiled` и :func:`cached_matcher`); None — автомат
+        собран вручную.
+    """
+
+    categories: list[Hashable]
+    digest: Optional[str] = None
+
+    def __init__(self) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[tuple[tuple[Hashable, int], ...]] = [()]
+        self._built = False
+        self.categories = []
+
+    def add(self, phrase: str, category: Hashable) -> None:
+        """
+        Добавляет фразу в автомат.
+
+        :param phrase: Слово или словосочетание.
+        :param category: Категория, к которой относится фраза.
+        :return: None
+        """
+        tokens = normalize_phrase(phrase)
+        if not tokens:
+            return
+        if category not in self.categories:
+            self.categories.append(category)
+
+        node = 0
+        for token in tokens:
+            nxt = self._goto[node].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][token] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+
+        entry = (category, len(tokens))
+        if entry not in self._out[node]:
+            self._out[node] += (entry,)
+        self._built = False
+
+    def add_lexicon(self, lexicon: Lexicon, tag: Hashable = None) -> None:
+        """
+        Добавляет в автомат словарь или список фраз.
+
+        Словарь вида ``{категория: [фразы]}`` (es.json, ev.json) добавляет фразы
+        под своими категориями, список (mp.json) — каждую фразу под
+        собственным именем в нижнем регистре. Если задан ``tag``, категорией
+        становится пара ``(tag, категория)``, что позволяет держать несколько
+        словарей в одном автомате.
+
+        :param lexicon: Словарь категорий или список фраз.
+        :param tag: Метка словаря.
+        :return: None
+        """
+        if isinstance(lexicon, Mapping):
+            items = ((category, phrase) for category, phrases in lexicon.items() for phrase in phrases)
+        else:
+            items = ((' '.join(normalize_phrase(phrase)), phrase) for phrase in lexicon)
+        for category, phrase in items:
+            self.add(phrase, category if tag is None else (tag, category))
+
+    def build(self) -> 'PhraseMatcher':
+        """
+        Строит суффиксные ссылки автомата.
+
+        :return: Текущий автомат.
+        """
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(token, 0)
+                self._fail[child] = target if target != child else 0
+                # Выходы суффиксной вершины наследуются, чтобы при поиске
+                # не ходить по цепочке ссылок
+                for entry in self._out[self._fail[child]]:
+                    if entry not in self._out[child]:
+                        self._out[child] += (entry,)
+        self._built = True
+        return self
+
+    def finditer(self, tokens: Iterable[str]) -> Iterator[tuple[Hashable, int, int]]:
+        """
+        Находит все вхождения фраз словаря.
+
+        :param tokens: Токены текста в нижнем регистре.
+        :return: Итератор кортежей (категория, начало, конец).
+        """
+        if not self._built:
+            self.build()
+
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for index, token in enumerate(tokens):
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            for category, length in out[node]:
+                yield category, index - length + 1, index + 1
+
+    def count(self, tokens: Iterable[str]) -> Counter:
+        """
+        Подсчитывает вхождения каждой категории.
+
+        :param tokens: Токены текста в нижнем регистре.
+        :return: Счётчик категорий.
+        """
+        return Counter(category for category, _, _ in self.finditer(tokens))
+
+    def __len__(self) -> int:
+        return sum(1 for out in self._out if out)
+
+
+def load_lexicon(file_path: Path) -> Lexicon:
+    """
+    Загружает словарь из JSON-файла.
+
+    :param file_path: Путь к JSON-файлу.
+    :return: Словарь категорий или список слов.
+    """
+    with Path(file_path).open(encoding='utf-8') as f:
+        data = json.load(f)
+    logger.info(f"Словарь {file_path} успешно загружен.")
+    return data
+
+
+def compile_lexicon(*lexicons: Lexicon) -> PhraseMatcher:
+    """
+    Компилирует один или несколько словарей в общий автомат.
+
+    :param lexicons: Словари или списки фраз (см. :meth:`PhraseMatcher.add_lexicon`).
+    :return: Построенный автомат.
+    """
+    matcher = PhraseMatcher()
+    for lexicon in lexicons:
+        matcher.add_lexicon(lexicon)
+    return matcher.build()
+
+
+def word_categories(lexicon: Lexicon) -> dict[str, Hashable]:
+    """
+    Обратный словарь: слово -> категория. Слово из нескольких категорий
+    относится к последней; у списка фраз (mp.json) категория — сама фраза.
+
+    :param lexicon: Словарь категорий или список фраз.
+    :return: Словарь: слово в нижнем регистре -> категория.
+    """
+    if not isinstance(lexicon, Mapping):
+        lexicon = {phrase: [phrase] for phrase in lexicon}
+    categories = {}
+    for category, words in lexicon.items():
+        for word in words:
+            word_clean = word.strip().lower()
+            if word_clean:
+                categories[word_clean] = category
+    return categories
+
+
+class CompiledLexicon(NamedTuple):
+    """
+    Скомпилированный словарь из файла.
+
+    :var digest: Хэш содержимого файла.
+    :var data: Исходный словарь категорий или список фраз.
+    :var words: Обратный словарь слово -> категория.
+    :var matcher: Построенный автомат.
+    """
+
+    digest: str
+    data: Lexicon
+    words: dict[str, Hashable]
+    matcher: PhraseMatcher
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(f'{CACHE_VERSION}:'.encode() + data).hexdigest()
+
+
+def _cached(name: str, digest: str, build: Callable[[], T], cache_dir: Optional[Path] = None) -> T:
+    """
+    Читает объект из кэша или строит и сохраняет его. Старые версии с тем
+    же именем удаляются.
+
+    :param name: Имя записи кэша.
+    :param digest: Хэш исходных данных.
+    :param build: Построение объекта при промахе.
+    :param cache_dir: Каталог кэша.
+    :return: Объект.
+    """
+    cache_dir = Path(cache_dir or CACHE_DIR)
+    path = cache_dir / f'{name}-{digest[:32]}.pickle'
+    try:
+        with path.open('rb') as f:
+            value = pickle.load(f)
+        metrics.hit('lexicon_cache', True)
+        return value
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Кэш словаря {path} повреждён и будет пересобран: {e}")
+    metrics.hit('lexicon_cache', False)
+
+    value = build()
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        with tmp.open('wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        for stale in cache_dir.glob(f'{name}-*.pickle'):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+    except OSError as e:
+        logger.warning(f"Не удалось сохранить кэш словаря {path}: {e}")
+    return value
+
+
+def load_compiled(file_path: Path, cache_dir: Optional[Path] = None) -> CompiledLexicon:
+    """
+    Загружает словарь из JSON-файла вместе с обратным словарём и автоматом.
+    При неизменном файле всё читается из кэша без разбора JSON и
+    построения автомата.
+
+    :param file_path: Путь к JSON-файлу.
+    :param cache_dir: Каталог кэша.
+    :return: Скомпилированный словарь.
+    """
+    file_path = Path(file_path)
+    raw = file_path.read_bytes()
+    digest = _digest(raw)
+
+    def build() -> CompiledLexicon:
+        data = json.loads(raw)
+        logger.info(f"Словарь {file_path} скомпилирован.")
+        matcher = compile_lexicon(data)
+        matcher.digest = digest
+        return CompiledLexicon(digest, data, word_categories(data), matcher)
+
+    # Имя записи включает путь, чтобы одноимённые словари из разных
+    # каталогов не вытесняли друг друга
+    name = f'{file_path.stem}-{hashlib.sha256(str(file_path.resolve()).encode()).hexdigest()[:8]}'
+    return _cached(name, digest, build, cache_dir)
+
+
+def cached_matcher(lexicons: Sequence[tuple[Hashable, Lexicon]], cache_dir: Optional[Path] = None) -> PhraseMatcher:
+    """
+    Строит общий автомат для помеченных словарей (см. ``tag`` в
+    :meth:`PhraseMatcher.add_lexicon`) с кэшированием по их содержимому.
+
+    :param lexicons: Пары (метка, словарь).
+    :param cache_dir: Каталог кэша.
+    :return: Построенный автомат.
+    """
+    tags = repr([tag for tag, _ in lexicons]).encode('utf-8')
+    content = json.dumps([lexicon for _, lexicon in lexicons], ensure_ascii=False).encode('utf-8')
+
+    digest = _digest(tags + b'\0' + content)
+
+    def build() -> PhraseMatcher:
+        matcher = PhraseMatcher()
+        for tag, lexicon in lexicons:
+            matcher.add_lexicon(lexicon, tag=tag)
+        matcher.digest = digest
+        return matcher.build()
+
+    return _cached(f'matcher-{hashlib.sha256(tags).hexdigest()[:8]}', digest, build, cache_dir)
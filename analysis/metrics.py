@@ -0,0 +1,319 @@
+"""
+Замеры времени по этапам и счётчики прогона.
+
+Один общий объект :data:`metrics` используется в pars/ и main.py. По
+умолчанию он выключен: :meth:`Metrics.stage` возвращает общий пустой
+контекст, а :meth:`Metrics.count` сразу выходит, поэтому вызовы можно
+оставлять в рабочем коде. Включается вызовом ``metrics.enable()`` или
+переменной окружения ``CL_METRICS=1``; путь отчёта задаёт
+``CL_METRICS_REPORT``, а ``CL_PROFILE`` — файл статистики cProfile.
+
+Этапы: ``fetch``, ``parse``, ``clean``, ``tokenize``, ``match``,
+``consume``, ``report``. Время этапа суммируется по всем вызовам (и по
+потокам, если этап выполняется параллельно).
+"""
+import cProfile
+import csv
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Iterator, Optional
+
+ENV_VAR = 'CL_METRICS'
+REPORT_PATH = Path(os.environ.get('CL_METRICS_REPORT', 'metrics_report.json'))
+PROFILE_PATH = os.environ.get('CL_PROFILE')
+
+_NULL_STAGE = nullcontext()
+
+
+class StageTimer:
+    """
+    Накопленное время одного этапа.
+
+    :val count: Число вызовов.
+    :val total: Суммарное время в секундах.
+    :val min: Минимальное время вызова.
+    :val max: Максимальное время вызова.
+    """
+
+    __slots__ = ('count', 'total', 'min', 'max')
+
+    def __init__(self, count: int = 0, total: float = 0.0, min: float = float('inf'), max: float = 0.0) -> None:
+        self.count = count
+        self.total = total
+        self.min = min
+        self.max = max
+
+    def add(self, elapsed: float, count: int = 1) -> None:
+        self.count += count
+        self.total += elapsed
+        self.min = min(self.min, elapsed)
+        self.max = max(self.max, elapsed)
+
+    def merge(self, other: 'StageTimer') -> None:
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+
+class _Stage:
+    """
+    Контекст замера одного вызова этапа.
+    """
+
+    __slots__ = ('_metrics', '_name', '_start')
+
+    def __init__(self, metrics: 'Metrics', name: str) -> None:
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self) -> '_Stage':
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._metrics.add_time(self._name, time.perf_counter() - self._start)
+
+
+class Metrics:
+    """
+    Таймеры этапов и счётчики прогона.
+
+    :val enabled: Включён ли сбор.
+    :val timers: Таймеры по именам этапов.
+    :val counters: Счётчики по именам.
+    """
+
+    enabled: bool
+    timers: dict[str, StageTimer]
+    counters: Counter
+
+    def __init__(self, enabled: bool = False) -> None:
+        """
+        Создаёт пустой набор замеров.
+
+        :param enabled: Включить сбор сразу.
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self) -> 'Metrics':
+        """
+        Включает сбор и начинает отсчёт времени прогона заново.
+
+        :return: Текущий объект.
+        """
+        self.reset()
+        self.enabled = True
+        return self
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        """
+        Сбрасывает таймеры и счётчики.
+
+        :return: None
+        """
+        with self._lock:
+            self.timers = {}
+            self.counters = Counter()
+            self._started = time.perf_counter()
+
+    def stage(self, name: str) -> ContextManager:
+        """
+        Контекст, время выполнения которого добавляется к этапу.
+
+        :param name: Имя этапа.
+        :return: Контекстный менеджер.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def timed(self, name: str) -> Callable[[Callable], Callable]:
+        """
+        Декоратор: время вызовов функции добавляется к этапу.
+
+        :param name: Имя этапа.
+        :return: Декоратор.
+        """
+        def decorator(func: Callable) -> Callable:
+            @wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Stage(self, name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def add_time(self, name: str, elapsed: float, count: int = 1) -> None:
+        """
+        Добавляет время к этапу.
+
+        :param name: Имя этапа.
+        :param elapsed: Время в секундах.
+        :param count: Число вызовов.
+        :return: None
+        """
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = StageTimer()
+            timer.add(elapsed, count)
+
+    def count(self, name: str, value: int = 1) -> None:
+        """
+        Увеличивает счётчик.
+
+        :param name: Имя счётчика (``pages``, ``tokens``, ``lexicon_hits``...).
+        :param value: Прибавляемое значение.
+        :return: None
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += value
+
+    def hit(self, name: str, hit: bool) -> None:
+        """
+        Учитывает попадание или промах кэша.
+
+        :param name: Имя кэша.
+        :param hit: Было ли попадание.
+        :return: None
+        """
+        if not self.enabled:
+            return
+        self.count(f'{name}.{"hits" if hit else "misses"}')
+
+    def snapshot(self) -> dict[str, Any]:
+        """
+        Возвращает накопленные данные в виде, пригодном для передачи между
+        процессами, и сбрасывает их.
+
+        :return: Таймеры и счётчики.
+        """
+        with self._lock:
+            data = {
+                'timers': {name: (t.count, t.total, t.min, t.max) for name, t in self.timers.items()},
+                'counters': dict(self.counters),
+            }
+            self.timers = {}
+            self.counters = Counter()
+        return data
+
+    def merge(self, data: Optional[dict[str, Any]]) -> None:
+        """
+        Добавляет данные, собранные в другом процессе (:meth:`snapshot`).
+
+        :param data: Таймеры и счётчики или None.
+        :return: None
+        """
+        if not data:
+            return
+        with self._lock:
+            for name, values in data['timers'].items():
+                self.timers.setdefault(name, StageTimer()).merge(StageTimer(*values))
+            self.counters.update(data['counters'])
+
+    @contextmanager
+    def profile(self, path: Optional[Path] = None) -> Iterator[Optional[cProfile.Profile]]:
+        """
+        Запускает cProfile на время блока, если сбор включён и указан путь.
+
+        :param path: Файл для статистики (открывается pstats или snakeviz).
+        :return: Профилировщик или None.
+        """
+        if not (self.enabled and path):
+            yield None
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            profiler.dump_stats(str(path))
+
+    def report(self) -> dict[str, Any]:
+        """
+        Собирает отчёт прогона.
+
+        Пропускная способность — значение счётчика, делённое на время
+        прогона; доля попаданий считается для каждой пары счётчиков
+        ``<кэш>.hits`` / ``<кэш>.misses``.
+
+        :return: Время прогона, этапы, счётчики, скорости и доли попаданий.
+        """
+        elapsed = time.perf_counter() - self._started
+        with self._lock:
+            stages = {
+                name: {
+                    'count': t.count,
+                    'total': t.total,
+                    'mean': t.total / t.count if t.count else 0.0,
+                    'min': t.min if t.count else 0.0,
+                    'max': t.max,
+                    'share': t.total / elapsed if elapsed else 0.0,
+                }
+                for name, t in sorted(self.timers.items(), key=lambda item: -item[1].total)
+            }
+            counters = dict(self.counters)
+
+        rates = {f'{name}/s': value / elapsed for name, value in counters.items() if elapsed}
+        hit_rates = {}
+        for name in counters:
+            if name.endswith('.hits'):
+                cache = name[:-len('.hits')]
+                total = counters[name] + counters.get(f'{cache}.misses', 0)
+                hit_rates[cache] = counters[name] / total
+        for name in counters:
+            if name.endswith('.misses') and name[:-len('.misses')] not in hit_rates:
+                hit_rates[name[:-len('.misses')]] = 0.0
+
+        return {
+            'elapsed': elapsed,
+            'stages': stages,
+            'counters': counters,
+            'rates': rates,
+            'hit_rates': hit_rates,
+        }
+
+    def write(self, path: Path) -> dict[str, Any]:
+        """
+        Сохраняет отчёт в JSON или, для файла с расширением .csv, в CSV
+        (строки: раздел, имя, значения).
+
+        :param path: Файл отчёта.
+        :return: Отчёт.
+        """
+        path = Path(path)
+        report = self.report()
+        if path.suffix.lower() == '.csv':
+            with path.open('w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['section', 'name', 'value', 'count', 'mean', 'min', 'max', 'share'])
+                writer.writerow(['run', 'elapsed', report['elapsed'], '', '', '', '', ''])
+                for name, stage in report['stages'].items():
+                    writer.writerow(['stage', name, stage['total'], stage['count'], stage['mean'],
+                                     stage['min'], stage['max'], stage['share']])
+                for section in ('counters', 'rates', 'hit_rates'):
+                    for name, value in report[section].items():
+                        writer.writerow([section, name, value, '', '', '', '', ''])
+        else:
+            with path.open('w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        return report
+
+
+metrics = Metrics(enabled=os.environ.get(ENV_VAR) == '1')
@@ -0,0 +1,189 @@
+"""
+Общий проход по корпусу для нескольких анализаторов.
+
+Каждый документ токенизируется один раз, а словари всех подключённых
+анализаторов собраны в один автомат (:class:`analysis.lexicon.PhraseMatcher`),
+поэтому поиск по токенам выполняется одним проходом независимо от числа
+анализаторов. Найденные вхождения раздаются анализаторам по их словарям.
+"""
+import abc
+import asyncio
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Mapping, Optional, Sequence
+
+from analysis.lexicon import Lexicon, PhraseMatcher, cached_matcher
+from analysis.metrics import metrics
+
+Match = tuple[str, int, int]
+Results = Dict[str, Dict[str, Counter]]
+
+
+class TokenAnalyzer(abc.ABC):
+    """
+    Анализатор, подключаемый к общему проходу.
+
+    :val name: Уникальное имя анализатора в конвейере.
+    """
+
+    name: str
+
+    @abc.abstractmethod
+    def lexicons(self) -> Mapping[str, Lexicon]:
+        """
+        Возвращает словари, вхождения которых нужны анализатору.
+
+        :return: Словарь: имя словаря -> словарь категорий или список фраз.
+        """
+
+    @abc.abstractmethod
+    def consume(self, words: Sequence[str], matches: Mapping[str, list[Match]]) -> Dict[str, Counter]:
+        """
+        Обрабатывает один документ.
+
+        :param words: Токены документа в нижнем регистре.
+        :param matches: Вхождения (категория, начало, конец) по именам словарей.
+        :return: Частичные счётчики документа по именам.
+        """
+
+
+class FusedPipeline:
+    """
+    Конвейер, прогоняющий документы через все анализаторы за один проход.
+
+    :val analyzers: Подключённые анализаторы по именам.
+    """
+
+    analyzers: Dict[str, TokenAnalyzer]
+
+    def __init__(self, analyzers: Iterable[TokenAnalyzer] = ()) -> None:
+        """
+        Создаёт конвейер.
+
+        :param analyzers: Анализаторы для подключения.
+        """
+        self.analyzers = {}
+        self._matcher: Optional[PhraseMatcher] = None
+        for analyzer in analyzers:
+            self.register(analyzer)
+
+    def register(self, analyzer: TokenAnalyzer) -> 'FusedPipeline':
+        """
+        Подключает анализатор.
+
+        :param analyzer: Анализатор.
+        :return: Текущий конвейер.
+        """
+        if analyzer.name in self.analyzers:
+            raise ValueError(f"Анализатор {analyzer.name!r} уже подключён")
+        self.analyzers[analyzer.name] = analyzer
+        self._matcher = None
+        return self
+
+    @property
+    def matcher(self) -> PhraseMatcher:
+        """
+        Общий автомат для словарей всех анализаторов. Собранный автомат
+        берётся из кэша словарей, пока словари не меняются.
+
+        :return: Построенный автомат.
+        """
+        if self._matcher is None:
+            self._matcher = cached_matcher([
+                ((name, lexicon_name), lexicon)
+                for name, analyzer in self.analyzers.items()
+                for lexicon_name, lexicon in analyzer.lexicons().items()
+            ])
+        return self._matcher
+
+    def process_document(self, words: Sequence[str]) -> Results:
+        """
+        Прогоняет один документ через все анализаторы.
+
+        :param words: Токены документа в нижнем регистре.
+        :return: Частичные счётчики по анализаторам.
+        """
+        buckets = {
+            name: {lexicon_name: [] for lexicon_name in analyzer.lexicons()}
+            for name, analyzer in self.analyzers.items()
+        }
+        hits = 0
+        with metrics.stage('match'):
+            for ((name, lexicon_name), category), start, end in self.matcher.finditer(words):
+                buckets[name][lexicon_name].append((category, start, end))
+                hits += 1
+        metrics.count('documents')
+        metrics.count('tokens', len(words))
+        metrics.count('lexicon_hits', hits)
+
+        with metrics.stage('consume'):
+            return {
+                name: analyzer.consume(words, buckets[name])
+                for name, analyzer in self.analyzers.items()
+            }
+
+    def run(self, documents: Iterable[Sequence[str]]) -> Results:
+        """
+        Прогоняет документы через все анализаторы.
+
+        :param documents: Токены каждого документа в нижнем регистре.
+        :return: Суммарные счётчики по анализаторам.
+        """
+        totals = self.empty_results()
+        for words in documents:
+            self.merge(totals, self.process_document(words))
+        return totals
+
+    async def arun(self, documents: Iterable[Sequence[str]]) -> Results:
+        """
+        То же, что :meth:`run`, но уступает управление циклу событий после
+        каждого документа.
+
+        :param documents: Токены каждого документа в нижнем регистре.
+        :return: Суммарные счётчики по анализаторам.
+        """
+        totals = self.empty_results()
+        for words in documents:
+            self.merge(totals, self.process_document(words))
+            await asyncio.sleep(0)  # Асинхронная совместимость
+        return totals
+
+    def empty_results(self) -> Results:
+        """
+        Возвращает пустые суммарные счётчики.
+
+        :return: Словарь счётчиков по анализаторам.
+        """
+        return {name: defaultdict(Counter) for name in self.analyzers}
+
+    @staticmethod
+    def merge(totals: Results, partial: Results) -> Results:
+        """
+        Добавляет частичные счётчики к суммарным.
+
+        :param totals: Суммарные счётчики (изменяются на месте).
+        :param partial: Частичные счётчики.
+        :return: Суммарные счётчики.
+        """
+        for name, counters in partial.items():
+            target = totals.setdefault(name, defaultdict(Counter))
+            for key, counter in counters.items():
+                target[key].update(counter)
+        return totals
+
+    @staticmethod
+    def subtract(totals: Results, partial: Results) -> Results:
+        """
+        Вычитает частичные счётчики из суммарных (обратное :meth:`merge`).
+        Нулевые значения удаляются, чтобы итоги совпадали с пересчётом.
+
+        :param totals: Суммарные счётчики (изменяются на месте).
+        :param partial: Частичные счётчики, ранее добавленные к суммарным.
+        :return: Суммарные счётчики.
+        """
+        for name, counters in partial.items():
+            target = totals.setdefault(name, defaultdict(Counter))
+            for key, counter in counters.items():
+                target[key].subtract(counter)
+                for item in [item for item, count in target[key].items() if count <= 0]:
+                    del target[key][item]
+        return totals
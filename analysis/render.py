@@ -0,0 +1,393 @@
+"""
+Вывод размеченных разделов (:mod:`analysis.annotate`).
+
+Каждый вариант вывода — класс с методами ``add(section)`` и ``close()``.
+Один поток разделов передаётся сразу нескольким вариантам
+(:func:`render`), поэтому анализ выполняется один раз на все форматы.
+Варианты: ``ansi`` (терминал, colorama), ``table`` (таблицы категорий,
+prettytable), ``html`` и ``docx`` (python-docx); зависимости варианта
+импортируются только при его создании.
+
+Вариант может собирать свою часть вывода раздела в процессах пула
+(:meth:`Renderer.fragment`, :func:`prerender_section`): e4 так собирает
+XML разделов DOCX рядом с разметкой, а в основном процессе остаётся
+только запись.
+
+Запуск: ``python -m analysis.render разметка.jsonl --format html docx --output отчёт``
+"""
+import abc
+import argparse
+import html
+import sys
+from pathlib import Path
+from typing import Any, Callable, Iterable, Mapping, NamedTuple, Optional, Sequence, TextIO, Union
+
+from analysis.annotate import AnnotatedLine, Section, SectionTask, annotate_section, init_annotator, read_sections
+
+RENDERERS: dict[str, type['Renderer']] = {}
+
+
+def renderer(name: str) -> Callable[[type['Renderer']], type['Renderer']]:
+    """
+    Регистрирует вариант вывода.
+
+    :param name: Имя варианта.
+    """
+    def register(cls: type['Renderer']) -> type['Renderer']:
+        cls.name = name
+        RENDERERS[name] = cls
+        return cls
+    return register
+
+
+def create_renderer(name: str, path: Optional[Path] = None, title: Optional[str] = None, **options: Any) -> 'Renderer':
+    """
+    Создаёт вариант вывода по имени.
+
+    :param name: Имя варианта (``ansi``, ``table``, ``html``, ``docx``).
+    :param path: Файл вывода; для текстовых вариантов None — stdout.
+    :param title: Заголовок отчёта.
+    :param options: Параметры варианта.
+    :return: Вариант вывода.
+    """
+    return RENDERERS[name](path, title, **options)
+
+
+def counts_table(counts: Mapping[str, int]) -> str:
+    """
+    Таблица категорий в окнах (prettytable).
+
+    :param counts: Категория -> число.
+    :return: Текст таблицы.
+    """
+    from prettytable import PrettyTable
+    table = PrettyTable()
+    table.field_names = ["Группа", "Количество"]
+    table.align["Группа"] = "l"
+    if counts:
+        for category, count in counts.items():
+            table.add_row([category, count])
+    else:
+        table.add_row(["Нет связанных слов в контексте.", ""])
+    return table.get_string()
+
+
+class Renderer(abc.ABC):
+    """
+    Вариант вывода разделов.
+
+    :val name: Имя варианта, под которым он зарегистрирован.
+    :val path: Файл вывода или None.
+    :val title: Заголовок отчёта или None.
+    :val paths: Записанные файлы.
+    """
+
+    name: Optional[str] = None
+    suffix: Optional[str] = None
+
+    path: Optional[Path]
+    title: Optional[str]
+    paths: list[Path]
+
+    def __init__(self, path: Optional[Path] = None, title: Optional[str] = None) -> None:
+        self.path = Path(path) if path is not None else None
+        self.title = title
+        self.paths = []
+
+    @abc.abstractmethod
+    def add(self, section: Section) -> None:
+        """
+        Выводит один раздел.
+
+        :param section: Размеченный раздел.
+        :return: None
+        """
+
+    @staticmethod
+    def fragment(section: Section) -> Any:
+        """
+        Часть вывода раздела, которую можно собрать в процессе пула.
+
+        :param section: Размеченный раздел.
+        :return: Фрагмент для :meth:`add_fragment`; None — вариант выводит
+            раздел сам в :meth:`add`.
+        """
+        return None
+
+    def add_fragment(self, section: Section, fragment: Any) -> None:
+        """
+        Выводит раздел по фрагменту, собранному :meth:`fragment`.
+
+        :param section: Размеченный раздел.
+        :param fragment: Фрагмент вывода.
+        :return: None
+        """
+        self.add(section)
+
+    def close(self) -> list[Path]:
+        return self.paths
+
+    def __enter__(self) -> 'Renderer':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class TextRenderer(Renderer):
+    """
+    Текстовый вывод в файл или, если файл не указан, в текущий sys.stdout
+    (его может подменить colorama).
+    """
+
+    def __init__(self, path: Optional[Path] = None, title: Optional[str] = None) -> None:
+        super().__init__(path, title)
+        self._out: Optional[TextIO] = None
+        if self.path is not None:
+            self._out = self.path.open('w', encoding='utf-8')
+            self.paths.append(self.path)
+
+    def write(self, text: str) -> None:
+        (self._out or sys.stdout).write(text)
+
+    def close(self) -> list[Path]:
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+        return self.paths
+
+
+@renderer('ansi')
+class AnsiRenderer(TextRenderer):
+    """
+    Вывод в терминал: вхождение на жёлтом фоне, слова категорий — цветом
+    категории.
+    """
+
+    def __init__(self, path: Optional[Path] = None, title: Optional[str] = None) -> None:
+        from colorama import Back, Fore, Style
+        super().__init__(path, title)
+        self._colors = {'blue': Fore.BLUE, 'green': Fore.GREEN, 'red': Fore.RED, 'yellow': Fore.YELLOW}
+        self._keyword = Back.YELLOW
+        self._reset = Style.RESET_ALL
+        if title is not None:
+            self.write(f"{title}\n")
+
+    def line(self, line: AnnotatedLine) -> str:
+        """
+        Строка контекста с кодами цвета у каждого выделенного слова.
+        """
+        parts = []
+        for words, span in line.segments():
+            if span.keyword:
+                prefix = self._keyword
+            elif span.category is not None:
+                prefix = self._colors.get(span.color, '')
+            else:
+                parts.extend(words)
+                continue
+            parts.extend(f"{prefix}{word}{self._reset}" for word in words)
+        return ' '.join(parts)
+
+    def add(self, section: Section) -> None:
+        if section.keyword is not None:
+            self.write(f"\n\nКлючевое слово: {section.keyword}\n")
+        if section.date is not None:
+            self.write(f"\n\nДата: {section.date}\n\n")
+        if section.counts is not None:
+            self.write(f"{counts_table(section.counts)}\n\n")
+        for line in section.lines:
+            self.write(self.line(line) + '\n')
+
+
+@renderer('table')
+class TableRenderer(TextRenderer):
+    """
+    Только таблицы категорий по ключевым словам (и датам, если они есть).
+    """
+
+    def add(self, section: Section) -> None:
+        if section.counts is None:
+            return
+        if section.keyword is not None:
+            self.write(f"Ключевое слово: {section.keyword}\n")
+        if section.date is not None:
+            self.write(f"Дата: {section.date}\n")
+        self.write(f"{counts_table(section.counts)}\n\n")
+
+
+@renderer('html')
+class HtmlRenderer(TextRenderer):
+    """
+    Страница HTML; классы цвета категорий — классы CSS, категория слова —
+    всплывающая подсказка.
+    """
+
+    suffix = '.html'
+
+    STYLE = (
+        'mark.keyword { font-weight: bold; background: yellow; }\n'
+        '.blue { color: #0000FF; } .green { color: #008000; } .red { color: #FF0000; } .yellow { color: #FFFF00; }\n'
+        'p.context { border-bottom: 1px solid #000; padding-bottom: 0.3em; }\n'
+        'table.counts td, table.counts th { padding: 0 1em; text-align: left; }'
+    )
+
+    def __init__(self, path: Optional[Path] = None, title: Optional[str] = None) -> None:
+        super().__init__(path, title)
+        heading = f'<h1>{html.escape(title)}</h1>\n' if title is not None else ''
+        self.write(
+            '<!DOCTYPE html>\n<html lang="de">\n<head>\n<meta charset="utf-8">\n'
+            f'<title>{html.escape(title or "")}</title>\n<style>\n{self.STYLE}\n</style>\n</head>\n<body>\n{heading}'
+        )
+
+    @staticmethod
+    def line(line: AnnotatedLine) -> str:
+        parts = []
+        for words, span in line.segments():
+            text = html.escape(' '.join(words))
+            if span.keyword:
+                parts.append(f'<mark class="keyword">{text}</mark>')
+            elif span.category is not None:
+                parts.append(f'<span class="{span.color or ""}" title="{html.escape(span.category)}">{text}</span>')
+            else:
+                parts.append(text)
+        return ' '.join(parts)
+
+    def add(self, section: Section) -> None:
+        if section.keyword is not None:
+            self.write(f'<h1>Ключевое слово: {html.escape(section.keyword)}</h1>\n')
+        if section.date is not None:
+            self.write(f'<h2>Дата: {html.escape(section.date)}</h2>\n')
+        if section.counts is not None:
+            rows = [(category, str(count)) for category, count in section.counts.items()]
+            rows = rows or [("Нет связанных слов в контексте.", "")]
+            self.write('<table class="counts">\n<tr><th>Группа</th><th>Количество</th></tr>\n')
+            for category, count in rows:
+                self.write(f'<tr><td>{html.escape(category)}</td><td>{count}</td></tr>\n')
+            self.write('</table>\n')
+        for line in section.lines:
+            self.write(f'<p class="context">{self.line(line)}</p>\n')
+
+    def close(self) -> list[Path]:
+        if self._out is not None:
+            self.write('</body>\n</html>\n')
+        return super().close()
+
+
+@renderer('docx')
+class DocxRenderer(Renderer):
+    """
+    Отчёт DOCX (:mod:`analysis.docx_report`), при необходимости по томам.
+    """
+
+    suffix = '.docx'
+
+    def __init__(self, path: Path, title: Optional[str] = None, volume_size: Optional[int] = None) -> None:
+        from analysis.docx_report import DocxReportWriter
+        super().__init__(path, title)
+        self._writer = DocxReportWriter(self.path, title, volume_size)
+
+    @staticmethod
+    def fragment(section: Section) -> str:
+        from analysis.docx_report import section_xml
+        return section_xml(section)
+
+    def add(self, section: Section) -> None:
+        self.add_fragment(section, self.fragment(section))
+
+    def add_fragment(self, section: Section, fragment: str) -> None:
+        self._writer.add(fragment, len(section.lines))
+
+    def close(self) -> list[Path]:
+        self.paths = self._writer.close()
+        return self.paths
+
+
+class Prerendered(NamedTuple):
+    """
+    Раздел вместе с фрагментами вывода, собранными в процессе пула.
+
+    :var section: Размеченный раздел.
+    :var fragments: Имя варианта вывода -> фрагмент (:meth:`Renderer.fragment`).
+    """
+
+    section: Section
+    fragments: Mapping[str, Any]
+
+
+_formats: list[str] = []
+
+
+def init_prerender(formats: Sequence[str], *annotator_args: Any) -> None:
+    """
+    Подготавливает процесс пула к :func:`prerender_section`.
+
+    :param formats: Имена вариантов вывода, фрагменты которых собираются.
+    :param annotator_args: Аргументы :func:`analysis.annotate.init_annotator`.
+    :return: None
+    """
+    init_annotator(*annotator_args)
+    _formats[:] = formats
+
+
+def prerender_section(task: SectionTask) -> Prerendered:
+    section = annotate_section(task)
+    fragments = {name: RENDERERS[name].fragment(section) for name in _formats}
+    return Prerendered(section, {name: fragment for name, fragment in fragments.items() if fragment is not None})
+
+
+def render(sections: Iterable[Union[Section, Prerendered]], renderers: Iterable[Renderer]) -> int:
+    """
+    Передаёт каждый раздел всем вариантам вывода и закрывает их.
+
+    :param sections: Размеченные разделы, возможно с готовыми фрагментами
+        вывода (:func:`prerender_section`).
+    :param renderers: Варианты вывода.
+    :return: Число разделов.
+    """
+    renderers = list(renderers)
+    count = 0
+    try:
+        for item in sections:
+            section, fragments = item if isinstance(item, Prerendered) else (item, {})
+            for output in renderers:
+                if output.name in fragments:
+                    output.add_fragment(section, fragments[output.name])
+                else:
+                    output.add(section)
+            count += 1
+    finally:
+        for output in renderers:
+            output.close()
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('annotations', type=Path, help='Разделы, сохранённые analysis.annotate.write_sections')
+    parser.add_argument('--format', nargs='+', choices=list(RENDERERS), default=['ansi'])
+    parser.add_argument('--output', type=Path, help='Имя файлов вывода без расширения (для html и docx)')
+    parser.add_argument('--title')
+    parser.add_argument('--volume-size', type=int, help='Контекстов в одном томе DOCX')
+    args = parser.parse_args()
+
+    renderers = []
+    for name in args.format:
+        cls = RENDERERS[name]
+        if cls.suffix is None:
+            renderers.append(cls(None, args.title))
+        elif args.output is None:
+            parser.error(f'для формата {name} нужен --output')
+        elif name == 'docx':
+            renderers.append(cls(args.output.with_suffix(cls.suffix), args.title, args.volume_size))
+        else:
+            renderers.append(cls(args.output.with_suffix(cls.suffix), args.title))
+
+    render(read_sections(args.annotations), renderers)
+    for output in renderers:
+        for path in output.paths:
+            print(path, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
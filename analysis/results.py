@@ -0,0 +1,212 @@
+"""
+Кэш результатов анализа на диске.
+
+Ключ записи — хэш содержимого входных данных (bt.txt или файлов
+хранилища корпуса, словарей) и всех параметров анализа, поэтому
+повторный прогон с теми же данными читает готовый результат, а любое
+изменение текста, словаря или параметра даёт новый ключ. Хэши файлов
+запоминаются вместе с размером и временем изменения (``digests.json``),
+так что неизменённые файлы не перечитываются.
+
+Записи — pickle в каталоге ``CL_RESULT_CACHE`` (по умолчанию
+.cache/results). Когда суммарный размер превышает ``max_bytes``,
+удаляются записи, к которым дольше всего не обращались: время изменения
+файла обновляется при каждом чтении, как в :class:`pars.cache.DiskCache`.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar
+
+from analysis.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(os.environ.get('CL_RESULT_CACHE', '.cache/results'))
+MAX_BYTES = 256 << 20
+# Меняется вместе с устройством результатов или логикой анализаторов,
+# чтобы старые записи не читались
+CACHE_VERSION = 3
+DIGESTS_FILE = 'digests.json'
+
+T = TypeVar('T')
+
+
+class ResultCache:
+    """
+    Кэш результатов с ключом по содержимому и вытеснением по размеру.
+
+    :val path: Каталог кэша.
+    :val max_bytes: Предельный суммарный размер записей.
+    """
+
+    SUFFIX = '.pickle'
+
+    path: Path
+    max_bytes: int
+
+    def __init__(self, path: Path = CACHE_DIR, max_bytes: int = MAX_BYTES) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._size = sum(file.stat().st_size for file in self._files())
+        self._digests: dict[str, list] = self._load_digests()
+        self._digests_changed = False
+
+    def _files(self):
+        return self.path.glob(f'*/*{self.SUFFIX}')
+
+    def _file(self, key: str) -> Path:
+        return self.path / key[:2] / f'{key}{self.SUFFIX}'
+
+    @property
+    def size(self) -> int:
+        """
+        Суммарный размер записей в байтах
+        """
+        return self._size
+
+    def _load_digests(self) -> dict[str, list]:
+        try:
+            with (self.path / DIGESTS_FILE).open(encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_digests(self) -> None:
+        if not self._digests_changed:
+            return
+        tmp = self.path / f'{DIGESTS_FILE}.{os.getpid()}.tmp'
+        try:
+            with tmp.open('w', encoding='utf-8') as f:
+                json.dump(self._digests, f)
+            os.replace(tmp, self.path / DIGESTS_FILE)
+            self._digests_changed = False
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить хэши файлов: {e}")
+
+    def file_digest(self, path: Path) -> str:
+        """
+        Хэш содержимого файла; пока размер и время изменения не меняются,
+        берётся запомненный.
+
+        :param path: Путь к файлу.
+        :return: SHA-256 содержимого.
+        """
+        path = Path(path)
+        stat = path.stat()
+        name = str(path.resolve())
+        known = self._digests.get(name)
+        if known is not None and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return known[2]
+        with path.open('rb') as f:
+            digest = hashlib.file_digest(f, 'sha256').hexdigest()
+        self._digests[name] = [stat.st_size, stat.st_mtime_ns, digest]
+        self._digests_changed = True
+        return digest
+
+    def _part(self, value: Any) -> bytes:
+        if isinstance(value, Path):
+            return self.file_digest(value).encode()
+        if isinstance(value, bytes):
+            return hashlib.sha256(value).hexdigest().encode()
+        if isinstance(value, (list, tuple)):
+            return b'[' + b','.join(self._part(item) for item in value) + b']'
+        return json.dumps(value, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')
+
+    def key(self, *parts: Any) -> str:
+        """
+        Ключ записи по входным данным и параметрам.
+
+        :param parts: Пути к файлам (учитывается их содержимое), байты и
+            значения, сериализуемые в JSON (имена, параметры, хэши словарей).
+        :return: SHA-256 ключа.
+        """
+        digest = hashlib.sha256(f'{CACHE_VERSION}'.encode())
+        for part in parts:
+            digest.update(b'\0' + self._part(part))
+        self._save_digests()
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Читает результат.
+
+        :param key: Ключ записи.
+        :return: Результат или None при промахе.
+        """
+        file = self._file(key)
+        try:
+            with file.open('rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            metrics.hit('result_cache', False)
+            return None
+        except Exception as e:
+            logger.warning(f"Запись кэша результатов {file} повреждена и будет пересчитана: {e}")
+            metrics.hit('result_cache', False)
+            return None
+        # Время изменения служит меткой последнего обращения для вытеснения
+        os.utime(file)
+        metrics.hit('result_cache', True)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        """
+        Сохраняет результат и при превышении лимита вытесняет старые записи.
+
+        :param key: Ключ записи.
+        :param value: Результат (должен сериализоваться pickle).
+        :return: None
+        """
+        file = self._file(key)
+        try:
+            file.parent.mkdir(exist_ok=True)
+            tmp_file = file.with_name(f'{file.name}.{os.getpid()}.tmp')
+            with tmp_file.open('wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            old_size = file.stat().st_size if file.exists() else 0
+            os.replace(tmp_file, file)
+            self._size += file.stat().st_size - old_size
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить результат в кэш {file}: {e}")
+            return
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def cached(self, key: str, build: Callable[[], T]) -> T:
+        """
+        Читает результат из кэша или вычисляет и сохраняет его.
+
+        :param key: Ключ записи.
+        :param build: Вычисление результата при промахе.
+        :return: Результат.
+        """
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def _evict(self) -> None:
+        """
+        Удаляет самые старые записи, пока размер кэша не станет меньше лимита
+        """
+        files = sorted(((file.stat().st_mtime, file) for file in self._files()), key=lambda item: item[0])
+        for _, file in files:
+            if self._size <= self.max_bytes:
+                break
+            size = file.stat().st_size
+            file.unlink(missing_ok=True)
+            self._size -= size
+
+    def clear(self) -> None:
+        """
+        Удаляет все записи
+        """
+        for file in self._files():
+            file.unlink(missing_ok=True)
+        self._size = 0
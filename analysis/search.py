@@ -0,0 +1,280 @@
+"""
+Полнотекстовый поиск по корпусу на SQLite FTS5.
+
+Необязательное дополнение к хранилищу корпуса: индекс лежит в том же
+каталоге (``search.sqlite3``) и строится из уже токенизированных
+документов, поэтому смещения токенов в FTS5 совпадают с позициями
+хранилища и результаты можно сразу передавать в код вывода контекста
+(как :meth:`analysis.index.PositionalIndex.postings`).
+
+Поддерживаются фразы (``"usa druck"``), префиксы (``evaku*``, в том числе
+у последнего слова фразы) и фильтр по дате заседания. Нужен только модуль
+sqlite3 стандартной библиотеки, собранный с FTS5.
+
+Запуск: ``python -m analysis.search 'запрос' [--since 2020-01-01] [--until ...]``
+"""
+import argparse
+import logging
+import re
+import sqlite3
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from analysis._utils import normalize_phrase
+from analysis.corpus import CORPUS_DIR, CorpusStore, PAGES_DIR
+from analysis.index import store_signature
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FILE = 'search.sqlite3'
+
+# Токены хранилища — \w+ в нижнем регистре; подчёркивание FTS5 по умолчанию
+# считает разделителем, а диакритику не трогаем, чтобы токены совпадали
+TOKENIZER = "unicode61 remove_diacritics 0 tokenchars '_'"
+
+MONTHS = {
+    'januar': 1, 'februar': 2, 'marz': 3, 'märz': 3, 'april': 4, 'mai': 5, 'juni': 6,
+    'juli': 7, 'august': 8, 'september': 9, 'oktober': 10, 'november': 11, 'dezember': 12,
+}
+DATE_RE = re.compile(r'(\d{1,2})\.\s*([^\W\d_]+)\s+(\d{4})')
+
+
+def parse_date(text: Optional[str]) -> Optional[str]:
+    """
+    Переводит дату вида «9. März 2017» в ISO-формат.
+
+    :param text: Дата со страницы.
+    :return: Дата ``ГГГГ-ММ-ДД`` или None, если разобрать не удалось.
+    """
+    match = DATE_RE.search(text or '')
+    if not match or match.group(2).lower() not in MONTHS:
+        return None
+    day, month, year = int(match.group(1)), MONTHS[match.group(2).lower()], int(match.group(3))
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+def fts5_available() -> bool:
+    """
+    Проверяет, собран ли sqlite3 с FTS5.
+    """
+    with sqlite3.connect(':memory:') as connection:
+        try:
+            connection.execute('CREATE VIRTUAL TABLE t USING fts5(x)')
+        except sqlite3.OperationalError:
+            return False
+    return True
+
+
+def build_search_index(store: CorpusStore, path: Optional[Path] = None) -> 'SearchIndex':
+    """
+    Строит индекс FTS5 по документам хранилища.
+
+    :param store: Хранилище корпуса.
+    :param path: Файл индекса; по умолчанию в каталоге хранилища.
+    :return: Открытый индекс.
+    """
+    path = Path(path or store.path / SEARCH_FILE)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.unlink(missing_ok=True)
+
+    connection = sqlite3.connect(tmp)
+    try:
+        connection.executescript(f"""
+            CREATE TABLE meta(key TEXT PRIMARY KEY, value);
+            CREATE TABLE docs(doc_id INTEGER PRIMARY KEY, source TEXT, date TEXT);
+            CREATE INDEX docs_date ON docs(date);
+            CREATE VIRTUAL TABLE pages USING fts5(text, content='', tokenize="{TOKENIZER}");
+        """)
+        with connection:
+            connection.executemany('INSERT INTO docs VALUES (?, ?, ?)', (
+                (doc_id, document.get('source'), parse_date(document.get('date')))
+                for doc_id, document in enumerate(store.documents)
+            ))
+            connection.executemany('INSERT INTO pages(rowid, text) VALUES (?, ?)', (
+                (doc_id, ' '.join(store.words(doc_id))) for doc_id in range(len(store))
+            ))
+            # То же описание хранилища, что у позиционного индекса: хэш
+            # docs.json отличает пересобранный корпус с теми же размерами
+            connection.executemany('INSERT INTO meta VALUES (?, ?)', store_signature(store).items())
+        connection.execute("INSERT INTO pages(pages) VALUES ('optimize')")
+        connection.commit()
+    finally:
+        connection.close()
+    tmp.replace(path)
+
+    logger.info(f'Поисковый индекс: {len(store)} документов.')
+    return SearchIndex(store, path)
+
+
+class SearchIndex:
+    """
+    Индекс FTS5 над хранилищем корпуса.
+
+    :val store: Хранилище, по которому построен индекс.
+    :val path: Файл индекса.
+    """
+
+    store: CorpusStore
+    path: Path
+
+    def __init__(self, store: CorpusStore, path: Optional[Path] = None) -> None:
+        """
+        Открывает построенный индекс.
+
+        :param store: Хранилище корпуса.
+        :param path: Файл индекса; по умолчанию в каталоге хранилища.
+        """
+        self.store = store
+        self.path = Path(path or store.path / SEARCH_FILE)
+        self._connection = sqlite3.connect(self.path)
+        # Таблица вхождений (термин, документ, смещение) поверх индекса FTS5
+        self._connection.execute('CREATE VIRTUAL TABLE IF NOT EXISTS temp.terms USING fts5vocab(main, pages, instance)')
+
+    @classmethod
+    def open_or_build(cls, store: CorpusStore, path: Optional[Path] = None) -> 'SearchIndex':
+        """
+        Открывает индекс; строит его, если он отсутствует или собран по
+        другой версии хранилища.
+
+        :param store: Хранилище корпуса.
+        :param path: Файл индекса.
+        :return: Открытый индекс.
+        """
+        path = Path(path or store.path / SEARCH_FILE)
+        if path.exists():
+            index = cls(store, path)
+            if index.meta() == store_signature(store):
+                return index
+            index.close()
+        return build_search_index(store, path)
+
+    def meta(self) -> dict[str, Any]:
+        return dict(self._connection.execute('SELECT key, value FROM meta'))
+
+    def documents(
+            self,
+            expression: str,
+            since: Optional[str] = None,
+            until: Optional[str] = None,
+            source: Optional[str] = None
+    ) -> list[int]:
+        """
+        Возвращает документы, подходящие под выражение FTS5.
+
+        :param expression: Выражение MATCH (фразы, префиксы, AND/OR/NOT, NEAR).
+        :param since: Не раньше этой даты (``ГГГГ-ММ-ДД``).
+        :param until: Не позже этой даты (``ГГГГ-ММ-ДД``).
+        :param source: Только документы этого источника.
+        :return: Номера документов по возрастанию.
+        """
+        sql = 'SELECT pages.rowid FROM pages JOIN docs ON docs.doc_id = pages.rowid WHERE pages MATCH ?'
+        params: list[Any] = [expression]
+        if since is not None:
+            sql += ' AND docs.date >= ?'
+            params.append(since)
+        if until is not None:
+            sql += ' AND docs.date <= ?'
+            params.append(until)
+        if source is not None:
+            sql += ' AND docs.source = ?'
+            params.append(source)
+        return sorted(doc_id for doc_id, in self._connection.execute(sql, params))
+
+    def _offsets(self, term: str, prefix: bool, docs: set[int]) -> set[tuple[int, int]]:
+        if prefix:
+            upper = term[:-1] + chr(ord(term[-1]) + 1)
+            rows = self._connection.execute(
+                'SELECT doc, offset FROM temp.terms WHERE term >= ? AND term < ?', (term, upper))
+        else:
+            rows = self._connection.execute('SELECT doc, offset FROM temp.terms WHERE term = ?', (term,))
+        return {(doc_id, offset) for doc_id, offset in rows if doc_id in docs}
+
+    def postings(
+            self,
+            query: str,
+            since: Optional[str] = None,
+            until: Optional[str] = None,
+            source: Optional[str] = None
+    ) -> dict[int, list[int]]:
+        """
+        Ищет слово, фразу или префикс (``*`` в конце запроса относится к
+        последнему слову) и возвращает позиции вхождений.
+
+        :param query: Запрос.
+        :param since: Не раньше этой даты (``ГГГГ-ММ-ДД``).
+        :param until: Не позже этой даты (``ГГГГ-ММ-ДД``).
+        :param source: Только документы этого источника.
+        :return: Словарь: документ -> позиции первого слова вхождений.
+        """
+        prefix = query.rstrip().endswith('*')
+        tokens = normalize_phrase(query.replace('*', ' '))
+        if not tokens:
+            return {}
+
+        expression = '"' + ' '.join(tokens).replace('"', '""') + '"' + ('*' if prefix else '')
+        docs = set(self.documents(expression, since, until, source))
+        if not docs:
+            return {}
+
+        hits = [self._offsets(token, prefix and i == len(tokens) - 1, docs) for i, token in enumerate(tokens)]
+        result = defaultdict(list)
+        for doc_id, offset in sorted(hits[0]):
+            if all((doc_id, offset + shift) in other for shift, other in enumerate(hits[1:], 1)):
+                result[doc_id].append(offset)
+        return dict(result)
+
+    def search(self, queries: Iterable[str], **filters: Any) -> dict[str, dict[int, list[int]]]:
+        """
+        Выполняет несколько запросов :meth:`postings`.
+
+        :param queries: Запросы.
+        :param filters: Фильтры since, until, source.
+        :return: Словарь: запрос -> документ -> позиции.
+        """
+        return {query: self.postings(query, **filters) for query in queries}
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> 'SearchIndex':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('query')
+    parser.add_argument('--since')
+    parser.add_argument('--until')
+    parser.add_argument('--source', default=PAGES_DIR.name)
+    parser.add_argument('--context', type=int, default=12)
+    args = parser.parse_args()
+
+    if not fts5_available():
+        raise SystemExit('sqlite3 собран без FTS5')
+
+    store = CorpusStore.open_or_build(CORPUS_DIR)
+    with SearchIndex.open_or_build(store) as index:
+        postings = index.postings(args.query, args.since, args.until, args.source)
+        width = len(normalize_phrase(args.query.replace('*', ' ')))
+        for doc_id, positions in postings.items():
+            document = store.documents[doc_id]
+            words = store.words(doc_id)
+            print(f"\n{document.get('date')} — {document.get('title')}")
+            for position in positions:
+                left = words[max(position - args.context, 0):position]
+                found = words[position:position + width]
+                right = words[position + width:position + width + args.context]
+                print(' '.join(left), f"[{' '.join(found)}]", ' '.join(right))
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
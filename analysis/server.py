@@ -0,0 +1,455 @@
+"""
+Сервер анализа на localhost: хранилище корпуса, позиционный индекс и
+скомпилированные словари загружаются один раз и остаются в памяти, а
+запросы эмоций, совместной встречаемости и контекстов (KWIC) выполняются
+без повторной загрузки словарей и токенизации.
+
+Сервер однопоточный: запросы обрабатываются по очереди, а между ними
+(не чаще раза в ``poll_interval`` секунд) проверяются время изменения и
+размер файлов словарей, страниц и bt.txt. Изменённые словари
+перезагружаются (из кэша :mod:`analysis.lexicon`), а при изменении
+страниц корпус и индекс собираются заново; запросы в это время ждут.
+Новый корпус собирается во временном каталоге и подменяет старый только
+после успешной сборки: если страница повреждена или словарь не
+разбирается, сервер продолжает отвечать по прежним данным и повторяет
+попытку, когда файлы снова изменятся.
+
+Итоги эмоций хранятся по документам (:mod:`analysis.aggregate`), поэтому
+после появления новых страниц анализируются только они.
+
+Запросы (GET, ответ — JSON):
+
+    /status
+    /emotions?source=bt.txt
+    /cooccur?keyword=usa&keyword=Ukraine&window=150&source=bt
+    /kwic?keyword=usa&context=15&window=150&source=bt
+
+Запуск: ``python -m analysis.server --port 8765`` или ``python cli.py serve``
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Any, Callable, Mapping, Optional, Sequence
+from urllib.parse import parse_qs, urlsplit
+
+from analysis.aggregate import DocumentAggregates, update_aggregates
+from analysis.annotate import Annotator, section_record, section_tasks
+from analysis.cooccur import batch_cooccurrence
+from analysis.corpus import CORPUS_DIR, PAGES_DIR, TEXT_PATH, CorpusStore, build_corpus, corpus_stale
+from analysis.index import PositionalIndex, build_index
+from analysis.lexicon import CompiledLexicon, load_compiled
+from analysis.pipeline import FusedPipeline
+from main import EmotionAnalyzer, ModalParticleAnalyzer
+
+logger = logging.getLogger(__name__)
+
+HOST = '127.0.0.1'
+PORT = 8765
+POLL_INTERVAL = 1.0
+ES_JSON_PATH = Path('es.json')
+EV_JSON_PATH = Path('ev.json')
+MP_JSON_PATH = Path('mp.json')
+WINDOW_SIZE = 150
+CONTEXT_WORDS = 15
+
+Signature = tuple[tuple[str, int, int], ...]
+
+
+def file_signature(paths: Sequence[Path]) -> Signature:
+    """
+    Время изменения и размер файлов (каталоги обходятся рекурсивно).
+
+    :param paths: Файлы и каталоги.
+    :return: Кортеж (путь, mtime_ns, размер); отсутствующие файлы пропускаются.
+    """
+    signature = []
+    for path in paths:
+        files = sorted(p for p in path.rglob('*') if p.is_file()) if path.is_dir() else [path]
+        for file in files:
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            signature.append((str(file), stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class AnalysisService:
+    """
+    Загруженные данные и ответы на запросы.
+
+    :val corpus_dir: Каталог хранилища корпуса.
+    :val pages_dir: Каталог страниц.
+    :val text_path: Файл bt.txt.
+    :val lexicon_paths: Файлы словарей: категорий (es), вокабуляра (ev), частиц (mp).
+    :val store: Открытое хранилище корпуса.
+    :val index: Позиционный индекс хранилища.
+    :val categories: Словарь категорий (es.json).
+    :val pipeline: Анализаторы эмоций и модальных частиц.
+    :val reloads: Число перезагрузок (словари, корпус) и неудачных попыток.
+    """
+
+    corpus_dir: Path
+    pages_dir: Path
+    text_path: Path
+    lexicon_paths: tuple[Path, Path, Path]
+    store: Optional[CorpusStore]
+    index: Optional[PositionalIndex]
+    categories: CompiledLexicon
+    pipeline: FusedPipeline
+    reloads: Counter
+
+    def __init__(
+            self,
+            corpus_dir: Path = CORPUS_DIR,
+            pages_dir: Path = PAGES_DIR,
+            text_path: Path = TEXT_PATH,
+            es_path: Path = ES_JSON_PATH,
+            ev_path: Path = EV_JSON_PATH,
+            mp_path: Path = MP_JSON_PATH
+    ) -> None:
+        """
+        Открывает корпус (собирает, если он старше страниц) и загружает словари.
+
+        :param corpus_dir: Каталог хранилища корпуса.
+        :param pages_dir: Каталог страниц.
+        :param text_path: Файл bt.txt.
+        :param es_path: Словарь категорий (синонимы эмоций).
+        :param ev_path: Вокабуляр эмоций.
+        :param mp_path: Модальные частицы.
+        """
+        self.corpus_dir = Path(corpus_dir)
+        self.pages_dir = Path(pages_dir)
+        self.text_path = Path(text_path)
+        self.lexicon_paths = (Path(es_path), Path(ev_path), Path(mp_path))
+        self.store = None
+        self.index = None
+        self.reloads = Counter()
+        self._pages_signature = file_signature([self.pages_dir, self.text_path])
+        self._lexicon_signature = file_signature(self.lexicon_paths)
+        # Состояние файлов, на котором перезагрузка не удалась: до их
+        # следующего изменения попытка не повторяется
+        self._failed: dict[str, Signature] = {}
+        self._load_corpus(rebuild=corpus_stale(self.corpus_dir, self.pages_dir, self.text_path))
+        self._load_lexicons()
+
+    def _load_corpus(self, rebuild: bool = False) -> None:
+        """
+        Открывает хранилище и индекс; при rebuild собирает их заново.
+
+        Корпус и индекс собираются в соседнем каталоге ``<corpus_dir>.build``.
+        Старое хранилище закрывается и файлы переносятся на его место только
+        после успешной сборки, поэтому при ошибке остаётся прежний корпус.
+        Остальные файлы каталога (итоги :mod:`analysis.aggregate`) сохраняются.
+
+        :param rebuild: Собрать корпус и индекс заново.
+        :return: None
+        """
+        if rebuild:
+            build_dir = self.corpus_dir.with_name(f'{self.corpus_dir.name}.build')
+            shutil.rmtree(build_dir, ignore_errors=True)
+            try:
+                with build_corpus(build_dir, self.pages_dir, self.text_path) as store:
+                    build_index(store)
+            except BaseException:
+                shutil.rmtree(build_dir, ignore_errors=True)
+                raise
+            self.close()
+            self.corpus_dir.mkdir(parents=True, exist_ok=True)
+            for file in build_dir.iterdir():
+                os.replace(file, self.corpus_dir / file.name)
+            build_dir.rmdir()
+        else:
+            self.close()
+        self.store = CorpusStore(self.corpus_dir)
+        self.index = PositionalIndex.open_or_build(self.store)
+        self._reset()
+
+    def _load_lexicons(self) -> None:
+        # Всё загружается до присваивания, чтобы ошибка в одном словаре не
+        # оставила сервис с частью новых словарей
+        es_path, ev_path, mp_path = self.lexicon_paths
+        categories = load_compiled(es_path)
+        cooccur_lexicons = {'es': categories, 'ev': load_compiled(ev_path)}
+        pipeline = FusedPipeline([EmotionAnalyzer(es_path, ev_path), ModalParticleAnalyzer(mp_path)])
+        self.categories, self._cooccur_lexicons, self.pipeline = categories, cooccur_lexicons, pipeline
+        self._reset()
+
+    def _reset(self) -> None:
+        # Итоги и конкордансы зависят и от корпуса, и от словарей
+        self._aggregates: Optional[DocumentAggregates] = None
+        self._annotators: dict[int, Annotator] = {}
+
+    def refresh(self) -> None:
+        """
+        Перезагружает изменённые словари и пересобирает корпус, если
+        изменились страницы или bt.txt.
+
+        При ошибке остаются прежние данные и прежнее состояние файлов, а
+        ошибка записывается в журнал; следующая попытка будет после нового
+        изменения файлов.
+
+        :return: None
+        """
+        pages_signature = file_signature([self.pages_dir, self.text_path])
+        if pages_signature not in (self._pages_signature, self._failed.get('corpus')):
+            logger.info("Страницы изменились, корпус собирается заново.")
+            if self._reload('corpus', pages_signature, lambda: self._load_corpus(rebuild=True)):
+                self._pages_signature = pages_signature
+
+        lexicon_signature = file_signature(self.lexicon_paths)
+        if lexicon_signature not in (self._lexicon_signature, self._failed.get('lexicons')):
+            logger.info("Словари изменились, загружаются заново.")
+            if self._reload('lexicons', lexicon_signature, self._load_lexicons):
+                self._lexicon_signature = lexicon_signature
+
+    def _reload(self, name: str, signature: Signature, load: Callable[[], None]) -> bool:
+        """
+        Выполняет перезагрузку и запоминает состояние файлов, на котором она
+        не удалась.
+
+        :param name: Что перезагружается: corpus или lexicons.
+        :param signature: Состояние файлов.
+        :param load: Перезагрузка.
+        :return: Удалась ли перезагрузка.
+        """
+        try:
+            load()
+        except Exception:
+            logger.exception(f"Перезагрузка ({name}) не удалась, используются прежние данные.")
+            self._failed[name] = signature
+            self.reloads[f'{name}_failed'] += 1
+            return False
+        self._failed.pop(name, None)
+        self.reloads[name] += 1
+        return True
+
+    def close(self) -> None:
+        if self.store is not None:
+            self.store.close()
+            self.store = self.index = None
+
+    def status(self) -> dict[str, Any]:
+        return {
+            'documents': len(self.store),
+            'tokens': len(self.store.tokens),
+            'vocabulary': len(self.store.vocab),
+            'lexicon': self.categories.digest,
+            'reloads': dict(self.reloads),
+        }
+
+    def emotions(self, source: Optional[str] = TEXT_PATH.name) -> dict[str, Any]:
+        """
+        Эмоции, эмоции в контексте ключевых слов и модальные частицы по
+        документам источника. Итоги берутся из :mod:`analysis.aggregate`:
+        после пересборки корпуса анализируются только новые и изменённые
+        документы.
+
+        :param source: Имя источника; None — единственный источник корпуса.
+        :return: Счётчики по анализаторам.
+        """
+        if self._aggregates is None:
+            self._aggregates, _ = update_aggregates(self.store, self.index, self.pipeline)
+        results = self._aggregates.results(source)
+        emotions = results.get(EmotionAnalyzer.name, {})
+        particles = results.get(ModalParticleAnalyzer.name, {})
+        return {
+            'emotion_counts': dict(emotions.get('emotion_counts', {})),
+            'context_counts': dict(emotions.get('context_counts', {})),
+            'particle_counts': dict(particles.get('particle_counts', {})),
+        }
+
+    def cooccur(
+            self,
+            keywords: Sequence[str],
+            window_size: int = WINDOW_SIZE,
+            source: Optional[str] = PAGES_DIR.name,
+            lexicon: str = 'es'
+    ) -> dict[str, Any]:
+        """
+        Категории словаря в окнах вокруг ключевых слов.
+
+        :param keywords: Ключевые слова или словосочетания.
+        :param window_size: Число токенов слева и справа.
+        :param source: Имя источника, None — весь корпус.
+        :param lexicon: Словарь категорий: ``es`` (как m4 и e4) или ``ev`` (как m2).
+        :return: Ключевое слово -> суммарные категории и категории по документам.
+        """
+        results = batch_cooccurrence(
+            self.store, self.index, keywords, self._cooccur_lexicons[lexicon], window_size, source
+        )
+        response = {}
+        for keyword, documents in results.items():
+            totals = Counter()
+            for hits in documents:
+                totals.update(hits.counts)
+            response[keyword] = {
+                'counts': dict(totals),
+                'documents': [
+                    {
+                        'doc_id': hits.doc_id,
+                        'date': self.store.documents[hits.doc_id].get('date'),
+                        'occurrences': len(hits.positions),
+                        'counts': hits.counts,
+                    }
+                    for hits in documents
+                ],
+            }
+        return response
+
+    def kwic(
+            self,
+            keywords: Sequence[str],
+            context_words: int = CONTEXT_WORDS,
+            window_size: int = WINDOW_SIZE,
+            source: Optional[str] = PAGES_DIR.name
+    ) -> dict[str, Any]:
+        """
+        Размеченные контексты ключевых слов — те же разделы, что выводят m4 и e4.
+
+        :param keywords: Ключевые слова или словосочетания.
+        :param context_words: Число слов контекста слева и справа.
+        :param window_size: Окно для подсчёта категорий.
+        :param source: Имя источника, None — весь корпус.
+        :return: Список разделов.
+        """
+        results = batch_cooccurrence(
+            self.store, self.index, keywords, self.categories, window_size, source
+        )
+        if context_words not in self._annotators:
+            self._annotators[context_words] = Annotator(self.store.words, self.categories.words, context_words)
+        annotator = self._annotators[context_words]
+        sections = map(annotator.section, section_tasks(self.store, results, headings=True))
+        return {'sections': [section_record(section) for section in sections]}
+
+
+def _query(params: Mapping[str, list[str]]) -> dict[str, Any]:
+    """
+    Параметры запроса для методов :class:`AnalysisService`.
+
+    :param params: Результат parse_qs.
+    :return: Именованные аргументы.
+    """
+    kwargs: dict[str, Any] = {}
+    if 'keyword' in params:
+        kwargs['keywords'] = params['keyword']
+    if 'source' in params:
+        kwargs['source'] = params['source'][0] or None
+    if 'window' in params:
+        kwargs['window_size'] = int(params['window'][0])
+    if 'context' in params:
+        kwargs['context_words'] = int(params['context'][0])
+    if 'lexicon' in params:
+        kwargs['lexicon'] = params['lexicon'][0]
+    return kwargs
+
+
+class AnalysisServer(HTTPServer):
+    """
+    HTTP-сервер, проверяющий изменения файлов между запросами.
+
+    :val service: Загруженные данные.
+    :val poll_interval: Минимальный интервал между проверками, секунд.
+    """
+
+    service: AnalysisService
+    poll_interval: float
+
+    def __init__(self, address: tuple[str, int], service: AnalysisService, poll_interval: float = POLL_INTERVAL):
+        super().__init__(address, AnalysisHandler)
+        self.service = service
+        self.poll_interval = poll_interval
+        self._checked = time.monotonic()
+
+    def service_actions(self) -> None:
+        # Вызывается циклом serve_forever между запросами
+        if time.monotonic() - self._checked >= self.poll_interval:
+            try:
+                self.service.refresh()
+            except Exception:
+                # Ошибка проверки не должна останавливать serve_forever
+                logger.exception("Не удалось проверить изменения файлов.")
+            self._checked = time.monotonic()
+
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    server: AnalysisServer
+
+    def _routes(self) -> dict[str, Callable[..., dict[str, Any]]]:
+        service = self.server.service
+        return {
+            '/status': service.status,
+            '/emotions': service.emotions,
+            '/cooccur': service.cooccur,
+            '/kwic': service.kwic,
+        }
+
+    def do_GET(self) -> None:
+        started = time.perf_counter()
+        url = urlsplit(self.path)
+        handler = self._routes().get(url.path)
+        if handler is None:
+            self._send(404, {'error': f'неизвестный запрос {url.path}'}, started)
+            return
+        try:
+            body = handler(**_query(parse_qs(url.query)))
+        except (KeyError, TypeError, ValueError) as e:
+            self._send(400, {'error': str(e)}, started)
+            return
+        except Exception as e:
+            logger.exception(f"Ошибка обработки запроса {self.path}")
+            self._send(500, {'error': str(e)}, started)
+            return
+        self._send(200, body, started)
+
+    def _send(self, status: int, body: dict[str, Any], started: float) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('X-Elapsed-Ms', f'{(time.perf_counter() - started) * 1000:.1f}')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.info(format, *args)
+
+
+def serve(host: str = HOST, port: int = PORT, poll_interval: float = POLL_INTERVAL, **paths: Path) -> None:
+    """
+    Загружает данные и обслуживает запросы до прерывания.
+
+    :param host: Адрес.
+    :param port: Порт.
+    :param poll_interval: Интервал проверки изменений файлов, секунд.
+    :param paths: Пути для :class:`AnalysisService`.
+    :return: None
+    """
+    service = AnalysisService(**paths)
+    with AnalysisServer((host, port), service, poll_interval) as server:
+        logger.info(f"Сервер анализа запущен: http://{host}:{server.server_port}/")
+        try:
+            server.serve_forever(poll_interval=min(poll_interval, 0.5))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.poll_interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Замер стоимости разбора одной страницы BtPage.
+
+Сравниваются два режима:
+
+* ``legacy`` — полный разбор ``html.parser`` и пересчёт свойств при каждом
+  обращении (get_data() и отдельный вызов plain_text, как в parsBT.main);
+* ``fast`` — разбор только <article> (lxml, если установлен) и
+  кэшированные свойства.
+
+HTML берётся из переданного каталога (``*.html``) или, если каталог не
+указан, генерируется из pars/pages/bt/*.json.
+
+Запуск: ``python -m bench.bench_btpage [каталог] [--repeat N]``
+"""
+import argparse
+import json
+import time
+from html import escape
+from pathlib import Path
+from typing import Optional
+
+from pars._utils import clean_text
+from pars.bundestag import BtPage, FAST_PARSER
+from pars.cache import MemoryCache
+from pars.columns import ColumnarCorpus, is_columnar
+
+PAGES_DIR = Path('pars/pages/bt')
+PROPERTIES = ('plain_text', 'links', 'images', 'title')
+
+
+def synthetic_page(data: dict) -> str:
+    """
+    Собирает страницу, похожую на статью текстового архива: навигация,
+    скрипты и подвал вокруг <article>.
+
+    :param data: Страница из pars/pages/bt.
+    :return: HTML страницы.
+    """
+    nav = ''.join(f'<li><a href="/nav/{i}">Пункт меню {i}</a></li>' for i in range(400))
+    scripts = '<script>var x = 1;</script>' * 50
+    title = escape(data.get('title') or '')
+    links = ''.join(f'<a href="{escape(link["url"])}">{escape(link["title"] or "")}</a>' for link in data['links'])
+    text = ''.join(f'<p>{escape(chunk)}</p>' for chunk in (data.get('text') or '').split('. '))
+    return (f'<html><head><title>{title}</title>{scripts}</head><body>'
+            f'<header><nav><ul>{nav}</ul></nav></header>'
+            f'<article><h1>{title}</h1>{text}{links}<img src="/img/1.jpg" alt="Bild"></article>'
+            f'<footer><ul>{nav}</ul></footer></body></html>')
+
+
+def load_pages(html_dir: Optional[Path] = None) -> dict[str, str]:
+    """
+    Загружает HTML для замера.
+
+    :param html_dir: Каталог с файлами *.html.
+    :return: Словарь: ссылка -> HTML.
+    """
+    if html_dir is not None:
+        return {f'https://www.bundestag.de/{file.stem}': file.read_text(encoding='utf-8')
+                for file in sorted(html_dir.glob('*.html'))}
+
+    pages = {}
+    if is_columnar(PAGES_DIR):
+        with ColumnarCorpus(PAGES_DIR) as corpus:
+            for data in corpus.records('url', 'title', 'text', 'links'):
+                pages[data['url']] = synthetic_page(data)
+        return pages
+
+    for file in sorted(PAGES_DIR.glob('*.json')):
+        with file.open(encoding='utf-8') as f:
+            data = json.load(f)
+        pages[data['url']] = synthetic_page(data)
+    return pages
+
+
+def text_available() -> bool:
+    """
+    Проверяет, доступны ли данные nltk для clean_text(strict=True).
+    """
+    try:
+        clean_text('test', strict=True)
+    except LookupError:
+        return False
+    return True
+
+
+def process(cache: MemoryCache, fast: bool, with_text: bool) -> None:
+    """
+    Разбирает все страницы кэша в одном из режимов.
+
+    :param cache: Кэш с HTML страниц.
+    :param fast: Быстрый режим.
+    :param with_text: Учитывать получение plain_text.
+    """
+    properties = PROPERTIES if with_text else PROPERTIES[1:]
+    for url in cache.pages:
+        page = BtPage(url, cache=cache, offline=True, fast=fast)
+        if fast:
+            for name in properties:
+                getattr(page, name)
+            if with_text:
+                page.plain_text
+        else:
+            # Старое поведение: каждое обращение пересчитывает свойство
+            for name in properties:
+                getattr(BtPage, name).func(page)
+            if with_text:
+                BtPage.plain_text.func(page)
+
+
+def measure(cache: MemoryCache, fast: bool, with_text: bool, repeat: int) -> float:
+    """
+    Возвращает лучшее из repeat время обработки одной страницы в мс.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process(cache, fast, with_text)
+        best = min(best, time.perf_counter() - start)
+    return best / max(len(cache.pages), 1) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('html_dir', nargs='?', type=Path)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    cache = MemoryCache(load_pages(args.html_dir))
+    with_text = text_available()
+    if not with_text:
+        print('Данные nltk не найдены, plain_text не замеряется.')
+
+    legacy = measure(cache, False, with_text, args.repeat)
+    fast = measure(cache, True, with_text, args.repeat)
+    print(f'Страниц: {len(cache.pages)}, быстрый парсер: {FAST_PARSER}')
+    print(f'legacy: {legacy:.2f} мс/стр.')
+    print(f'fast:   {fast:.2f} мс/стр. (x{legacy / fast:.1f})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Генератор синтетического немецкого корпуса для замеров.
+
+Фоновые слова выбираются по частотам словаря pars/pages/bt.txt, а фразы из
+es.json, ev.json, mp.json и ключевые слова вставляются с плотностью, близкой к
+реальному корпусу (по умолчанию — как в bt.txt). Документы пишутся по одному
+на строку, как в bt.txt.
+
+Запуск: ``python -m bench.corpus_gen 100MB bench/corpus_100MB.txt``
+"""
+import argparse
+import json
+import random
+import re
+from collections import Counter
+from itertools import accumulate
+from pathlib import Path
+from typing import Optional
+
+TEXT_PATH = Path('pars/pages/bt.txt')
+LEXICON_PATHS = (Path('es.json'), Path('ev.json'))
+PARTICLES_PATH = Path('mp.json')
+KEYWORDS = ['usa', 'russland', 'ukraine', 'china', 'putin']
+
+# Доли токенов, начинающих фразу словаря, измеренные по bt.txt
+EMOTION_DENSITY = 0.011
+PARTICLE_DENSITY = 0.002
+KEYWORD_DENSITY = 0.001
+
+SIZE_RE = re.compile(r'^(\d+(?:\.\d+)?)\s*([KMG]?B)?$', re.IGNORECASE)
+UNITS = {'B': 1, 'KB': 1 << 10, 'MB': 1 << 20, 'GB': 1 << 30}
+
+
+def parse_size(size: str) -> int:
+    """
+    Переводит размер вида '1MB', '100MB', '1GB' в байты.
+
+    :param size: Размер.
+    :return: Число байт.
+    """
+    match = SIZE_RE.match(size.strip())
+    if not match:
+        raise ValueError(f'Некорректный размер: {size}')
+    number, unit = match.groups()
+    return int(float(number) * UNITS[(unit or 'B').upper()])
+
+
+class CorpusGenerator:
+    """
+    Генератор документов со словарём и плотностями фраз.
+    """
+
+    def __init__(self, seed: int = 0, doc_tokens: int = 800,
+                 emotion_density: float = EMOTION_DENSITY,
+                 particle_density: float = PARTICLE_DENSITY,
+                 keyword_density: float = KEYWORD_DENSITY):
+        self.random = random.Random(seed)
+        self.doc_tokens = doc_tokens
+
+        with TEXT_PATH.open(encoding='utf-8') as f:
+            filler = Counter(re.findall(r'\b\w+\b', f.read().lower()))
+        emotions = []
+        for path in LEXICON_PATHS:
+            with path.open(encoding='utf-8') as f:
+                emotions.extend(phrase.strip().lower() for phrases in json.load(f).values() for phrase in phrases)
+        with PARTICLES_PATH.open(encoding='utf-8') as f:
+            particles = json.load(f)
+
+        filler_density = 1 - emotion_density - particle_density - keyword_density
+        filler_total = sum(filler.values())
+        groups = [
+            (list(filler), [filler_density * count / filler_total for count in filler.values()]),
+            (emotions, [emotion_density / len(emotions)] * len(emotions)),
+            (particles, [particle_density / len(particles)] * len(particles)),
+            (KEYWORDS, [keyword_density / len(KEYWORDS)] * len(KEYWORDS)),
+        ]
+        self.population = [word for words, _ in groups for word in words]
+        self.cum_weights = list(accumulate(weight for _, weights in groups for weight in weights))
+
+    def document(self) -> str:
+        """
+        Возвращает один документ.
+
+        :return: Текст документа.
+        """
+        return ' '.join(self.random.choices(self.population, cum_weights=self.cum_weights, k=self.doc_tokens))
+
+    def write(self, path: Path, size: int) -> int:
+        """
+        Пишет документы в файл, пока его размер не достигнет size.
+
+        :param path: Путь к файлу.
+        :param size: Размер в байтах.
+        :return: Число документов.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        written = docs = 0
+        with path.open('w', encoding='utf-8') as f:
+            while written < size:
+                line = self.document() + '\n'
+                f.write(line)
+                written += len(line.encode('utf-8'))
+                docs += 1
+        return docs
+
+
+def generate_corpus(path: Path, size: str, seed: int = 0, cache: bool = True) -> Path:
+    """
+    Создаёт синтетический корпус заданного размера.
+
+    :param path: Путь к файлу корпуса.
+    :param size: Размер вида '1MB'.
+    :param seed: Зерно генератора.
+    :param cache: Не пересоздавать уже существующий файл.
+    :return: Путь к файлу.
+    """
+    path = Path(path)
+    if not (cache and path.exists()):
+        CorpusGenerator(seed).write(path, parse_size(size))
+    return path
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('size', help="Размер: '1MB', '100MB', '1GB'")
+    parser.add_argument('path', type=Path)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    docs = CorpusGenerator(args.seed).write(args.path, parse_size(args.size))
+    print(f'{args.path}: {docs} документов')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,388 @@
+"""
+Набор замеров производительности анализаторов.
+
+На синтетическом корпусе заданного размера (bench.corpus_gen) замеряются
+EmotionAnalyzer, ModalParticleAnalyzer, совместный проход SpeechAnalyzer,
+оконные счётчики m2/m4, сборка хранилища корпуса и индекса, clean_text и
+разбор страниц BtPage. Результаты пишутся в JSON и, если указан базовый
+файл, сравниваются с ним: при замедлении больше порога код выхода — 1.
+
+Базовый отчёт bench/baseline.json хранится в репозитории (корпус 1MB,
+seed 0, 5 повторов). Сравнивать имеет смысл на той же машине и с тем же
+размером корпуса; на общей машине разброс между запусками доходит до
+20–30%, поэтому сравнение лучше запускать с ``--repeat 5``. После
+намеренного изменения скорости базовый отчёт записывается заново.
+
+Запуск::
+
+    python -m bench.run --compare                  # с bench/baseline.json, порог 20%
+    python -m bench.run --compare --threshold 0.1
+    python -m bench.run --repeat 5 --save-baseline bench/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from bench.corpus_gen import generate_corpus, parse_size
+
+OUTPUT_PATH = Path('bench_output.json')
+BASELINE_PATH = Path(__file__).resolve().parent / 'baseline.json'
+THRESHOLD = 0.2
+CORPUS_DIR = Path(tempfile.gettempdir()) / 'cl-bench'
+WINDOW_SIZE = 150
+
+# Замер: подготовка вне таймера, возвращает функцию, которая выполняет
+# работу и возвращает число обработанных единиц
+Benchmark = Callable[['Workload'], Callable[[], int]]
+
+BENCHMARKS: dict[str, tuple[Benchmark, str]] = {}
+
+
+def benchmark(name: str, unit: str = 'tokens') -> Callable[[Benchmark], Benchmark]:
+    """
+    Регистрирует замер.
+
+    :param name: Имя замера в отчёте.
+    :param unit: Единица пропускной способности.
+    """
+    def register(func: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = (func, unit)
+        return func
+    return register
+
+
+class Workload:
+    """
+    Общие данные замеров: файл корпуса и собранное по нему хранилище.
+
+    :val path: Файл синтетического корпуса.
+    :val html_dir: Каталог с сохранёнными HTML-страницами для BtPage.
+    """
+
+    def __init__(self, path: Path, html_dir: Optional[Path] = None) -> None:
+        self.path = path
+        self.html_dir = html_dir
+        self._tokens = None
+        self._stores = []
+        self._store = None
+        self._index = None
+        self._tmp = tempfile.TemporaryDirectory(prefix='cl-bench-')
+
+    def lines(self) -> Iterator[str]:
+        """
+        Документы корпуса по одному.
+        """
+        with self.path.open(encoding='utf-8') as f:
+            for line in f:
+                yield line.rstrip('\n')
+
+    def tmp_dir(self, name: str) -> Path:
+        """
+        Пустой временной каталог для замера.
+        """
+        path = Path(self._tmp.name) / name
+        if path.exists():
+            for file in path.iterdir():
+                file.unlink()
+        return path
+
+    @property
+    def tokens(self) -> int:
+        """
+        Число токенов корпуса (как их считает main._tokenize_speeches).
+        """
+        if self._tokens is None:
+            self._tokens = sum(len(line.split()) for line in self.lines())
+        return self._tokens
+
+    def build_store(self, name: str):
+        """
+        Собирает хранилище корпуса во временном каталоге.
+
+        :param name: Имя каталога.
+        :return: Открытое хранилище, закрывается вместе с Workload.
+        """
+        from analysis.corpus import build_corpus
+        store = build_corpus(self.tmp_dir(name), pages_dir=None, text_path=self.path)
+        self._stores.append(store)
+        return store
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = self.build_store('store')
+        return self._store
+
+    @property
+    def index(self):
+        if self._index is None:
+            from analysis.index import PositionalIndex
+            self._index = PositionalIndex.open_or_build(self.store)
+        return self._index
+
+    def close(self) -> None:
+        for store in self._stores:
+            store.close()
+        self._tmp.cleanup()
+
+
+def _load_json(path: str) -> Any:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@benchmark('emotions')
+def bench_emotions(workload: Workload) -> Callable[[], int]:
+    from main import EmotionAnalyzer
+    analyzer = EmotionAnalyzer(Path('es.json'), Path('ev.json'))
+
+    def run() -> int:
+        asyncio.run(analyzer.analyze_emotions_in_texts(workload.lines()))
+        return workload.tokens
+    return run
+
+
+@benchmark('particles')
+def bench_particles(workload: Workload) -> Callable[[], int]:
+    from main import ModalParticleAnalyzer
+    analyzer = ModalParticleAnalyzer(Path('mp.json'))
+
+    def run() -> int:
+        asyncio.run(analyzer.analyze_particles_frequency(workload.lines()))
+        return workload.tokens
+    return run
+
+
+@benchmark('speech_fused')
+def bench_speech_fused(workload: Workload) -> Callable[[], int]:
+    from main import SpeechAnalyzer
+    analyzer = SpeechAnalyzer(workload.path, Path('es.json'), Path('ev.json'), Path('mp.json'), stream=True)
+
+    def run() -> int:
+        asyncio.run(analyzer.analyze_all())
+        return workload.tokens
+    return run
+
+
+@benchmark('cooccur_m2')
+def bench_cooccur_m2(workload: Workload) -> Callable[[], int]:
+    from analysis.cooccur import CategoryPrefixSums
+    from analysis.lexicon import word_categories
+    categories = word_categories(_load_json('ev.json'))
+    keywords = {word.lower() for word in _load_json('important_context.json')}
+
+    def run() -> int:
+        tokens = 0
+        counts = defaultdict(lambda: defaultdict(int))
+        for line in workload.lines():
+            words = line.lower().split()
+            tokens += len(words)
+            positions = defaultdict(list)
+            for i, word in enumerate(words):
+                if word in keywords:
+                    positions[word].append(i)
+            if not positions:
+                continue
+            prefix_sums = CategoryPrefixSums.from_words(words, categories)
+            for keyword, centers in positions.items():
+                for category, count in prefix_sums.window_counts(centers, WINDOW_SIZE).items():
+                    counts[keyword][category] += count
+        return tokens
+    return run
+
+
+@benchmark('corpus_build')
+def bench_corpus_build(workload: Workload) -> Callable[[], int]:
+    from analysis.corpus import build_corpus
+
+    def run() -> int:
+        with build_corpus(workload.tmp_dir('build'), pages_dir=None, text_path=workload.path) as store:
+            return len(store.tokens)
+    return run
+
+
+@benchmark('index_build')
+def bench_index_build(workload: Workload) -> Callable[[], int]:
+    from analysis.index import build_index
+    # Отдельное хранилище: индекс общего хранилища открыт другими замерами
+    store = workload.build_store('index')
+
+    def run() -> int:
+        build_index(store)
+        return len(store.tokens)
+    return run
+
+
+@benchmark('cooccur_m4')
+def bench_cooccur_m4(workload: Workload) -> Callable[[], int]:
+    from analysis.cooccur import batch_cooccurrence
+    from analysis.lexicon import load_compiled
+    lexicon = load_compiled(Path('es.json'))
+    keywords = _load_json('important_context.json') + ['usa']
+    store, index = workload.store, workload.index
+
+    def run() -> int:
+        batch_cooccurrence(store, index, keywords, lexicon, WINDOW_SIZE)
+        return len(store.tokens)
+    return run
+
+
+@benchmark('clean_text', unit='chars')
+def bench_clean_text(workload: Workload) -> Callable[[], int]:
+    from bench.bench_btpage import text_available
+    from pars._utils import CleaningPipeline, clean_text
+    strict = text_available()
+
+    def run() -> int:
+        # Новый конвейер на каждый прогон, чтобы кэш лемм не переживал замер;
+        # без данных nltk замеряется только нестрогая очистка
+        clean = CleaningPipeline().clean_text if strict else clean_text
+        size = 0
+        for line in workload.lines():
+            size += len(line)
+            clean(line, strict=strict)
+        return size
+    return run
+
+
+@benchmark('btpage_parse', unit='pages')
+def bench_btpage_parse(workload: Workload) -> Callable[[], int]:
+    from bench.bench_btpage import load_pages, process, text_available
+    from pars.cache import MemoryCache
+    cache = MemoryCache(load_pages(workload.html_dir))
+    with_text = text_available()
+
+    def run() -> int:
+        process(cache, True, with_text)
+        return len(cache.pages)
+    return run
+
+
+def measure(factory: Benchmark, workload: Workload, repeat: int) -> dict[str, float]:
+    """
+    Выполняет замер repeat раз и возвращает лучшее время.
+
+    :param factory: Замер.
+    :param workload: Данные замеров.
+    :param repeat: Число повторов.
+    :return: Время в секундах и число обработанных единиц.
+    """
+    run = factory(workload)
+    best, units = float('inf'), 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        units = run()
+        best = min(best, time.perf_counter() - start)
+    return {'seconds': best, 'units': units}
+
+
+def run_benchmarks(workload: Workload, names: list[str], repeat: int) -> dict[str, Any]:
+    """
+    Выполняет выбранные замеры.
+
+    :param workload: Данные замеров.
+    :param names: Имена замеров.
+    :param repeat: Число повторов каждого замера.
+    :return: Отчёт: параметры запуска и результаты по замерам.
+    """
+    results = {}
+    for name in names:
+        factory, unit = BENCHMARKS[name]
+        result = measure(factory, workload, repeat)
+        result['unit'] = unit
+        result['throughput'] = result['units'] / result['seconds'] if result['seconds'] else 0.0
+        results[name] = result
+        print(f'{name:<14} {result["seconds"]:9.3f} с  {result["throughput"]:14,.0f} {unit}/с', file=sys.stderr)
+    return {
+        'meta': {
+            'corpus': str(workload.path),
+            'bytes': workload.path.stat().st_size,
+            'repeat': repeat,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+        },
+        'results': results,
+    }
+
+
+def compare(report: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """
+    Сравнивает отчёт с базовым.
+
+    :param report: Текущий отчёт.
+    :param baseline: Базовый отчёт.
+    :param tolerance: Допустимое относительное замедление (0.2 — на 20%).
+    :return: Имена замеров, замедлившихся сильнее допуска.
+    """
+    if report['meta']['bytes'] != baseline['meta']['bytes']:
+        print('Внимание: размер корпуса отличается от базового.', file=sys.stderr)
+    if report['meta']['platform'] != baseline['meta']['platform']:
+        print(f"Внимание: базовый отчёт снят на другой машине ({baseline['meta']['platform']}).", file=sys.stderr)
+
+    regressions = []
+    for name, result in report['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratio = result['seconds'] / base['seconds'] if base['seconds'] else 1.0
+        result['baseline_seconds'] = base['seconds']
+        result['ratio'] = ratio
+        mark = ''
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            mark = '  <- замедление'
+        print(f'{name:<14} x{ratio:5.2f}{mark}', file=sys.stderr)
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', default='1MB', help="Размер корпуса: '1MB', '100MB', '1GB'")
+    parser.add_argument('--corpus', type=Path, help='Готовый файл корпуса (вместо генерации)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--html-dir', type=Path, help='Каталог с сохранёнными страницами *.html')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', type=Path, default=OUTPUT_PATH)
+    parser.add_argument('--compare', '--baseline', dest='baseline', type=Path, nargs='?', const=BASELINE_PATH,
+                        help=f'Сравнить с базовым отчётом (по умолчанию {BASELINE_PATH.name})')
+    parser.add_argument('--threshold', '--tolerance', dest='tolerance', type=float, default=THRESHOLD,
+                        help='Допустимое относительное замедление, 0.2 — на 20%%')
+    parser.add_argument('--save-baseline', type=Path, help='Сохранить отчёт как базовый')
+    args = parser.parse_args(argv)
+
+    # Логи анализаторов не должны попадать в замеры
+    logging.disable(logging.INFO)
+
+    path = args.corpus or generate_corpus(CORPUS_DIR / f'corpus_{parse_size(args.size)}_{args.seed}.txt',
+                                          args.size, args.seed)
+    workload = Workload(path, args.html_dir)
+    try:
+        report = run_benchmarks(workload, args.only, args.repeat)
+    finally:
+        workload.close()
+
+    regressions = []
+    if args.baseline is not None:
+        with args.baseline.open(encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with path.open('w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
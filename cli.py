@@ -0,0 +1,304 @@
+"""
+Единая точка запуска всех этапов: сбор страниц, сборка корпуса и
+индексов, подсчёт эмоций и модальных частиц, совместная встречаемость,
+контексты ключевых слов и отчёт.
+
+Зависимости каждой команды (requests и bs4, numpy, pydantic,
+colorama, python-docx, matplotlib) импортируются только в её
+обработчике, поэтому ``--help`` и лёгкие команды не платят за
+загрузку тяжёлых модулей. ``--timing`` выводит в stderr время запуска
+(до начала работы команды) и общее время.
+
+Запуск из корня репозитория::
+
+    python cli.py crawl --workers 8
+    python cli.py index --search
+    python cli.py emotions --workers 4
+    python cli.py particles --plot
+    python cli.py cooccur usa
+    python cli.py aggregate --source bt
+    python cli.py kwic usa --context 15
+    python cli.py report --batch --html 'Результаты анализа.html'
+    python cli.py serve --port 8765
+"""
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+# Пути по умолчанию; те же значения заданы в analysis.corpus и скриптах
+PAGES_ROOT = Path('pars/pages')
+PAGES_DIR = PAGES_ROOT / 'bt'
+TEXT_PATH = PAGES_ROOT / 'bt.txt'
+CORPUS_DIR = PAGES_ROOT / 'corpus'
+ES_JSON_PATH = Path('es.json')
+EV_JSON_PATH = Path('ev.json')
+MP_JSON_PATH = Path('mp.json')
+
+COMMANDS: dict[str, Callable[[argparse.Namespace], None]] = {}
+
+
+def command(name: str) -> Callable[[Callable[[argparse.Namespace], None]], Callable[[argparse.Namespace], None]]:
+    """
+    Регистрирует обработчик команды.
+
+    :param name: Имя команды.
+    """
+    def register(func: Callable[[argparse.Namespace], None]) -> Callable[[argparse.Namespace], None]:
+        COMMANDS[name] = func
+        return func
+    return register
+
+
+def _print_json(data: Any) -> None:
+    print(json.dumps(data, ensure_ascii=False, indent=2))
+
+
+@command('crawl')
+def crawl(args: argparse.Namespace) -> None:
+    import logging
+
+    from pars.cache import DiskCache
+    from pars.crawler import Crawler
+    from pars.manifest import CrawlManifest
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    pages_dir = args.pages_root
+    crawler = Crawler(
+        pages_dir=pages_dir, max_workers=args.workers, manifest=CrawlManifest(pages_dir / 'manifest.json'),
+        refresh=args.refresh, cache=DiskCache(pages_dir / 'cache')
+    )
+    report = crawler.reprocess() if args.offline else crawler.crawl()
+    print(f'Сохранено: {len(report.saved)}, без изменений: {len(report.unchanged)}, ошибок: {len(report.failed)}')
+    for id_, error in report.failed.items():
+        print(id_, error)
+
+
+@command('index')
+def index(args: argparse.Namespace) -> None:
+    from analysis.corpus import CorpusStore, build_corpus
+    from analysis.index import PositionalIndex, build_index
+
+    if args.rebuild:
+        store = build_corpus(args.corpus_dir, pages_dir=args.pages_dir, text_path=args.text)
+        build_index(store)
+    else:
+        store = CorpusStore.open_or_build(args.corpus_dir, pages_dir=args.pages_dir, text_path=args.text)
+        PositionalIndex.open_or_build(store)
+    print(f'Документов: {len(store)}, словоупотреблений: {len(store.tokens)}, словоформ: {len(store.vocab)}')
+
+    if args.search:
+        from analysis.search import SearchIndex, build_search_index, fts5_available
+        if not fts5_available():
+            raise SystemExit('sqlite3 собран без FTS5')
+        search = build_search_index(store) if args.rebuild else SearchIndex.open_or_build(store)
+        search.close()
+    store.close()
+
+
+def _speech_analyzer(args: argparse.Namespace) -> Any:
+    from analysis.results import ResultCache
+    from main import SpeechAnalyzer
+
+    return SpeechAnalyzer(
+        speeches_path=args.text,
+        emotion_synonyms_path=args.es,
+        emotion_vocab_path=args.ev,
+        modal_particles_path=args.mp,
+        corpus_path=args.corpus_dir if args.corpus else None,
+        stream=args.stream,
+        cache=None if args.no_cache else ResultCache()
+    )
+
+
+@command('emotions')
+def emotions(args: argparse.Namespace) -> None:
+    import asyncio
+
+    emotion_results, _ = asyncio.run(_speech_analyzer(args).analyze(args.workers))
+    _print_json(emotion_results)
+
+
+@command('particles')
+def particles(args: argparse.Namespace) -> None:
+    import asyncio
+
+    analyzer = _speech_analyzer(args)
+    _, particle_counts = asyncio.run(analyzer.analyze(args.workers))
+    _print_json(dict(particle_counts.most_common()))
+    if args.plot and particle_counts:
+        analyzer._generate_particle_graph(particle_counts)
+
+
+@command('aggregate')
+def aggregate(args: argparse.Namespace) -> None:
+    from analysis.aggregate import update_aggregates
+    from analysis.corpus import CorpusStore, build_corpus, corpus_stale
+    from analysis.index import PositionalIndex, build_index
+    from analysis.lexicon import load_compiled
+    from analysis.pipeline import FusedPipeline
+    from main import EmotionAnalyzer, ModalParticleAnalyzer
+
+    if corpus_stale(args.corpus_dir, args.pages_dir, args.text):
+        store = build_corpus(args.corpus_dir, pages_dir=args.pages_dir, text_path=args.text)
+        index = build_index(store)
+    else:
+        store = CorpusStore(args.corpus_dir)
+        index = PositionalIndex.open_or_build(store)
+
+    keywords = args.keywords
+    if not keywords:
+        with open('important_context.json', encoding='utf-8') as f:
+            keywords = json.load(f)
+    pipeline = FusedPipeline([EmotionAnalyzer(args.es, args.ev), ModalParticleAnalyzer(args.mp)])
+    aggregates, delta = update_aggregates(
+        store, index, pipeline, keywords, load_compiled(args.lexicon or args.es), args.window
+    )
+    print(f'Новых: {len(delta.added)}, изменённых: {len(delta.changed)}, удалённых: {len(delta.removed)}',
+          file=sys.stderr)
+    source = args.source
+    if source is None and len(aggregates.totals) > 1:
+        # Страницы и bt.txt содержат одни и те же речи, их сумма удвоила бы счётчики
+        source = args.pages_dir.name
+    _print_json({
+        name: {key: dict(counter.most_common()) for key, counter in counters.items()}
+        for name, counters in aggregates.results(source).items()
+    })
+    store.close()
+
+
+@command('cooccur')
+def cooccur(args: argparse.Namespace) -> None:
+    import m2
+
+    m2.main(args.keywords or None, args.lexicon or EV_JSON_PATH, args.window, not args.no_cache)
+
+
+@command('kwic')
+def kwic(args: argparse.Namespace) -> None:
+    import m4
+
+    m4.main(
+        args.keywords or None, args.batch, args.window, args.context, args.pages_dir, args.lexicon or ES_JSON_PATH,
+        not args.no_cache
+    )
+
+
+@command('report')
+def report(args: argparse.Namespace) -> None:
+    import e4
+
+    e4.main(
+        args.keywords or None, args.batch, args.output, args.html, args.workers, args.volume_size,
+        args.window, args.context, args.pages_dir, args.lexicon or ES_JSON_PATH, not args.no_cache
+    )
+
+
+@command('serve')
+def serve(args: argparse.Namespace) -> None:
+    from analysis.server import serve as serve_forever
+
+    serve_forever(
+        args.host, args.port, args.poll_interval, corpus_dir=args.corpus_dir, pages_dir=args.pages_dir,
+        text_path=args.text, es_path=args.es, ev_path=args.ev, mp_path=args.mp
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--timing', action='store_true', help='Время запуска и общее время в stderr')
+    parser.add_argument('--metrics', type=Path, metavar='ФАЙЛ', help='Включить замеры этапов и записать отчёт')
+    parser.add_argument('--no-cache', action='store_true', help='Не брать результаты из кэша (.cache/results)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    crawl_parser = subparsers.add_parser('crawl', help='Сбор страниц bundestag.de')
+    crawl_parser.add_argument('--pages-root', type=Path, default=PAGES_ROOT)
+    crawl_parser.add_argument('--workers', type=int, default=8)
+    crawl_parser.add_argument('--refresh', action='store_true', help='Скачать страницы заново')
+    crawl_parser.add_argument('--offline', action='store_true', help='Пересобрать корпус из кэша ответов')
+
+    corpus = argparse.ArgumentParser(add_help=False)
+    corpus.add_argument('--pages-dir', type=Path, default=PAGES_DIR)
+    corpus.add_argument('--text', type=Path, default=TEXT_PATH)
+    corpus.add_argument('--corpus-dir', type=Path, default=CORPUS_DIR)
+
+    index_parser = subparsers.add_parser('index', parents=[corpus], help='Хранилище корпуса и индексы')
+    index_parser.add_argument('--rebuild', action='store_true', help='Собрать заново, даже если уже собраны')
+    index_parser.add_argument('--search', action='store_true', help='Также полнотекстовый индекс SQLite FTS5')
+
+    lexicons = argparse.ArgumentParser(add_help=False)
+    lexicons.add_argument('--es', type=Path, default=ES_JSON_PATH)
+    lexicons.add_argument('--ev', type=Path, default=EV_JSON_PATH)
+    lexicons.add_argument('--mp', type=Path, default=MP_JSON_PATH)
+
+    speeches = argparse.ArgumentParser(add_help=False, parents=[corpus, lexicons])
+    speeches.add_argument('--workers', type=int, default=1)
+    speeches.add_argument('--corpus', action='store_true', help='Брать документы из хранилища корпуса')
+    speeches.add_argument('--stream', action='store_true', help='Читать выступления из файла по одному')
+
+    subparsers.add_parser('emotions', parents=[speeches], help='Подсчёт эмоций')
+    particles_parser = subparsers.add_parser('particles', parents=[speeches], help='Подсчёт модальных частиц')
+    particles_parser.add_argument('--plot', action='store_true', help='График частотности (matplotlib)')
+
+    keywords = argparse.ArgumentParser(add_help=False)
+    keywords.add_argument('keywords', nargs='*', help='Ключевые слова (по умолчанию из important_context.json)')
+    keywords.add_argument('--lexicon', type=Path, help='Словарь категорий')
+    keywords.add_argument('--window', type=int, default=150, help='Окно для подсчёта категорий')
+
+    subparsers.add_parser('cooccur', parents=[keywords], help='Категории в окнах ключевых слов')
+
+    aggregate_parser = subparsers.add_parser(
+        'aggregate', parents=[keywords, corpus, lexicons],
+        help='Итоги по документам: анализируются только новые и изменённые'
+    )
+    aggregate_parser.add_argument('--source', help='Источник итогов (bt, bt.txt); по умолчанию страницы из --pages-dir')
+
+    contexts = argparse.ArgumentParser(add_help=False, parents=[keywords])
+    contexts.add_argument('--pages-dir', type=Path, default=PAGES_DIR)
+    contexts.add_argument('--batch', action='store_true', help='Все слова из important_context.json за один проход')
+
+    kwic_parser = subparsers.add_parser('kwic', parents=[contexts], help='Контексты ключевых слов в терминале')
+    kwic_parser.add_argument('--context', type=int, default=15, help='Слов контекста с каждой стороны')
+
+    report_parser = subparsers.add_parser('report', parents=[contexts], help='Отчёт DOCX (и HTML)')
+    report_parser.add_argument('--context', type=int, default=50, help='Слов контекста с каждой стороны')
+    report_parser.add_argument('--output', type=Path, help='Файл DOCX')
+    report_parser.add_argument('--html', type=Path, help='Тот же отчёт в HTML')
+    report_parser.add_argument('--workers', type=int, default=4)
+    report_parser.add_argument('--volume-size', type=int, help='Контекстов в одном томе DOCX')
+
+    serve_parser = subparsers.add_parser('serve', parents=[corpus, lexicons], help='Сервер анализа на localhost')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--poll-interval', type=float, default=1.0, help='Проверка изменений файлов, секунд')
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    if args.metrics is not None:
+        from analysis.metrics import metrics
+        metrics.enable()
+
+    started = time.perf_counter()
+    try:
+        COMMANDS[args.command](args)
+    finally:
+        if args.metrics is not None:
+            metrics.write(args.metrics)
+        if args.timing:
+            finished = time.perf_counter()
+            print(
+                f'Запуск: {started - STARTED:.3f} с, команда: {finished - started:.3f} с, '
+                f'всего: {finished - STARTED:.3f} с',
+                file=sys.stderr
+            )
+
+
+if __name__ == '__main__':
+    main()
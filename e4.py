@@ -1,176 +1,73 @@
 import json
-import os
-import re
-from collections import defaultdict
-from docx import Document
-from docx.shared import Pt, RGBColor
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
+from pathlib import Path
+
+from analysis.annotate import map_parallel, section_tasks
+from analysis.cooccur import batch_cooccurrence
+from analysis.corpus import CorpusStore
+from analysis.index import PositionalIndex
+from analysis.lexicon import load_compiled
+from analysis.render import DocxRenderer, HtmlRenderer, init_prerender, prerender_section, render
+from analysis.results import ResultCache
 
 # Параметры
 KEY_W = 'usa'
+BATCH_MODE = False  # True — все слова из important_context.json за один проход
 PAGES_DIR = 'pars/pages/bt'
-EV_JSON_PATH = 'ev.json'
 IMPORTANT_CONTEXT_JSON = 'important_context.json'
 ES_JSON_PATH = 'es.json'
-OUTPUT_DOCX = f'Результаты анализа слова {KEY_W}.docx'
+OUTPUT_DOCX = None  # Файл отчёта (None — по ключевому слову или общий для пакетного режима)
+WORKERS = 4  # Процессы для сборки разделов отчёта (1 — без пула)
+VOLUME_CONTEXTS = None  # Контекстов в одном файле, например 5000 (None — один файл)
+OUTPUT_HTML = None  # Тот же отчёт в HTML по тому же анализу, например 'Результаты анализа.html'
+USE_CACHE = True  # Кэш результатов (.cache/results): тот же корпус, словарь и параметры не пересчитываются
 
 # Размеры окон
 WINDOW_SIZE = 150  # Для подсчёта категорий
 CONTEXT_WORDS = 50  # Для отображения контекста
 
-# Загрузка данных
-with open(EV_JSON_PATH, 'r', encoding="utf-8") as f:
-    es = json.load(f)
-
-with open(IMPORTANT_CONTEXT_JSON, 'r', encoding="utf-8") as f:
-    kw = json.load(f)
-
-with open(ES_JSON_PATH, 'r', encoding="utf-8") as f:
-    es_categories = json.load(f)
-
-# Загрузка цветовой карты
-COLOR_MAP = {
-    'v': RGBColor(0, 0, 255),  # синий
-    'g': RGBColor(0, 128, 0),  # зелёный
-    'r': RGBColor(255, 0, 0),  # красный
-    'b': RGBColor(255, 255, 0),  # жёлтый
-}
-
-# Создание словаря: слово -> категория и цвет
-word_category_map = {}
-word_color_map = {}
-for category, words in es_categories.items():
-    prefix = category[0].lower()
-    color = COLOR_MAP.get(prefix, None)
-    for word in words:
-        word_clean = word.strip().lower()
-        if word_clean:
-            word_category_map[word_clean] = category
-            word_color_map[word_clean] = color
-
-
-# Функция для добавления горизонтальной линии
-def add_horizontal_line(document):
-    paragraph = document.add_paragraph()
-    run = paragraph.add_run()
-
-    # Создание элемента w:pBdr
-    p = paragraph._p
-    pPr = p.get_or_add_pPr()
-    pBdr = OxmlElement('w:pBdr')
-
-    # Создание нижней границы
-    bottom = OxmlElement('w:bottom')
-    bottom.set(qn('w:val'), 'single')  # Тип линии: сплошная
-    bottom.set(qn('w:sz'), '6')  # Толщина линии (в десятых долей пункта)
-    bottom.set(qn('w:space'), '1')  # Отступ между линией и текстом
-    bottom.set(qn('w:color'), '000000')  # Цвет линии: черный
-
-    # Добавление нижней границы к pBdr
-    pBdr.append(bottom)
-
-    # Добавление pBdr к pPr
-    pPr.append(pBdr)
-
-
-# Функция для выделения контекста в документе Word
-def add_highlighted_context(document, words, index, total_words):
-    start = max(index - CONTEXT_WORDS, 0)
-    end = min(index + CONTEXT_WORDS + 1, total_words)
-    context = words[start:end]
-    paragraph = document.add_paragraph()
-
-    for i, word in enumerate(context):
-        word_lower = word.lower()
-        run = paragraph.add_run(word + ' ')
-        # Выделение ключевого слова
-        if start + i == index:
-            run.bold = True
-            run.font.highlight_color = 7  # Желтый фон (используется стандартный код)
-        elif word_lower in word_color_map:
-            run.font.color.rgb = word_color_map[word_lower]
-
-    # Добавление горизонтальной линии после контекста
-    add_horizontal_line(document)
-
-
-# Создание документа Word
-doc = Document()
-
-# Добавление заголовка
-doc.add_heading('Результаты Анализа', level=1)
-
-# Обработка файлов
-files = os.listdir(PAGES_DIR)
-
-for file in files:
-    file_path = os.path.join(PAGES_DIR, file)
-    with open(file_path, 'r', encoding="utf-8") as f:
-        data = json.load(f)
-
-    text = data.get('text', '').lower()
-    date = data.get('date', 'Дата не указана')
-
-    # Поиск ключевых слов
-    found_positions = [m.start() for m in re.finditer(rf'\b{re.escape(KEY_W)}\b', text, re.IGNORECASE)]
-
-    if found_positions:
-        # Добавление даты
-        doc.add_heading(f"Дата: {date}", level=2)
 
-        # Разбивка текста на слова
-        words = re.findall(r'\b\w+\b', text)
-        total_words = len(words)
+def main(keywords=None, batch=BATCH_MODE, output_docx=OUTPUT_DOCX, output_html=OUTPUT_HTML, workers=WORKERS,
+         volume_contexts=VOLUME_CONTEXTS, window_size=WINDOW_SIZE, context_words=CONTEXT_WORDS,
+         pages_dir=PAGES_DIR, lexicon_path=ES_JSON_PATH, use_cache=USE_CACHE):
+    # Загрузка данных
+    if keywords is None:
+        with open(IMPORTANT_CONTEXT_JSON, 'r', encoding="utf-8") as f:
+            kw = json.load(f)
+        keywords = kw if batch else [KEY_W]
 
-        # Создание обратного словаря для категорий
-        keyword_counts = defaultdict(lambda: defaultdict(int))
+    if output_docx is None:
+        output_docx = 'Результаты анализа ключевых слов.docx' if batch else f'Результаты анализа слова {keywords[0]}.docx'
 
-        # Приведение ключевых слов к нижнему регистру
-        kw_lower = [word.lower() for word in kw]
+    # Словарь категорий компилируется один раз и берётся из кэша, пока es.json не изменится
+    es_lexicon = load_compiled(Path(lexicon_path))
 
-        for pos in found_positions:
-            # Определение индекса слова
-            word_index = len(re.findall(r'\b\w+\b', text[:pos]))
-            if 0 <= word_index < total_words:
-                # Определение окна для подсчёта
-                start = max(word_index - WINDOW_SIZE, 0)
-                end = min(word_index + WINDOW_SIZE + 1, total_words)
-                context = words[start:end]
+    # Обратный словарь: слово -> категория (цвет определяется первой буквой категории)
+    word_category_map = es_lexicon.words
 
-                for i, context_word in enumerate(context):
-                    if (start + i) == word_index:
-                        continue  # Пропуск ключевого слова
-                    category = word_category_map.get(context_word)
-                    if category:
-                        keyword_counts[KEY_W][category] += 1
+    # Обработка документов: позиционный индекс отдаёт только документы с вхождениями,
+    # категории для всех ключевых слов считаются за один проход по этим документам
+    store = CorpusStore.open_or_build(pages_dir=Path(pages_dir))
+    index = PositionalIndex.open_or_build(store)
+    results = batch_cooccurrence(
+        store, index, keywords, es_lexicon, window_size, source=Path(pages_dir).name,
+        cache=ResultCache() if use_cache else None
+    )
 
-        # Добавление таблицы
-        table = doc.add_table(rows=1, cols=2)
-        table.style = 'Light List Accent 1'
-        hdr_cells = table.rows[0].cells
-        hdr_cells[0].text = 'Группа'
-        hdr_cells[1].text = 'Количество'
+    # Разделы размечаются в процессах пула (там же собирается их XML для DOCX)
+    # и передаются всем форматам вывода по мере готовности
+    renderers = [DocxRenderer(Path(output_docx), 'Результаты Анализа', volume_contexts)]
+    if output_html:
+        renderers.append(HtmlRenderer(Path(output_html), 'Результаты Анализа'))
 
-        counts = keyword_counts.get(KEY_W, {})
-        if counts:
-            for category, count in counts.items():
-                row_cells = table.add_row().cells
-                row_cells[0].text = category
-                row_cells[1].text = str(count)
-        else:
-            row_cells = table.add_row().cells
-            row_cells[0].text = "Нет связанных слов в контексте."
-            row_cells[1].text = ""
+    sections = map_parallel(
+        prerender_section, section_tasks(store, results, batch), workers, initializer=init_prerender,
+        initargs=([output.name for output in renderers], store.path, word_category_map, context_words)
+    )
+    render(sections, renderers)
 
-        doc.add_paragraph()  # Пустая строка после таблицы
+    paths = [str(path) for output in renderers for path in output.paths]
+    print(f"Результаты успешно сохранены в файл '{', '.join(paths)}'.")
 
-        # Вывод контекста для каждого вхождения
-        for pos in found_positions:
-            word_index = len(re.findall(r'\b\w+\b', text[:pos]))
-            if 0 <= word_index < total_words:
-                add_highlighted_context(doc, words, word_index, total_words)
 
-# Сохранение документа
-doc.save(OUTPUT_DOCX)
-print(f"Результаты успешно сохранены в файл '{OUTPUT_DOCX}'.")
+if __name__ == '__main__':
+    main()
@@ -1,66 +1,63 @@
 import json
-import re
 from collections import defaultdict
-from prettytable import PrettyTable
-
-# Загрузка ключевых слов
-with open('important_context.json', 'r', encoding="utf-8") as f:
-    kw = json.load(f)  # массив с ключевыми словами
-
-with open('ev.json', 'r', encoding="utf-8") as f:
-    es = json.load(f)
-
-with open('pars/pages/bt.txt', 'r', encoding="utf-8") as f:
-    text = f.read().lower()
-
-# Создаем обратный словарь: слово -> категория
-word_category_map = {}
-for category, words in es.items():
-    for word in words:
-        word_clean = word.strip().lower()
-        if word_clean:
-            word_category_map[word_clean] = category
-
-# Разбиваем текст на слова с сохранением порядка
-words = re.findall(r'\b\w+\b', text)
-
-# Приводим ключевые слова к нижнему регистру для сравнения
-kw_lower = [word.lower() for word in kw]
-
-# Инициализируем словарь для подсчёта
-keyword_counts = defaultdict(lambda: defaultdict(int))
+from pathlib import Path
+
+from analysis.annotate import Section
+from analysis.cooccur import blocked_window_counts
+from analysis.corpus import TEXT_PATH, load_words
+from analysis.lexicon import load_compiled
+from analysis.render import TableRenderer, render
+from analysis.results import ResultCache
+
+# Параметры
+IMPORTANT_CONTEXT_JSON = 'important_context.json'
+EV_JSON_PATH = 'ev.json'
+WINDOW_SIZE = 150  # Размер окна контекста
+USE_CACHE = True  # Кэш результатов (.cache/results): тот же текст, словарь и параметры не пересчитываются
+
+
+def main(keywords=None, lexicon_path=EV_JSON_PATH, window_size=WINDOW_SIZE, use_cache=USE_CACHE):
+    # Загрузка ключевых слов
+    if keywords is None:
+        with open(IMPORTANT_CONTEXT_JSON, 'r', encoding="utf-8") as f:
+            keywords = json.load(f)  # массив с ключевыми словами
+
+    # Компилированный словарь категорий из кэша: обратный словарь слово -> категория
+    # (слово из нескольких категорий относится к последней)
+    category_lexicon = load_compiled(Path(lexicon_path))
+
+    # Приводим ключевые слова к нижнему регистру для сравнения
+    kw_lower = {word.lower() for word in keywords}
+
+    def count_windows():
+        # Разбиваем текст на слова с сохранением порядка (из хранилища корпуса, если оно собрано)
+        words = load_words()
+
+        # Позиции каждого ключевого слова в тексте
+        keyword_positions = defaultdict(list)
+        for i, word in enumerate(words):
+            if word in kw_lower:
+                keyword_positions[word].append(i)
+
+        # Подсчитываем категории в окнах по накопленным суммам блоков текста, исключая само ключевое слово
+        results = blocked_window_counts(words, category_lexicon.words, keyword_positions, window_size)
+        # Ключевые слова без категорий в окнах не выводятся, остальные идут
+        # в порядке первого окна с категориями
+        found = sorted((hit, keyword) for keyword, (hit, _) in results.items() if hit is not None)
+        return {keyword: results[keyword][1] for _, keyword in found}
+
+    # Ключ кэша — содержимое bt.txt (хэш файла запоминается, текст при
+    # попадании в кэш не читается), хэш словаря, ключевые слова и окно
+    if use_cache:
+        cache = ResultCache()
+        key = cache.key('window_counts', TEXT_PATH, category_lexicon.digest, sorted(kw_lower), window_size)
+        keyword_counts = cache.cached(key, count_windows)
+    else:
+        keyword_counts = count_windows()
 
-# Определяем размер окна контекста
-window_size = 150
+    # Вывод таблиц категорий по ключевым словам
+    render((Section(keyword, counts=counts) for keyword, counts in keyword_counts.items()), [TableRenderer()])
 
-# Проходим по всем словам и ищем ключевые
-for i, word in enumerate(words):
-    word_lower = word.lower()
-    if word_lower in kw_lower:
-        # Определяем границы контекста
-        start = max(i - window_size, 0)
-        end = min(i + window_size + 1, len(words))
-        # Получаем контекст
-        context = words[start:end]
-        # Подсчитываем категории в контексте, исключая само ключевое слово
-        for j, context_word in enumerate(context):
-            if j == i - start:
-                continue  # Пропускаем ключевое слово
-            context_word_lower = context_word.lower()
-            category = word_category_map.get(context_word_lower)
-            if category:
-                keyword_counts[word_lower][category] += 1
 
-# Вывод результатов с использованием PrettyTable
-for keyword, counts in keyword_counts.items():
-    print(f"Ключевое слово: {keyword}")
-    table = PrettyTable()
-    table.field_names = ["Группа", "Количество"]
-    table.align["Группа"] = "l"
-    if counts:
-        for category, count in counts.items():
-            table.add_row([category, count])
-    else:
-        table.add_row(["Нет связанных слов в контексте.", ""])
-    print(table)
-    print()
+if __name__ == '__main__':
+    main()
@@ -1,70 +1,48 @@
 import json
-import re
-from colorama import Fore, Style, init, Back
+from pathlib import Path
+from colorama import init
 
-# Инициализация colorama
-init(autoreset=True)
+from analysis.annotate import Section, annotate_line
+from analysis.concordance import Concordance, word_annotations
+from analysis.corpus import load_words
+from analysis.lexicon import load_compiled
+from analysis.render import AnsiRenderer, render
 
-# Загрузка ключевых слов
-with open('important_context.json', 'r', encoding="utf-8") as f:
-    kw = json.load(f)  # массив с ключевыми словами
+# Параметры
+IMPORTANT_CONTEXT_JSON = 'important_context.json'
+ES_JSON_PATH = 'es.json'
+CONTEXT_WORDS = 12  # Для отображения контекста
 
-with open('es.json', 'r', encoding="utf-8") as f:
-    es = json.load(f)
 
-with open('pars/pages/bt.txt', 'r', encoding="utf-8") as f:
-    text = f.read()
+def main(keywords=None, lexicon_path=ES_JSON_PATH, context_words=CONTEXT_WORDS):
+    # Инициализация colorama
+    init(autoreset=True)
 
-# Словарь с эмоциями и соответствующими словами
+    # Загрузка ключевых слов
+    if keywords is None:
+        with open(IMPORTANT_CONTEXT_JSON, 'r', encoding="utf-8") as f:
+            keywords = json.load(f)  # массив с ключевыми словами
 
-# Определяем цвет для каждой категории по первой букве ключа
-color_map = {
-    'v': Fore.BLUE,       # синий
-    'g': Fore.GREEN,      # зелёный
-    'r': Fore.RED,        # красный
-    'b': Fore.YELLOW,     # жёлтый
-}
+    # Словарь с эмоциями и обратный словарь: слово -> категория (цвет определяется
+    # первой буквой категории); оба берутся из кэша скомпилированных словарей
+    word_category_map = load_compiled(Path(lexicon_path)).words
 
+    # Разбиваем текст на слова с сохранением порядка (из хранилища корпуса, если оно собрано)
+    words = load_words()
 
-# Создаем обратный словарь: слово -> цвет
-word_color_map = {}
-for category, words in es.items():
-    prefix = category[0].lower()  # первая буква для цвета
-    color = color_map.get(prefix, '')
-    for word in words:
-        word_clean = word.strip().lower()
-        if word_clean:
-            word_color_map[word_clean] = color
+    # Приводим ключевые слова к нижнему регистру для сравнения
+    kw_lower = {word.lower() for word in keywords}
 
-# Разбиваем текст на слова с сохранением порядка
-words = re.findall(r'\b\w+\b', text)
+    # Ищем индексы ключевых слов; слова текста уже в нижнем регистре
+    positions = [i for i, word in enumerate(words) if word in kw_lower]
 
-# Приводим ключевые слова к нижнему регистру для сравнения
-kw_lower = [word.lower() for word in kw]
+    # Разметка категориями делается один раз на весь текст
+    concordance = Concordance(words, word_annotations(words, word_category_map))
 
-# Ищем индексы ключевых слов и выводим контекст с выделением
-for i, word in enumerate(words):
-    word_lower = word.lower()
-    if word_lower in kw_lower:
-        # Определяем границы контекста
-        start = max(i - 12, 0)
-        end = min(i + 13, len(words))
-        # Получаем контекст
-        context = words[start:end]
-        # Обрабатываем каждое слово в контексте
-        highlighted_context = []
-        for j, context_word in enumerate(context):
-            context_word_lower = context_word.lower()
-            if j == i - start:
-                # Это ключевое слово - выделяем жирным
-                highlighted = f"{Back.YELLOW}{context_word}{Style.RESET_ALL}"
-            elif context_word_lower in word_color_map:
-                # Это слово из окружения - выделяем цветом
-                color = word_color_map[context_word_lower]
-                highlighted = f"{color}{context_word}{Style.RESET_ALL}"
-            else:
-                # Обычное слово
-                highlighted = context_word
-            highlighted_context.append(highlighted)
-        # Выводим контекст
-        print(' '.join(highlighted_context))
\ No newline at end of file
+    # Выводим контекст с выделением: ключевое слово на жёлтом фоне, слова окружения цветом категории
+    lines = [annotate_line(words, line) for line in concordance.lines(positions, context_words)]
+    render([Section(lines=lines)], [AnsiRenderer()])
+
+
+if __name__ == '__main__':
+    main()
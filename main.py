@@ -1,11 +1,16 @@
 import asyncio
-import json
 import logging
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence, Tuple
 
-import matplotlib.pyplot as plt
+from analysis.corpus import CorpusStore
+from analysis.lexicon import load_compiled
+from analysis.metrics import PROFILE_PATH, REPORT_PATH, metrics
+from analysis.pipeline import FusedPipeline, Match, Results, TokenAnalyzer
+from analysis.results import ResultCache
 
 # Настройка логирования
 logging.basicConfig(
@@ -15,7 +20,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-class EmotionAnalyzer:
+class EmotionAnalyzer(TokenAnalyzer):
     """
     Класс для анализа эмоций в текстах выступлений.
 
@@ -28,6 +33,10 @@ class EmotionAnalyzer:
     emotion_vocab: Dict[str, List[str]]
     context_keywords: List[str]
 
+    name = "emotions"
+
+    _pipeline: FusedPipeline
+
     def __init__(
             self,
             emotion_synonyms_path: Path,
@@ -48,60 +57,84 @@ class EmotionAnalyzer:
             "Moskau", "Russische Föderation", "Ukraine",
             "Krieg", "Auseinandersetzung"
         ]
+        self._pipeline = FusedPipeline([self])
         logger.info("EmotionAnalyzer инициализирован.")
 
     @staticmethod
     def _load_json(file_path: Path) -> Dict[str, List[str]]:
         """
-        Загружает JSON-файл.
+        Загружает JSON-файл (через кэш скомпилированных словарей).
 
         :param file_path: Путь к JSON-файлу.
         :return: Словарь с данными из файла.
         """
         try:
-            with file_path.open(encoding='utf-8') as f:
-                data = json.load(f)
+            data = load_compiled(file_path).data
             logger.info(f"Файл {file_path} успешно загружен.")
             return data
         except Exception as e:
             logger.error(f"Ошибка загрузки файла {file_path}: {e}")
             return {}
 
-    async def analyze_emotions_in_texts(self, texts: List[str]) -> Dict[str, Any]:
+    async def analyze_emotions_in_texts(self, texts: Iterable[str]) -> Dict[str, Any]:
         """
         Анализирует эмоции в предоставленных текстах.
 
-        :param texts: Список текстов выступлений.
+        :param texts: Тексты выступлений (список или итератор).
         :return: Результаты анализа.
         """
-        emotion_counts = Counter()
-        context_counts = Counter()
+        return await self.analyze_emotions_in_tokens(_tokenize_speeches(texts))
 
-        for text in texts:
-            words = text.split()
-            for index, word in enumerate(words):
-                for emotion, synonyms in self.emotion_synonyms.items():
-                    if word.lower() in map(str.lower, synonyms):
-                        emotion_counts[emotion] += 1
-                        # Проверка контекста
-                        start = max(index - 3, 0)
-                        end = min(index + 4, len(words))
-                        context = words[start:index] + words[index + 1:end]
-                        if any(
-                                kw.lower() in map(str.lower, context)
-                                for kw in self.context_keywords
-                        ):
-                            context_counts[emotion] += 1
-            await asyncio.sleep(0)  # Асинхронная совместимость
+    async def analyze_emotions_in_tokens(self, documents: Iterable[Sequence[str]]) -> Dict[str, Any]:
+        """
+        Анализирует эмоции в уже токенизированных текстах.
+
+        :param documents: Токены каждого выступления в нижнем регистре.
+        :return: Результаты анализа.
+        """
+        results = (await self._pipeline.arun(documents))[self.name]
 
         logger.info("Анализ эмоций завершен.")
         return {
-            "emotion_counts": dict(emotion_counts),
-            "context_counts": dict(context_counts)
+            "emotion_counts": dict(results["emotion_counts"]),
+            "context_counts": dict(results["context_counts"])
         }
 
+    def lexicons(self) -> Dict[str, Any]:
+        """
+        Словари для общего прохода: эмоции и ключевые слова контекста.
+
+        :return: Словари по именам.
+        """
+        return {"emotions": self.emotion_synonyms, "context": self.context_keywords}
 
-class ModalParticleAnalyzer:
+    def consume(self, words: Sequence[str], matches: Dict[str, List[Match]]) -> Dict[str, Counter]:
+        """
+        Считает эмоции в одном документе.
+
+        :param words: Токены документа в нижнем регистре.
+        :param matches: Вхождения эмоций и ключевых слов контекста.
+        :return: Счётчики эмоций и эмоций в контексте ключевых слов.
+        """
+        emotion_counts = Counter()
+        context_counts = Counter()
+
+        keyword_positions = {
+            index
+            for _, start, end in matches["context"]
+            for index in range(start, end)
+        }
+        for emotion, start, end in matches["emotions"]:
+            emotion_counts[emotion] += 1
+            # Проверка контекста: по три слова слева и справа от фразы
+            context = chain(range(max(start - 3, 0), start), range(end, min(end + 3, len(words))))
+            if any(index in keyword_positions for index in context):
+                context_counts[emotion] += 1
+
+        return {"emotion_counts": emotion_counts, "context_counts": context_counts}
+
+
+class ModalParticleAnalyzer(TokenAnalyzer):
     """
     Класс для анализа модальных частиц в текстах выступлений.
 
@@ -110,6 +143,10 @@ class ModalParticleAnalyzer:
 
     modal_particles: List[str]
 
+    name = "particles"
+
+    _pipeline: FusedPipeline
+
     def __init__(self, modal_particles_path: Path) -> None:
         """
         Инициализирует анализатор модальных частиц.
@@ -117,43 +154,65 @@ class ModalParticleAnalyzer:
         :param modal_particles_path: Путь к JSON-файлу с модальными частицами.
         """
         self.modal_particles = self._load_json(modal_particles_path)
+        self._pipeline = FusedPipeline([self])
         logger.info("ModalParticleAnalyzer инициализирован.")
 
     @staticmethod
     def _load_json(file_path: Path) -> List[str]:
         """
-        Загружает JSON-файл с модальными частицами.
+        Загружает JSON-файл с модальными частицами (через кэш
+        скомпилированных словарей).
 
         :param file_path: Путь к JSON-файлу.
         :return: Список модальных частиц.
         """
         try:
-            with file_path.open(encoding='utf-8') as f:
-                data = json.load(f)
+            data = load_compiled(file_path).data
             logger.info(f"Файл {file_path} успешно загружен.")
             return data
         except Exception as e:
             logger.error(f"Ошибка загрузки файла {file_path}: {e}")
             return []
 
-    async def analyze_particles_frequency(self, texts: List[str]) -> Counter:
+    async def analyze_particles_frequency(self, texts: Iterable[str]) -> Counter:
         """
         Анализирует частоту использования модальных частиц в текстах.
 
-        :param texts: Список текстов выступлений.
+        :param texts: Тексты выступлений (список или итератор).
         :return: Счётчик частотности модальных частиц.
         """
-        particle_counter = Counter()
-        for text in texts:
-            words = text.split()
-            for word in words:
-                if word.lower() in map(str.lower, self.modal_particles):
-                    particle_counter[word.lower()] += 1
-            await asyncio.sleep(0)  # Асинхронная совместимость
+        return await self.analyze_particles_in_tokens(_tokenize_speeches(texts))
+
+    async def analyze_particles_in_tokens(self, documents: Iterable[Sequence[str]]) -> Counter:
+        """
+        Анализирует частоту модальных частиц в уже токенизированных текстах.
+
+        :param documents: Токены каждого выступления в нижнем регистре.
+        :return: Счётчик частотности модальных частиц.
+        """
+        particle_counter = (await self._pipeline.arun(documents))[self.name]["particle_counts"]
 
         logger.info("Анализ модальных частиц завершен.")
         return particle_counter
 
+    def lexicons(self) -> Dict[str, Any]:
+        """
+        Словари для общего прохода: модальные частицы.
+
+        :return: Словари по именам.
+        """
+        return {"particles": self.modal_particles}
+
+    def consume(self, words: Sequence[str], matches: Dict[str, List[Match]]) -> Dict[str, Counter]:
+        """
+        Считает модальные частицы в одном документе.
+
+        :param words: Токены документа в нижнем регистре.
+        :param matches: Вхождения модальных частиц.
+        :return: Счётчик модальных частиц.
+        """
+        return {"particle_counts": Counter(particle for particle, _, _ in matches["particles"])}
+
 
 class SpeechAnalyzer:
     """
@@ -161,19 +220,28 @@ class SpeechAnalyzer:
 
     :val emotion_analyzer: Экземпляр EmotionAnalyzer.
     :val particle_analyzer: Экземпляр ModalParticleAnalyzer.
-    :val speeches: Список текстов выступлений.
+    :val speeches: Список текстов выступлений (пуст в потоковом режиме).
+    :val corpus: Токенизированный корпус, если анализ идёт по хранилищу.
+    :val pipeline: Общий проход для всех анализаторов.
+    :val cache: Кэш результатов анализа или None.
     """
 
     emotion_analyzer: EmotionAnalyzer
     particle_analyzer: ModalParticleAnalyzer
     speeches: List[str]
+    corpus: Optional[CorpusStore]
+    pipeline: FusedPipeline
+    cache: Optional[ResultCache]
 
     def __init__(
             self,
             speeches_path: Path,
             emotion_synonyms_path: Path,
             emotion_vocab_path: Path,
-            modal_particles_path: Path
+            modal_particles_path: Path,
+            corpus_path: Optional[Path] = None,
+            stream: bool = False,
+            cache: Optional[ResultCache] = None
     ) -> None:
         """
         Инициализирует анализатор выступлений.
@@ -182,13 +250,29 @@ class SpeechAnalyzer:
         :param emotion_synonyms_path: Путь к JSON-файлу с синонимами эмоций.
         :param emotion_vocab_path: Путь к JSON-файлу с вокабуляром эмоций.
         :param modal_particles_path: Путь к JSON-файлу с модальными частицами.
+        :param corpus_path: Каталог хранилища корпуса (analysis.corpus).
+            Если указан, документы файла speeches_path берутся из хранилища
+            без загрузки и токенизации текста.
+        :param stream: Не загружать файл целиком, а читать выступления
+            по одному при каждом проходе анализа.
+        :param cache: Кэш результатов. Повторный анализ тех же выступлений
+            с теми же словарями и анализаторами берётся из него.
         """
-        self.speeches = self._load_speeches(speeches_path)
+        self._source = speeches_path.name
+        self.cache = cache
+        self._speeches_path = speeches_path
+        self._stream = stream and corpus_path is None
+        self.corpus = CorpusStore(corpus_path) if corpus_path is not None else None
+        if self.corpus is not None or self._stream:
+            self.speeches = []
+        else:
+            self.speeches = self._load_speeches(speeches_path)
         self.emotion_analyzer = EmotionAnalyzer(
             emotion_synonyms_path,
             emotion_vocab_path
         )
         self.particle_analyzer = ModalParticleAnalyzer(modal_particles_path)
+        self.pipeline = FusedPipeline([self.emotion_analyzer, self.particle_analyzer])
         logger.info("SpeechAnalyzer инициализирован.")
 
     @staticmethod
@@ -196,29 +280,193 @@ class SpeechAnalyzer:
         """
         Загружает тексты выступлений из файла.
 
+        В bt.txt одна страница на строку, поэтому выступление — строка
+        файла, как и документ хранилища корпуса (analysis.corpus).
+
         :param file_path: Путь к файлу с текстами.
         :return: Список текстов.
         """
         try:
             with file_path.open(encoding='utf-8') as f:
-                texts = f.read().split('\n\n')  # Предполагается разделение абзацами
+                texts = list(f)
             logger.info(f"Файл {file_path} успешно загружен.")
             return texts
         except Exception as e:
             logger.error(f"Ошибка загрузки файла {file_path}: {e}")
             return []
 
-    async def run_analysis(self) -> None:
+    @staticmethod
+    def _stream_speeches(file_path: Path) -> Iterator[str]:
+        """
+        Читает тексты выступлений из файла по одному.
+
+        Разбиение совпадает с :meth:`_load_speeches` (выступление — строка
+        файла), но в памяти держится только текущая строка.
+
+        :param file_path: Путь к файлу с текстами.
+        :return: Итератор текстов.
+        """
+        try:
+            with file_path.open(encoding='utf-8') as f:
+                yield from f
+        except Exception as e:
+            logger.error(f"Ошибка загрузки файла {file_path}: {e}")
+
+    def iter_speeches(self) -> Iterator[str]:
+        """
+        Перебирает тексты выступлений: из памяти или потоком из файла.
+
+        :return: Итератор текстов.
+        """
+        if self._stream:
+            return self._stream_speeches(self._speeches_path)
+        return iter(self.speeches)
+
+    async def run_analysis(self, workers: int = 1, chunk_size: Optional[int] = None) -> None:
         """
         Запускает весь процесс анализа.
 
+        :param workers: Число процессов; при значении больше 1 выступления
+            делятся на части и анализируются параллельно.
+        :param chunk_size: Число выступлений в одной части.
+        :return: None
+        """
+        emotion_results, particle_counts = await self.analyze(workers, chunk_size)
+
+        with metrics.stage('report'):
+            self._generate_emotion_report(emotion_results)
+            self._generate_particle_graph(particle_counts)
+
+    def register_analyzer(self, analyzer: TokenAnalyzer) -> None:
+        """
+        Подключает дополнительный анализатор к общему проходу.
+
+        :param analyzer: Анализатор.
         :return: None
         """
-        emotion_results = await self.emotion_analyzer.analyze_emotions_in_texts(self.speeches)
-        particle_counts = await self.particle_analyzer.analyze_particles_frequency(self.speeches)
+        self.pipeline.register(analyzer)
+
+    async def analyze(self, workers: int = 1, chunk_size: Optional[int] = None) -> Tuple[Dict[str, Any], Counter]:
+        """
+        Считает эмоции и модальные частицы без построения отчётов.
+
+        :param workers: Число процессов.
+        :param chunk_size: Число выступлений в одной части.
+        :return: Результаты анализа эмоций и счётчик модальных частиц.
+        """
+        results = await self.analyze_all(workers, chunk_size)
+        emotions = results[self.emotion_analyzer.name]
+        return {
+            "emotion_counts": dict(emotions["emotion_counts"]),
+            "context_counts": dict(emotions["context_counts"])
+        }, results[self.particle_analyzer.name]["particle_counts"]
+
+    async def analyze_all(self, workers: int = 1, chunk_size: Optional[int] = None) -> Results:
+        """
+        Прогоняет выступления через все подключённые анализаторы.
+
+        Каждое выступление токенизируется один раз, и все анализаторы
+        получают его вхождения из одного прохода по токенам.
+
+        :param workers: Число процессов; при значении больше 1 выступления
+            делятся на части и анализируются параллельно.
+        :param chunk_size: Число выступлений в одной части.
+        :return: Счётчики по анализаторам.
+        """
+        key = self._cache_key()
+        if key is not None:
+            results = self.cache.get(key)
+            if results is not None:
+                logger.info("Результаты анализа взяты из кэша.")
+                return results
+
+        if workers > 1:
+            results = await self._analyze_parallel(workers, chunk_size)
+        else:
+            if self.corpus is not None:
+                documents = self.corpus.iter_words(self._source)
+            else:
+                documents = _tokenize_speeches(self.iter_speeches())
+            results = await self.pipeline.arun(documents)
+            logger.info("Анализ завершен.")
+
+        if key is not None:
+            self.cache.put(key, results)
+        return results
+
+    def _cache_key(self) -> Optional[str]:
+        """
+        Ключ кэша результатов: содержимое выступлений (файл или хранилище
+        корпуса и источник), хэш словарей общего автомата (в том числе
+        ключевых слов контекста) и состав анализаторов. Число процессов и
+        размер частей на результат не влияют и в ключ не входят.
+
+        :return: Ключ или None, если кэш не задан или файл недоступен.
+        """
+        if self.cache is None or self.pipeline.matcher.digest is None:
+            return None
+        speeches = [self.corpus.files, self._source] if self.corpus is not None else self._speeches_path
+        analyzers = [(name, type(analyzer).__qualname__) for name, analyzer in self.pipeline.analyzers.items()]
+        try:
+            return self.cache.key('speeches', speeches, self.pipeline.matcher.digest, analyzers)
+        except OSError as e:
+            logger.error(f"Не удалось построить ключ кэша результатов: {e}")
+            return None
+
+    async def _analyze_parallel(self, workers: int, chunk_size: Optional[int]) -> Results:
+        """
+        Анализирует части выступлений в пуле процессов и объединяет счётчики.
 
-        self._generate_emotion_report(emotion_results)
-        self._generate_particle_graph(particle_counts)
+        Конвейер анализаторов передаётся каждому процессу один раз при
+        запуске. При работе с хранилищем процессам передаются только номера
+        документов, а токены они читают из того же mmap. В потоковом режиме
+        части формируются по мере чтения файла.
+
+        :param workers: Число процессов.
+        :param chunk_size: Число выступлений в одной части.
+        :return: Счётчики по анализаторам.
+        """
+        if self.corpus is not None:
+            items = self.corpus.doc_ids(self._source)
+            corpus_path = self.corpus.path
+        else:
+            items = self.iter_speeches() if self._stream else self.speeches
+            corpus_path = None
+
+        if chunk_size is None:
+            chunk_size = 64 if self._stream else max(1, -(-len(items) // (workers * 4)))
+
+        results = self.pipeline.empty_results()
+
+        def merge(done: Iterable[asyncio.Future]) -> None:
+            for future in done:
+                partial, worker_metrics = future.result()
+                FusedPipeline.merge(results, partial)
+                metrics.merge(worker_metrics)
+
+        # Одновременно в работе не больше 2 * workers частей, поэтому в
+        # потоковом режиме память ограничена размером частей, а не корпуса
+        loop = asyncio.get_running_loop()
+        pending = set()
+        chunks = 0
+        with ProcessPoolExecutor(
+                workers,
+                initializer=_init_worker,
+                initargs=(self.pipeline, corpus_path, metrics.enabled)
+        ) as pool:
+            iterator = iter(items)
+            while chunk := list(islice(iterator, chunk_size)):
+                pending.add(loop.run_in_executor(pool, _analyze_chunk, chunk))
+                chunks += 1
+                if len(pending) >= workers * 2:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    merge(done)
+            if pending:
+                done, _ = await asyncio.wait(pending)
+                merge(done)
+
+        logger.info(f"Параллельный анализ завершен: {chunks} частей, {workers} процессов.")
+        return results
 
     def _generate_emotion_report(self, results: Dict[str, Any]) -> None:
         """
@@ -238,6 +486,9 @@ class SpeechAnalyzer:
         :param particle_counts: Счётчик частотности модальных частиц.
         :return: None
         """
+        # matplotlib нужен только для графика, поэтому импортируется здесь
+        import matplotlib.pyplot as plt
+
         particles, counts = zip(*particle_counts.items())
         plt.figure(figsize=(10, 6))
         plt.bar(particles, counts, color='skyblue')
@@ -251,6 +502,55 @@ class SpeechAnalyzer:
         logger.info("График частотности модальных частиц сохранен как 'modal_particles_frequency.png'.")
 
 
+def _tokenize_speeches(texts: Iterable[str]) -> Iterator[List[str]]:
+    """
+    Токенизирует выступления так же, как анализаторы текстов.
+
+    :param texts: Тексты выступлений.
+    :return: Итератор списков токенов в нижнем регистре.
+    """
+    for text in texts:
+        with metrics.stage('tokenize'):
+            words = [word.lower() for word in text.split()]
+        yield words
+
+
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_worker(pipeline: FusedPipeline, corpus_path: Optional[Path], collect_metrics: bool = False) -> None:
+    """
+    Сохраняет конвейер анализаторов в процессе пула.
+
+    :param pipeline: Конвейер анализаторов.
+    :param corpus_path: Каталог хранилища корпуса или None.
+    :param collect_metrics: Собирать замеры этапов в процессе.
+    :return: None
+    """
+    logging.getLogger().setLevel(logging.WARNING)
+    if collect_metrics:
+        metrics.enable()
+    _worker_state['pipeline'] = pipeline
+    _worker_state['corpus'] = CorpusStore(corpus_path) if corpus_path is not None else None
+
+
+def _analyze_chunk(chunk: List[Any]) -> Tuple[Results, Optional[Dict[str, Any]]]:
+    """
+    Анализирует одну часть выступлений в процессе пула.
+
+    :param chunk: Тексты выступлений или номера документов хранилища.
+    :return: Частичные счётчики по анализаторам и замеры процесса
+        (None, если сбор выключен).
+    """
+    corpus = _worker_state['corpus']
+    if corpus is not None:
+        documents = (corpus.words(doc_id) for doc_id in chunk)
+    else:
+        documents = _tokenize_speeches(chunk)
+    results = _worker_state['pipeline'].run(documents)
+    return results, metrics.snapshot() if metrics.enabled else None
+
+
 async def main() -> None:
     """
     Главная асинхронная функция для запуска анализа.
@@ -261,9 +561,13 @@ async def main() -> None:
         speeches_path=Path(r'C:\Users\Client\Desktop\Влад\Send_message\am\pars\pages\bt.txt'),
         emotion_synonyms_path=Path('es.json'),
         emotion_vocab_path=Path('ev.json'),
-        modal_particles_path=Path('mp.json')
+        modal_particles_path=Path('mp.json'),
+        cache=ResultCache()
     )
-    await analyzer.run_analysis()
+    with metrics.profile(PROFILE_PATH):
+        await analyzer.run_analysis()
+    if metrics.enabled:
+        metrics.write(REPORT_PATH)
 
 
 if __name__ == "__main__":
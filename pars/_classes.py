@@ -2,6 +2,7 @@
 Абстрактные классы.
 """
 import abc
+from typing import Optional
 
 import requests
 from bs4 import BeautifulSoup
@@ -76,3 +77,30 @@ class Page(abc.ABC):
 
         :return: Строковое представление объекта
         """
+
+
+class ResponseCache(abc.ABC):
+    """
+    Абстрактный кэш сырых HTML-ответов
+    """
+
+    @abc.abstractmethod
+    def get(self, url: str) -> Optional[str]:
+        """
+        Возвращает сохранённый HTML страницы
+
+        :param url: Ссылка на страницу
+        :return: HTML или None, если страницы нет в кэше
+        """
+
+    @abc.abstractmethod
+    def put(self, url: str, html: str) -> None:
+        """
+        Сохраняет HTML страницы
+
+        :param url: Ссылка на страницу
+        :param html: HTML страницы
+        """
+
+    def __contains__(self, url: str) -> bool:
+        return self.get(url) is not None
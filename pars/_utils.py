@@ -1,8 +1,9 @@
 import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
 
 import unicodedata
-from nltk import word_tokenize, WordNetLemmatizer
-from nltk.corpus import stopwords
 
 
 # nltk.download('punkt')
@@ -30,35 +31,106 @@ my_stopwords = [
     'pdf', 'kb', 'dr'
 ]
 
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_DIGITS_RE = re.compile(r'\d+')
+_SPACES_RE = re.compile(r'\s+')
 
-def semantic_cleaning(text):
-    # Токенизация текста
-    words = word_tokenize(text)
 
-    # Удаление стоп-слов
-    stop_words = set(stopwords.words('english') + stopwords.words('german') + my_stopwords)
-    words = [word for word in words if word.lower() not in stop_words]
+class CleaningPipeline:
+    """
+    Переиспользуемый конвейер очистки текста.
 
-    # Лемматизация слов
-    lemmatizer = WordNetLemmatizer()
-    words = [lemmatizer.lemmatize(word) for word in words]
+    Набор стоп-слов и лемматизатор создаются один раз, леммы запоминаются
+    по словоформе (ограниченный LRU-кэш), а пакет документов можно
+    распределить по процессам.
+    """
 
-    # Соединение слов обратно в текст
-    cleaned_text = ' '.join(words)
-    return cleaned_text
+    def __init__(self, extra_stopwords=tuple(my_stopwords), cache_size=1 << 16):
+        # nltk нужен только строгой очистке и импортируется при создании конвейера
+        from nltk import word_tokenize, WordNetLemmatizer
+        from nltk.corpus import stopwords
 
+        self.extra_stopwords = tuple(extra_stopwords)
+        self.cache_size = cache_size
+        self.word_tokenize = word_tokenize
+        self.stop_words = set(stopwords.words('english') + stopwords.words('german') + list(self.extra_stopwords))
+        self.lemmatize = lru_cache(maxsize=cache_size)(WordNetLemmatizer().lemmatize)
 
-def clean_text(text, strict=False):
+    def semantic_cleaning(self, text):
+        # Токенизация текста
+        words = self.word_tokenize(text)
+
+        # Удаление стоп-слов
+        stop_words = self.stop_words
+        words = [word for word in words if word.lower() not in stop_words]
+
+        # Лемматизация слов (с кэшем по словоформе)
+        lemmatize = self.lemmatize
+        words = [lemmatize(word) for word in words]
+
+        # Соединение слов обратно в текст
+        return ' '.join(words)
+
+    def clean_text(self, text, strict=False):
+        return _clean_text(text, self.semantic_cleaning if strict else None)
+
+    def clean_batch(self, texts, strict=False, workers=0, chunksize=8):
+        """
+        Очищает пакет документов
+
+        :param texts: Тексты
+        :param strict: Строгая очистка (как clean_text(strict=True))
+        :param workers: Число процессов; 0 или 1 — в текущем процессе
+        :param chunksize: Сколько документов передавать процессу за раз
+        :return: Очищенные тексты в исходном порядке
+        """
+        if workers <= 1:
+            return [self.clean_text(text, strict) for text in texts]
+
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(self.extra_stopwords, self.cache_size)) as pool:
+            return list(pool.map(_clean_in_worker, texts, repeat(strict), chunksize=chunksize))
+
+
+_worker_pipeline = None
+
+
+def _init_worker(extra_stopwords, cache_size):
+    global _worker_pipeline
+    _worker_pipeline = CleaningPipeline(extra_stopwords, cache_size)
+
+
+def _clean_in_worker(text, strict):
+    return _worker_pipeline.clean_text(text, strict)
+
+
+@lru_cache(maxsize=None)
+def get_pipeline() -> CleaningPipeline:
+    """
+    Общий конвейер очистки, создаётся при первом обращении
+    """
+    return CleaningPipeline()
+
+
+def semantic_cleaning(text):
+    return get_pipeline().semantic_cleaning(text)
+
+
+def _clean_text(text, semantic=None):
     # Удаление всех неразрывных пробелов
     text = text.replace('\xa0', ' ')
     # Нормализация текста для удаления специальных символов
     text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('utf-8')
     # Замена всех странных спецсимволов
-    if strict:
-        text = re.sub(r'[^\w\s]', '', text)
+    if semantic is not None:
+        text = _PUNCT_RE.sub('', text)
         text = text.lower()
-        text = semantic_cleaning(text)
-        text = re.sub(r'\d+', ' ', text).strip()
+        text = semantic(text)
+        text = _DIGITS_RE.sub(' ', text).strip()
 
     # Удаление лишних пробелов
-    return re.sub(r'\s+', ' ', text).strip()
+    return _SPACES_RE.sub(' ', text).strip()
+
+
+def clean_text(text, strict=False):
+    return _clean_text(text, semantic_cleaning if strict else None)
@@ -1,35 +1,85 @@
 from datetime import datetime
+from functools import cached_property
 from pprint import pprint
 
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
-from pars._classes import Page
+from analysis.metrics import metrics
+from pars._classes import Page, ResponseCache
 from pars._utils import parse_relative_url, clean_text
 from pars.schemas import PageSchema, LinkSchema
 
+try:
+    import lxml  # noqa: F401
+    FAST_PARSER = 'lxml'
+except ImportError:
+    FAST_PARSER = 'html.parser'
+
+
+def parse_article(html: str, fast: bool = True) -> BeautifulSoup:
+    """
+    Разбирает HTML страницы и возвращает тег <article> (или всю страницу,
+    если его нет)
+
+    :param html: HTML страницы
+    :param fast: Разбирать только поддерево <article> парсером lxml, если он
+        установлен. Полный разбор выполняется, только если <article> не найден
+    :return: Дерево статьи
+    """
+    if fast:
+        article = BeautifulSoup(html, FAST_PARSER, parse_only=SoupStrainer('article')).find('article')
+        if article is not None:
+            return article
+
+    soup = BeautifulSoup(html, 'html.parser')
+    return soup.find('article') or soup
+
 
 class BtPage(Page):
     """
     Класс для парсинга страницы Bundestag
     """
 
-    def __init__(self, url, date: datetime=None):
+    def __init__(self, url, date: datetime=None, session: requests.Session = None, timeout: float = 5,
+                 response: requests.Response = None, cache: ResponseCache = None, offline: bool = False,
+                 fast: bool = True):
         self._url = url
-        self._response = requests.get(url, timeout=5)
+        self._response = response
         self._date = date
-        if self._response.status_code != 200:
-            raise ValueError(f'Unable to fetch page {self.url}: {self._response.status_code}')
 
-        self._soup = BeautifulSoup(self._response.text, 'html.parser')
-
-        self._soup = self._soup.find('article') or self._soup
+        # Уже полученный ответ свежее кэша, поэтому кэш читается только без него
+        html = cache.get(url) if cache is not None and response is None else None
+        if cache is not None and response is None:
+            metrics.hit('cache', html is not None)
+        if html is None:
+            if offline:
+                raise ValueError(f'Page {self.url} is not cached')
+            if self._response is None:
+                with metrics.stage('fetch'):
+                    self._response = (session or requests).get(url, timeout=timeout)
+            if self._response.status_code != 200:
+                raise ValueError(f'Unable to fetch page {self.url}: {self._response.status_code}')
+            html = self._response.text
+            if cache is not None:
+                cache.put(url, html)
+
+        # Разбор откладывается до первого обращения к дереву
+        self._html = html
+        self._fast = fast
 
         self.parse()
 
     def parse(self) -> None:
         pass
 
+    @cached_property
+    def _soup(self) -> BeautifulSoup:
+        with metrics.stage('parse'):
+            soup = parse_article(self._html, self._fast)
+        self._html = None
+        return soup
+
     @property
     def date(self):
         return self._date
@@ -42,26 +92,27 @@ class BtPage(Page):
     def url(self):
         return self._url
 
-    @property
+    @cached_property
     def links(self):
         return [LinkSchema(
             url=parse_relative_url(link.get('href'), self.url),
             title=link.get_text(strip=True) or None
         ) for link in self._soup.find_all('a')]
 
-    @property
+    @cached_property
     def images(self) -> list[LinkSchema]:
         return [LinkSchema(
             url=parse_relative_url(image['src'], self.url),
             title=image.get('alt')
         ) for image in self._soup.find_all('img')]
 
-    @property
+    @cached_property
     def plain_text(self) -> str:
         text = self._soup.get_text(strip=True, separator=' ')
-        return clean_text(text, strict=True)
+        with metrics.stage('clean'):
+            return clean_text(text, strict=True)
 
-    @property
+    @cached_property
     def title(self) -> str:
         try:
             return self._soup.find('h1').get_text(strip=True)
@@ -73,6 +124,7 @@ class BtPage(Page):
         return hash(self.url)
 
     def get_data(self) -> PageSchema:
+        metrics.count('pages')
         ps = PageSchema(url=self.url, text=self.plain_text,
                         links=self.links, images=self.images,
                         title=self.title, date=self._date)
@@ -0,0 +1,110 @@
+"""
+Кэш сырых ответов на диске.
+"""
+import hashlib
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Optional
+
+from pars._classes import ResponseCache
+
+
+class DiskCache(ResponseCache):
+    """
+    Кэш HTML-страниц на диске со сжатием и вытеснением по размеру.
+
+    Ключ записи — SHA-256 ссылки, записи лежат в подкаталогах по первым двум
+    символам ключа (``ab/abcdef….html.z``). Когда суммарный размер превышает
+    ``max_bytes``, удаляются записи, к которым дольше всего не обращались.
+    """
+
+    SUFFIX = '.html.z'
+
+    def __init__(self, path: Path = Path('pages/cache'), max_bytes: int = 1 << 30, level: int = 6):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.level = level
+        self._lock = threading.Lock()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._size = sum(file.stat().st_size for file in self._files())
+
+    def _files(self):
+        return self.path.glob(f'*/*{self.SUFFIX}')
+
+    def _file(self, url: str) -> Path:
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return self.path / key[:2] / f'{key}{self.SUFFIX}'
+
+    @property
+    def size(self) -> int:
+        """
+        Суммарный размер записей в байтах
+        """
+        return self._size
+
+    def get(self, url: str) -> Optional[str]:
+        file = self._file(url)
+        try:
+            data = file.read_bytes()
+        except FileNotFoundError:
+            return None
+        # Время изменения служит меткой последнего обращения для вытеснения
+        os.utime(file)
+        return zlib.decompress(data).decode('utf-8')
+
+    def __contains__(self, url: str) -> bool:
+        # Проверка без чтения и распаковки записи
+        return self._file(url).exists()
+
+    def put(self, url: str, html: str) -> None:
+        file = self._file(url)
+        data = zlib.compress(html.encode('utf-8'), self.level)
+        file.parent.mkdir(exist_ok=True)
+        # Своё имя у каждого писателя: одну ссылку могут сохранять сразу
+        # несколько потоков обходчика
+        tmp_file = file.with_name(f'{file.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        tmp_file.write_bytes(data)
+        with self._lock:
+            old_size = file.stat().st_size if file.exists() else 0
+            os.replace(tmp_file, file)
+            self._size += len(data) - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """
+        Удаляет самые старые записи, пока размер кэша не станет меньше лимита
+        """
+        files = sorted(((file.stat().st_mtime, file) for file in self._files()), key=lambda item: item[0])
+        for _, file in files:
+            if self._size <= self.max_bytes:
+                break
+            size = file.stat().st_size
+            file.unlink(missing_ok=True)
+            self._size -= size
+
+    def clear(self) -> None:
+        """
+        Удаляет все записи
+        """
+        with self._lock:
+            for file in self._files():
+                file.unlink(missing_ok=True)
+            self._size = 0
+
+
+class MemoryCache(ResponseCache):
+    """
+    Кэш HTML-страниц в памяти (для тестов, замеров и разовых прогонов).
+    """
+
+    def __init__(self, pages: Optional[dict[str, str]] = None):
+        self.pages = dict(pages or {})
+
+    def get(self, url: str) -> Optional[str]:
+        return self.pages.get(url)
+
+    def put(self, url: str, html: str) -> None:
+        self.pages[url] = html
@@ -0,0 +1,354 @@
+"""
+Колоночное хранение страниц.
+
+Вместо отдельного JSON на страницу каждая колонка (id, url, title, date,
+author, text, links, images) хранится в двух файлах каталога: ``<колонка>.dat`` —
+значения в UTF-8 подряд, ``<колонка>.idx`` — смещения концов значений
+(int64). Ссылки и изображения лежат в своих колонках (JSON-список на
+строку), поэтому чтение текста их не затрагивает. Файлы отображаются в
+память, и открытие корпуса не зависит от числа страниц.
+
+Запись только дописывает строки в конец; при обновлении страницы новая
+строка дописывается, а :func:`compact` оставляет последнюю строку по
+каждой ссылке. Писать в каталог с JSON-страницами следует через
+:func:`open_writer`: он сначала переводит их в колонки, иначе после
+появления columns.json они перестанут читаться.
+
+Запуск: ``python -m pars.columns [каталог]`` — переводит JSON-страницы
+каталога (по умолчанию pars/pages/bt) в колонки.
+"""
+import json
+import mmap
+import os
+import sys
+from array import array
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Optional, Sequence
+
+if TYPE_CHECKING:
+    # pydantic нужен только при записи страниц, чтение корпуса его не импортирует
+    from pars.schemas import PageSchema
+
+META_FILE = 'columns.json'
+COLUMNS = ('id', 'url', 'title', 'date', 'author', 'text', 'links', 'images')
+JSON_COLUMNS = ('links', 'images')
+VERSION = 1
+
+# Отсутствующее значение (None) хранится одним нулевым байтом
+_NULL = b'\x00'
+
+
+def is_columnar(path: Path) -> bool:
+    """
+    Проверяет, лежит ли в каталоге колоночный корпус.
+    """
+    return (Path(path) / META_FILE).exists()
+
+
+def _encode(name: str, value: Any) -> bytes:
+    if value is None:
+        return _NULL
+    if name in JSON_COLUMNS:
+        value = json.dumps(value, ensure_ascii=False)
+    return str(value).encode('utf-8')
+
+
+class StringColumn(Sequence):
+    """
+    Колонка строк, отображённая в память. Значения декодируются при
+    обращении.
+    """
+
+    def __init__(self, data: Optional[mmap.mmap], ends: memoryview, length: int):
+        self._data = data
+        self._ends = ends
+        self._length = length
+
+    def __len__(self) -> int:
+        return self._length
+
+    def raw(self, index: int) -> bytes:
+        """
+        Значение строки без декодирования.
+        """
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        start = self._ends[index - 1] if index else 0
+        return self._data[start:self._ends[index]]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        value = self.raw(index)
+        return None if value == _NULL else value.decode('utf-8')
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        data, ends = self._data, self._ends
+        start = 0
+        for i in range(self._length):
+            end = ends[i]
+            value = data[start:end]
+            yield None if value == _NULL else value.decode('utf-8')
+            start = end
+
+
+class ColumnarCorpus:
+    """
+    Колоночный корпус страниц. Отображаются только запрошенные колонки.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with (self.path / META_FILE).open(encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.columns = tuple(self.meta['columns'])
+        # Строка считается записанной, когда записаны все её колонки
+        self._length = min((self.path / f'{name}.idx').stat().st_size // 8 for name in self.columns)
+        self._open: dict[str, StringColumn] = {}
+        self._maps: list[mmap.mmap] = []
+
+    def __len__(self) -> int:
+        return self._length
+
+    def _map(self, file_path: Path) -> Optional[mmap.mmap]:
+        with file_path.open('rb') as f:
+            if not f.seek(0, 2):
+                return None
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mm)
+        return mm
+
+    def column(self, name: str) -> StringColumn:
+        """
+        Возвращает колонку, при первом обращении отображает её файлы.
+
+        :param name: Имя колонки.
+        :return: Колонка.
+        """
+        if name not in self._open:
+            if name not in self.columns:
+                raise KeyError(f'Unknown column {name!r}')
+            ends_map = self._map(self.path / f'{name}.idx')
+            ends = memoryview(ends_map).cast('q') if ends_map is not None else memoryview(array('q'))
+            self._open[name] = StringColumn(self._map(self.path / f'{name}.dat'), ends, self._length)
+        return self._open[name]
+
+    def __getitem__(self, name: str) -> StringColumn:
+        return self.column(name)
+
+    def rows(self, *names: str) -> Iterator[tuple]:
+        """
+        Перебирает строки корпуса, читая только указанные колонки.
+        Колонки links и images возвращаются списками.
+
+        :param names: Имена колонок.
+        :return: Итератор кортежей значений.
+        """
+        columns = [self.column(name) for name in names]
+        decoders = [name in JSON_COLUMNS for name in names]
+        for values in zip(*columns):
+            yield tuple(json.loads(value) if decode and value is not None else value
+                        for value, decode in zip(values, decoders))
+
+    def records(self, *names: str) -> Iterator[dict[str, Any]]:
+        """
+        То же, что :meth:`rows`, но строки возвращаются словарями.
+        """
+        names = names or self.columns
+        for values in self.rows(*names):
+            yield dict(zip(names, values))
+
+    def close(self) -> None:
+        for column in self._open.values():
+            column._ends.release()
+        self._open.clear()
+        for mm in self._maps:
+            mm.close()
+        self._maps.clear()
+
+    def __enter__(self) -> 'ColumnarCorpus':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ColumnWriter:
+    """
+    Дописывает строки в колоночный корпус.
+    """
+
+    def __init__(self, path: Path, truncate: bool = False):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        if not truncate and is_columnar(self.path):
+            self._upgrade()
+            self._repair()
+        mode = 'wb' if truncate else 'ab'
+        self._data = {name: (self.path / f'{name}.dat').open(mode) for name in COLUMNS}
+        self._ends = {name: (self.path / f'{name}.idx').open(mode) for name in COLUMNS}
+        self._sizes = {name: f.tell() for name, f in self._data.items()}
+        if truncate or not is_columnar(self.path):
+            with (self.path / META_FILE).open('w', encoding='utf-8') as f:
+                json.dump({'version': VERSION, 'columns': list(COLUMNS)}, f)
+
+    def _upgrade(self) -> None:
+        # Корпус с другим набором колонок (записанный до появления author)
+        # переписывается, недостающие колонки заполняются None
+        with ColumnarCorpus(self.path) as corpus:
+            if corpus.columns == COLUMNS:
+                return
+            tmp, _ = _write_tmp(self.path, corpus.records())
+        _replace(tmp, self.path)
+
+    def _repair(self) -> None:
+        # Строка, записанная не во все колонки (прерванная запись),
+        # отбрасывается, чтобы колонки оставались выровненными
+        rows = min((self.path / f'{name}.idx').stat().st_size // 8 for name in COLUMNS)
+        for name in COLUMNS:
+            with (self.path / f'{name}.idx').open('r+b') as f:
+                f.truncate(rows * 8)
+                end = 0
+                if rows:
+                    f.seek((rows - 1) * 8)
+                    end = array('q', f.read(8))[0]
+            with (self.path / f'{name}.dat').open('r+b') as f:
+                f.truncate(end)
+
+    def append(self, row: dict[str, Any]) -> None:
+        """
+        Дописывает строку.
+
+        :param row: Значения по именам колонок; недостающие — None.
+        """
+        for name in COLUMNS:
+            value = _encode(name, row.get(name))
+            self._data[name].write(value)
+            self._sizes[name] += len(value)
+            self._ends[name].write(array('q', [self._sizes[name]]).tobytes())
+
+    def write_page(self, id_: str, data: 'PageSchema') -> None:
+        """
+        Дописывает страницу.
+
+        :param id_: Идентификатор видео, к которому относится страница.
+        :param data: Данные страницы.
+        """
+        row = data.model_dump()
+        row['id'] = id_
+        self.append(row)
+
+    def flush(self) -> None:
+        # Сначала данные, затем смещения: читатель не увидит строку без данных
+        for f in self._data.values():
+            f.flush()
+        for f in self._ends.values():
+            f.flush()
+
+    def close(self) -> None:
+        self.flush()
+        for f in (*self._data.values(), *self._ends.values()):
+            f.close()
+
+    def __enter__(self) -> 'ColumnWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _write_tmp(path: Path, rows: Iterable[dict[str, Any]]) -> tuple[Path, int]:
+    tmp = Path(path) / '.columns.tmp'
+    count = 0
+    with ColumnWriter(tmp, truncate=True) as writer:
+        for row in rows:
+            writer.append(row)
+            count += 1
+    return tmp, count
+
+
+def _replace(tmp: Path, path: Path) -> None:
+    for name in (*(f'{column}.{ext}' for column in COLUMNS for ext in ('dat', 'idx')), META_FILE):
+        os.replace(tmp / name, Path(path) / name)
+    tmp.rmdir()
+
+
+def write_columns(path: Path, rows: Iterable[dict[str, Any]]) -> int:
+    """
+    Переписывает корпус целиком. Колонки пишутся во временный каталог и
+    подменяют старые файлы после записи.
+
+    :param path: Каталог корпуса.
+    :param rows: Строки.
+    :return: Число строк.
+    """
+    tmp, count = _write_tmp(path, rows)
+    _replace(tmp, path)
+    return count
+
+
+def compact(path: Path) -> int:
+    """
+    Оставляет по одной строке на ссылку: значения берутся из последней
+    записи, а место в корпусе — от первой.
+
+    :param path: Каталог корпуса.
+    :return: Число строк после сжатия.
+    """
+    with ColumnarCorpus(path) as corpus:
+        latest = {}
+        for i, url in enumerate(corpus['url']):
+            latest[url] = i
+        if len(latest) == len(corpus):
+            return len(corpus)
+        names = [name for name in COLUMNS if name in corpus.columns]
+        columns = [corpus[name] for name in names]
+        rows = (
+            {name: json.loads(value) if name in JSON_COLUMNS and value is not None else value
+             for name, value in zip(names, (column[i] for column in columns))}
+            for i in latest.values()
+        )
+        tmp, count = _write_tmp(path, rows)
+    # Файлы подменяются после закрытия отображений
+    _replace(tmp, path)
+    return count
+
+
+def convert(pages_dir: Path) -> int:
+    """
+    Переводит JSON-страницы каталога в колонки того же каталога.
+
+    :param pages_dir: Каталог с файлами <id>.json.
+    :return: Число страниц.
+    """
+    def rows():
+        for file_path in sorted(Path(pages_dir).glob('*.json')):
+            if file_path.name == META_FILE:
+                continue
+            with file_path.open(encoding='utf-8') as f:
+                row = json.load(f)
+            row['id'] = file_path.stem
+            yield row
+    return write_columns(pages_dir, rows())
+
+
+def open_writer(pages_dir: Path, truncate: bool = False) -> ColumnWriter:
+    """
+    Открывает запись в колоночный корпус. Если в каталоге ещё лежат
+    JSON-страницы, они сначала переводятся в колонки (:func:`convert`).
+
+    :param pages_dir: Каталог корпуса.
+    :param truncate: Начать корпус заново.
+    :return: Открытая запись.
+    """
+    pages_dir = Path(pages_dir)
+    if not truncate and not is_columnar(pages_dir) and any(pages_dir.glob('*.json')):
+        convert(pages_dir)
+    return ColumnWriter(pages_dir, truncate=truncate)
+
+
+if __name__ == '__main__':
+    target = Path(sys.argv[1]) if len(sys.argv) > 1 else Path('pars/pages/bt')
+    print(f'{target}: {convert(target)} стр.')
@@ -0,0 +1,372 @@
+"""
+Параллельный обход медиатеки Bundestag.
+"""
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+
+import bs4
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from analysis.metrics import metrics
+from pars._classes import ResponseCache
+from pars.bundestag import BtPage
+from pars.columns import ColumnarCorpus, ColumnWriter, compact, is_columnar, open_writer
+from pars.manifest import CrawlManifest
+from pars.schemas import PageSchema
+
+logger = logging.getLogger(__name__)
+
+FILTER_PATH = ('/ajax/filterlist/de'
+               '/mediathek/536668-536668?documenttype=44235'
+               '4%23BTFaisSpeechRecord&limit=70&mediaCategor'
+               'y=442350%23Plenarsitzungen&noFilterSet=false&'
+               'offset={}&rednerIds=442354%239399%20OR%20750%20'
+               'OR%206861%20OR%206862%20OR%206598%20OR%203097%2'
+               '0OR%203096%20OR%208360')
+OVERLAY_PATH = '/mediathekoverlay?videoid={id_}&view=main&videoid={id_}'
+
+
+class RateLimiter:
+    """
+    Ограничивает частоту запросов к каждому хосту.
+    """
+
+    def __init__(self, per_second: float):
+        self._interval = 1 / per_second if per_second > 0 else 0
+        self._next: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str) -> None:
+        """
+        Блокирует поток, пока к хосту url нельзя обратиться.
+
+        :param url: Ссылка, по которой будет запрос.
+        """
+        if not self._interval:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+@dataclass
+class CrawlReport:
+    """
+    Итог обхода
+
+    :var saved: Идентификаторы сохранённых видео
+    :var unchanged: Идентификаторы видео, у которых ничего не изменилось
+    :var failed: Страницы списка (ссылки) и видео (идентификаторы), которые
+        не удалось получить, и причина
+    """
+
+    saved: list[str] = field(default_factory=list)
+    unchanged: list[str] = field(default_factory=list)
+    failed: dict[str, str] = field(default_factory=dict)
+
+
+class Crawler:
+    """
+    Обходчик медиатеки с пулом соединений, ограничением параллельности,
+    ограничением частоты запросов и повторами с экспоненциальной задержкой.
+
+    Ошибка на одной странице не прерывает обход: она попадает в
+    :class:`CrawlReport`, остальные страницы обрабатываются дальше.
+
+    С журналом (:class:`CrawlManifest`) обход инкрементальный: уже
+    обработанные видео пропускаются (или, при ``refresh=True``,
+    перепроверяются условными запросами), а сохраняются только новые
+    и изменившиеся страницы.
+
+    С кэшем (:class:`ResponseCache`) HTML статей сохраняется, и корпус можно
+    пересобрать без сети методом :meth:`reprocess`. В кэш попадают и
+    статьи, не изменившиеся с прошлого обхода, а уже обработанные видео,
+    статей которых нет в кэше (журнал вёлся без кэша), перепроверяются,
+    так что после одного обхода с кэшем в нём есть весь корпус.
+
+    Страницы дописываются в колоночный корпус (:mod:`pars.columns`) в
+    каталоге ``pages_dir / 'bt'``; JSON-страницы, оставшиеся там от прежних
+    обходов, переводятся в колонки при первой записи.
+    """
+
+    def __init__(self, base_url: str = 'https://www.bundestag.de', pages_dir: Path = Path('pages'),
+                 max_workers: int = 8, per_host_rate: float = 10.0, retries: int = 3,
+                 backoff: float = 0.5, timeout: float = 5, manifest: Optional[CrawlManifest] = None,
+                 refresh: bool = False, cache: Optional[ResponseCache] = None):
+        self.base_url = base_url.rstrip('/')
+        self.pages_dir = Path(pages_dir)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.manifest = manifest
+        self.refresh = refresh
+        self.cache = cache
+        self._text_stale = False
+        self._writer: Optional[ColumnWriter] = None
+        self._limiter = RateLimiter(per_host_rate)
+
+        retry = Retry(total=retries, backoff_factor=backoff,
+                      status_forcelist=(429, 500, 502, 503, 504), allowed_methods=('GET',))
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url: str, conditional: bool = False) -> requests.Response:
+        """
+        Выполняет GET-запрос через общий пул соединений.
+
+        :param url: Ссылка.
+        :param conditional: Отправить условный запрос по данным журнала.
+        :return: Ответ с кодом 200 (или 304 для условного запроса).
+        """
+        headers = self.manifest.conditional_headers(url) if conditional and self.manifest else None
+        self._limiter.wait(url)
+        with metrics.stage('fetch'):
+            response = self.session.get(url, timeout=self.timeout, headers=headers)
+        metrics.count('requests')
+        if response.status_code == 304:
+            metrics.count('not_modified')
+        if response.status_code not in ((200, 304) if headers else (200,)):
+            raise ValueError(f'Unable to fetch page {url}: {response.status_code}')
+        return response
+
+    def list_video_ids(self, offsets: Iterable[int], report: Optional[CrawlReport] = None) -> list[str]:
+        """
+        Собирает идентификаторы видео со страниц списка.
+
+        :param offsets: Смещения страниц списка.
+        :param report: Итог обхода, в который записываются страницы списка,
+            которые не удалось получить.
+        :return: Идентификаторы без повторов, в порядке появления.
+        """
+        ids = []
+        urls = [self.base_url + FILTER_PATH.format(offset) for offset in offsets]
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            futures = [pool.submit(self.get, url, True) for url in urls]
+            for url, future in zip(urls, futures):
+                try:
+                    response = future.result()
+                except Exception as e:
+                    logger.error(f'Не удалось получить список видео: {e}')
+                    if report is not None:
+                        report.failed[url] = str(e)
+                    continue
+                if response.status_code == 304:
+                    found = self.manifest.get(url)['ids']
+                else:
+                    found = re.findall(r'mediathek\?videoid=(\d+)', response.text)
+                if self.manifest:
+                    self.manifest.record(url, response, ids=found)
+                ids.extend(found)
+        return list(dict.fromkeys(ids))
+
+    def fetch_overlay(self, id_: str) -> tuple[Optional[str], list[str]]:
+        """
+        Загружает карточку видео.
+
+        :param id_: Идентификатор видео.
+        :return: Дата заседания и ссылки на статьи текстового архива.
+        """
+        url = self.base_url + OVERLAY_PATH.format(id_=id_)
+        response = self.get(url, conditional=True)
+        if response.status_code == 304:
+            entry = self.manifest.get(url)
+            return entry['date'], entry['links']
+
+        date = bs4.BeautifulSoup(response.text, 'html.parser').find('span', class_='bt-dachzeile')
+        date = date.get_text(strip=True) if date else None
+        links = re.findall(r'/dokumente/textarchiv[^"]+', response.text)
+        if self.manifest:
+            self.manifest.record(url, response, date=date, links=links)
+        return date, links
+
+    def fetch_video(self, id_: str) -> tuple[Optional[str], list[str], list[tuple[PageSchema, requests.Response]]]:
+        """
+        Загружает карточку видео и статьи, на которые она ссылается.
+
+        Статьи, не изменившиеся с прошлой загрузки (ответ 304 или тот же
+        хэш содержимого), не парсятся и не возвращаются, но сохраняются в
+        кэш, если их там нет. Остальные разбираются здесь же, в потоке
+        пула, чтобы ошибка разбора пропускала только это видео.
+
+        :param id_: Идентификатор видео.
+        :return: Дата, ссылки на статьи и данные новых или изменившихся
+            страниц вместе с ответами сервера.
+        """
+        date, links = self.fetch_overlay(id_)
+        pages = []
+        for link in links:
+            url = self.base_url + link
+            response = self.get(url, conditional=True)
+            if self.manifest and not self.manifest.is_changed(url, response):
+                self.manifest.record(url, response)
+                self._fill_cache(url, response)
+                continue
+            page = BtPage(url, response=response, cache=self.cache)
+            page.date = date
+            pages.append((page.get_data(), response))
+        return date, links, pages
+
+    def _fill_cache(self, url: str, response: requests.Response) -> None:
+        """
+        Сохраняет в кэш неизменившуюся статью, которой там нет. На ответ 304
+        тело не приходит, поэтому статья запрашивается заново без условий.
+
+        :param url: Ссылка на статью.
+        :param response: Ответ на условный запрос.
+        """
+        if self.cache is None or url in self.cache:
+            return
+        if response.status_code == 304:
+            response = self.get(url)
+        self.cache.put(url, response.text)
+        metrics.count('cache_backfill')
+
+    def _is_cached(self, id_: str) -> bool:
+        """
+        Проверяет, что все статьи обработанного видео есть в кэше.
+
+        :param id_: Идентификатор видео.
+        :return: True, если кэш не задан или статьи в нём.
+        """
+        if self.cache is None:
+            return True
+        return all(self.base_url + link in self.cache for link in self.manifest.videos[id_]['links'])
+
+    def save(self, id_: str, pages: list[PageSchema]) -> None:
+        """
+        Сохраняет страницы так же, как parsBT.main.
+
+        :param id_: Идентификатор видео.
+        :param pages: Данные страниц видео.
+        """
+        for data in pages:
+            self._write_page(id_, data)
+
+            if self.manifest and self.manifest.get(data.url):
+                # Текст изменившейся страницы уже есть в bt.txt — старая
+                # строка корпуса и файл будут пересобраны в конце обхода
+                self._text_stale = True
+                continue
+            with (self.pages_dir / 'bt.txt').open('a', encoding='utf-8') as f:
+                f.write(str(data.text) + '\n')
+
+    @property
+    def columns_dir(self) -> Path:
+        return self.pages_dir / 'bt'
+
+    def _write_page(self, id_: str, data: PageSchema, truncate: bool = False) -> None:
+        if self._writer is None:
+            self._writer = open_writer(self.columns_dir, truncate=truncate)
+        with metrics.stage('save'):
+            self._writer.write_page(id_, data)
+
+    def _close_writer(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def rebuild_text(self) -> None:
+        """
+        Пересобирает bt.txt из колонки текста.
+        """
+        self._close_writer()
+        with (self.pages_dir / 'bt.txt').open('w', encoding='utf-8') as out:
+            if not is_columnar(self.columns_dir):
+                return
+            with ColumnarCorpus(self.columns_dir) as corpus:
+                for text in corpus['text']:
+                    out.write(str(text) + '\n')
+
+    def crawl(self, offsets: Iterable[int] = range(0, 500, 70)) -> CrawlReport:
+        """
+        Обходит медиатеку. Загрузка идёт в пуле потоков, запись на диск —
+        в вызывающем потоке по мере готовности.
+
+        :param offsets: Смещения страниц списка.
+        :return: Итог обхода.
+        """
+        report = CrawlReport()
+        ids = self.list_video_ids(offsets, report)
+        if self.manifest and not self.refresh:
+            # Обработанные видео пропускаются, если их статьи уже в кэше
+            ids = [id_ for id_ in ids if not self.manifest.has_video(id_) or not self._is_cached(id_)]
+
+        try:
+            with ThreadPoolExecutor(self.max_workers) as pool:
+                futures = {pool.submit(self.fetch_video, id_): id_ for id_ in ids}
+                for done, future in enumerate(as_completed(futures), 1):
+                    id_ = futures[future]
+                    try:
+                        date, links, pages = future.result()
+                    except Exception as e:
+                        logger.error(f'Видео {id_} пропущено: {e}')
+                        report.failed[id_] = str(e)
+                        continue
+                    if pages:
+                        self.save(id_, [data for data, _ in pages])
+                        report.saved.append(id_)
+                    else:
+                        report.unchanged.append(id_)
+                    if self.manifest:
+                        for data, response in pages:
+                            self.manifest.record(data.url, response, video_id=id_)
+                        self.manifest.record_video(id_, date, links)
+                    logger.info(f'{done}/{len(ids)} {id_}: {len(pages)} стр.')
+        finally:
+            written = self._writer is not None
+            self._close_writer()
+            if written:
+                # Повторно загруженные статьи дописаны в конец корпуса:
+                # остаётся одна строка на ссылку
+                compact(self.columns_dir)
+            if self._text_stale:
+                self.rebuild_text()
+                self._text_stale = False
+            if self.manifest:
+                self.manifest.save()
+        return report
+
+    def reprocess(self) -> CrawlReport:
+        """
+        Пересобирает страницы и bt.txt из кэша без обращения к сайту.
+
+        Список видео и ссылок берётся из журнала, HTML — из кэша, поэтому
+        после изменения разбора или очистки текста корпус обновляется
+        локально.
+
+        :return: Итог пересборки.
+        """
+        if self.manifest is None or self.cache is None:
+            raise ValueError('Reprocessing requires both a manifest and a cache')
+
+        report = CrawlReport()
+        truncate = True
+        for id_, video in self.manifest.videos.items():
+            try:
+                pages = [BtPage(self.base_url + link, date=video['date'], cache=self.cache, offline=True)
+                         for link in video['links']]
+            except ValueError as e:
+                report.failed[id_] = str(e)
+                continue
+            for page in pages:
+                # Корпус пересобирается с нуля
+                self._write_page(id_, page.get_data(), truncate=truncate)
+                truncate = False
+            if pages:
+                report.saved.append(id_)
+        self.rebuild_text()
+        return report
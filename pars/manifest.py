@@ -0,0 +1,118 @@
+"""
+Журнал обхода для инкрементальной загрузки.
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+import requests
+
+
+def content_hash(content: bytes) -> str:
+    """
+    Хэш содержимого ответа.
+
+    :param content: Тело ответа.
+    :return: SHA-256 в шестнадцатеричном виде.
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+class CrawlManifest:
+    """
+    Журнал уже загруженных ссылок и видео.
+
+    Для каждой ссылки хранятся ETag, Last-Modified и хэш содержимого, для
+    каждого видео — дата и ссылки на статьи. Журнал сохраняется в JSON
+    рядом со страницами (``pages/manifest.json``).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.urls: dict[str, dict] = {}
+        self.videos: dict[str, dict] = {}
+        if self.path.exists():
+            with self.path.open(encoding='utf-8') as f:
+                data = json.load(f)
+            self.urls = data.get('urls', {})
+            self.videos = data.get('videos', {})
+
+    def save(self) -> None:
+        """
+        Атомарно записывает журнал на диск.
+        """
+        with self._lock:
+            data = {'urls': self.urls, 'videos': self.videos}
+            tmp_path = self.path.with_suffix('.tmp')
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open('w', encoding='utf-8') as f:
+                json.dump(data, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def conditional_headers(self, url: str) -> dict[str, str]:
+        """
+        Заголовки условного запроса для уже загруженной ссылки.
+
+        :param url: Ссылка.
+        :return: If-None-Match / If-Modified-Since, если они известны.
+        """
+        entry = self.urls.get(url, {})
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def get(self, url: str) -> Optional[dict]:
+        return self.urls.get(url)
+
+    def is_changed(self, url: str, response: requests.Response) -> bool:
+        """
+        Проверяет, изменилось ли содержимое ссылки с прошлой загрузки.
+
+        :param url: Ссылка.
+        :param response: Новый ответ.
+        :return: False для ответа 304 или совпадающего хэша.
+        """
+        if response.status_code == 304:
+            return False
+        entry = self.urls.get(url)
+        return entry is None or entry.get('sha256') != content_hash(response.content)
+
+    def record(self, url: str, response: requests.Response, **extra) -> None:
+        """
+        Запоминает ответ по ссылке.
+
+        :param url: Ссылка.
+        :param response: Ответ сервера (200 или 304).
+        :param extra: Дополнительные поля записи.
+        """
+        with self._lock:
+            entry = self.urls.setdefault(url, {})
+            if response.status_code != 304:
+                entry['sha256'] = content_hash(response.content)
+            for header, key in (('ETag', 'etag'), ('Last-Modified', 'last_modified')):
+                if response.headers.get(header):
+                    entry[key] = response.headers[header]
+            entry['fetched_at'] = datetime.now(timezone.utc).isoformat()
+            entry.update(extra)
+
+    def has_video(self, id_: str) -> bool:
+        return id_ in self.videos
+
+    def record_video(self, id_: str, date: Optional[str], links: list[str]) -> None:
+        """
+        Запоминает полностью обработанное видео.
+
+        :param id_: Идентификатор видео.
+        :param date: Дата заседания.
+        :param links: Ссылки на статьи.
+        """
+        with self._lock:
+            self.videos[id_] = {'date': date, 'links': links}
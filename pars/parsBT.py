@@ -1,10 +1,17 @@
-import json
+import logging
 import re
+import sys
+from pathlib import Path
 
 import bs4
 import requests
 
+from analysis.metrics import metrics
 from bundestag import BtPage
+from cache import DiskCache
+from columns import compact, open_writer
+from crawler import Crawler
+from manifest import CrawlManifest
 
 __all__ = ['BtPage']
 
@@ -18,37 +25,62 @@ def main():
                   'OR%206861%20OR%206862%20OR%206598%20OR%203097%2'
                   '0OR%203096%20OR%208360')
     ccc = 0
-    for i in range(0, 500, 70):
-        url = master_url.format(i)
+    # Страницы дописываются в колоночный корпус pages/bt (см. columns.py);
+    # JSON-страницы, собранные раньше, сначала переводятся в колонки.
+    # Статьи, загруженные повторно, после записи сжимаются до одной строки
+    # на ссылку, как раньше перезаписывался pages/bt/<id>.json
+    with open_writer(Path('pages/bt')) as writer:
+        for i in range(0, 500, 70):
+            url = master_url.format(i)
 
-        r = requests.get(url)
+            r = requests.get(url)
 
-        if r.status_code != 200:
-            raise ValueError('Unable to fetch page {}: {}'.format(url, r.status_code))
+            if r.status_code != 200:
+                raise ValueError('Unable to fetch page {}: {}'.format(url, r.status_code))
 
-        links_ids = re.findall(r'mediathek\?videoid=(\d+)', r.text)
+            links_ids = re.findall(r'mediathek\?videoid=(\d+)', r.text)
 
-        for id_ in links_ids:
-            rr = requests.get(f'https://www.bundestag.de/mediathekoverlay?videoid={id_}&view=main&videoid={id_}')
-            if rr.status_code != 200:
-                raise ValueError('Unable to fetch page {}: {}'.format(url, rr.status_code))
+            for id_ in links_ids:
+                rr = requests.get(f'https://www.bundestag.de/mediathekoverlay?videoid={id_}&view=main&videoid={id_}')
+                if rr.status_code != 200:
+                    raise ValueError('Unable to fetch page {}: {}'.format(url, rr.status_code))
 
-            data = bs4.BeautifulSoup(rr.text, 'html.parser').find('span', class_='bt-dachzeile')
+                data = bs4.BeautifulSoup(rr.text, 'html.parser').find('span', class_='bt-dachzeile')
 
-            l = re.findall(r'/dokumente/textarchiv[^"]+', rr.text)
-            print(ccc := ccc + 1, data.get_text(strip=True), l)
-            if not l:
-                continue
+                l = re.findall(r'/dokumente/textarchiv[^"]+', rr.text)
+                print(ccc := ccc + 1, data.get_text(strip=True), l)
+                if not l:
+                    continue
 
-            for link in l:
-                p = BtPage('https://www.bundestag.de' + link)
-                p.date = data.get_text(strip=True)
-                with open(f'pages/bt/{id_}.json', 'w', encoding='utf-8') as f:
-                    json.dump(p.get_data().model_dump(), f, indent=4, ensure_ascii=False)
+                for link in l:
+                    p = BtPage('https://www.bundestag.de' + link)
+                    p.date = data.get_text(strip=True)
+                    writer.write_page(id_, p.get_data())
+                    writer.flush()
 
-                with open('pages/bt.txt', 'a', encoding='utf-8') as f:
-                    f.write(str(p.plain_text) + '\n')
+                    with open('pages/bt.txt', 'a', encoding='utf-8') as f:
+                        f.write(str(p.plain_text) + '\n')
+    compact(Path('pages/bt'))
+
+
+def main_concurrent(max_workers: int = 8, refresh: bool = False, offline: bool = False):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    manifest = CrawlManifest(Path('pages/manifest.json'))
+    crawler = Crawler(max_workers=max_workers, manifest=manifest, refresh=refresh, cache=DiskCache(Path('pages/cache')))
+    report = crawler.reprocess() if offline else crawler.crawl()
+    print(f'Сохранено: {len(report.saved)}, без изменений: {len(report.unchanged)}, ошибок: {len(report.failed)}')
+    for id_, error in report.failed.items():
+        print(id_, error)
 
 
 if __name__ == '__main__':
-    main()
+    # --metrics: отчёт по этапам в pages/metrics.json, --profile: статистика cProfile в pages/crawl.prof
+    if '--metrics' in sys.argv or '--profile' in sys.argv:
+        metrics.enable()
+    with metrics.profile(Path('pages/crawl.prof') if '--profile' in sys.argv else None):
+        if '--concurrent' in sys.argv:
+            main_concurrent(refresh='--refresh' in sys.argv, offline='--offline' in sys.argv)
+        else:
+            main()
+    if metrics.enabled:
+        metrics.write(Path('pages/metrics.json'))
@@ -0,0 +1,59 @@
+"""
+Общие настройки тестов.
+
+Тесты запускаются из корня репозитория: ``python -m pytest``. Модули
+импортируются так же, как в скриптах (``analysis.*``, ``pars.*``).
+"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(autouse=True)
+def lexicon_cache(tmp_path, monkeypatch):
+    # Скомпилированные словари тестов не попадают в кэш репозитория
+    import analysis.lexicon
+    monkeypatch.setattr(analysis.lexicon, 'CACHE_DIR', tmp_path / 'lexicons')
+
+
+def write_pages(pages_dir: Path, pages: dict[str, str]) -> Path:
+    """
+    Записывает JSON-страницы так же, как их сохранял parsBT.
+
+    :param pages_dir: Каталог страниц.
+    :param pages: id -> текст страницы.
+    :return: Каталог страниц.
+    """
+    pages_dir.mkdir(parents=True, exist_ok=True)
+    for id_, text in pages.items():
+        page = {'url': f'https://example.org/{id_}', 'title': id_, 'date': '1. Januar 2020', 'text': text}
+        (pages_dir / f'{id_}.json').write_text(json.dumps(page, ensure_ascii=False), encoding='utf-8')
+    return pages_dir
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """
+    Собирает хранилище и позиционный индекс по JSON-страницам.
+
+    :return: Функция: id -> текст страницы -> (хранилище, индекс).
+    """
+    from analysis.corpus import build_corpus
+    from analysis.index import build_index
+    stores = []
+
+    def build(pages: dict[str, str]):
+        pages_dir = write_pages(tmp_path / 'bt', pages)
+        store = build_corpus(tmp_path / 'corpus', pages_dir=pages_dir, text_path=None)
+        stores.append(store)
+        return store, build_index(store)
+
+    yield build
+    for store in stores:
+        store.close()
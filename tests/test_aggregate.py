@@ -0,0 +1,116 @@
+"""
+Итоги, обновляемые по документам: вычитание счётчиков и совпадение
+обновления после изменения корпуса с пересчётом с нуля.
+"""
+import json
+from collections import Counter
+
+import pytest
+
+from analysis.aggregate import DocumentAggregates, document_analyzer, update_aggregates
+from analysis.corpus import build_corpus
+from analysis.index import build_index
+from analysis.lexicon import load_compiled
+from analysis.pipeline import FusedPipeline, TokenAnalyzer
+from pars.columns import ColumnWriter
+
+from conftest import write_pages
+
+PAGES = {
+    'a': 'Die Lage ist gut, die Lage ist schön.',
+    'b': 'Ja, die Lage ist doch schlecht.',
+    'c': 'Angst und Sorge.',
+}
+
+
+class CategoryCounter(TokenAnalyzer):
+    """
+    Счётчик категорий одного словаря.
+    """
+
+    name = 'categories'
+
+    def lexicons(self):
+        return {'es': {'pos': ['gut', 'schön'], 'neg': ['schlecht', 'ist doch schlecht'], 'fear': ['angst']}}
+
+    def consume(self, words, matches):
+        return {'total': Counter(category for category, _, _ in matches['es'])}
+
+
+def test_subtract_inverts_merge():
+    totals = {}
+    first = {'x': {'a': Counter(pos=2, neg=1)}}
+    second = {'x': {'a': Counter(pos=1), 'b': Counter(fear=1)}}
+    FusedPipeline.merge(totals, first)
+    FusedPipeline.merge(totals, second)
+
+    FusedPipeline.subtract(totals, first)
+
+    assert totals == second
+    assert 'neg' not in totals['x']['a']
+
+
+def test_incremental_update_matches_recompute(corpus, tmp_path):
+    lexicon_path = tmp_path / 'es.json'
+    lexicon_path.write_text(json.dumps({'pos': ['gut', 'schön'], 'neg': ['schlecht']}), encoding='utf-8')
+    lexicon = load_compiled(lexicon_path, cache_dir=tmp_path)
+    pipeline = FusedPipeline([CategoryCounter()])
+    keywords = ['Lage']
+
+    store, index = corpus(PAGES)
+    _, delta = update_aggregates(store, index, pipeline, keywords, lexicon, window_size=2)
+    assert sorted(key[1] for key in delta.added) == ['a', 'b', 'c']
+
+    # Изменённая, удалённая и новая страницы, корпус пересобирается
+    (tmp_path / 'bt' / 'c.json').unlink()
+    store, index = corpus({'b': 'Die Lage ist gut.', 'd': 'Schlecht ist die Lage, gut ist sie nicht.'})
+    aggregates, delta = update_aggregates(store, index, pipeline, keywords, lexicon, window_size=2)
+
+    assert [key[1] for key in delta.added] == ['d']
+    assert [key[1] for key in delta.changed] == ['b']
+    assert [key[1] for key in delta.removed] == ['c']
+
+    full = DocumentAggregates(tmp_path / 'full.pickle')
+    full.update(store, document_analyzer(store, index, pipeline, keywords, lexicon, window_size=2))
+    assert aggregates.results() == full.results()
+    assert aggregates.results()['categories'] == pipeline.run(store.iter_words())['categories']
+
+
+def test_unchanged_corpus_is_not_reanalyzed(tmp_path):
+    pages_dir = write_pages(tmp_path / 'bt', PAGES)
+    pipeline = FusedPipeline([CategoryCounter()])
+    with build_corpus(tmp_path / 'corpus', pages_dir=pages_dir, text_path=None) as store:
+        update_aggregates(store, build_index(store), pipeline)
+    with build_corpus(tmp_path / 'corpus', pages_dir=pages_dir, text_path=None) as store:
+        aggregates, delta = update_aggregates(store, build_index(store), pipeline)
+
+    assert delta == ([], [], [])
+    assert aggregates.results('bt')['categories']['total'] == Counter(pos=2, neg=2, fear=1)
+
+
+def test_articles_of_one_video_are_separate_documents(tmp_path):
+    # Все статьи видео записываются под его id (Crawler.save, parsBT)
+    with ColumnWriter(tmp_path / 'bt') as writer:
+        writer.append({'id': '7', 'url': 'https://example.org/a1', 'text': 'Ja, das ist doch gut.'})
+        writer.append({'id': '7', 'url': 'https://example.org/a2', 'text': 'Das ist schlecht.'})
+    pipeline = FusedPipeline([CategoryCounter()])
+
+    with build_corpus(tmp_path / 'corpus', pages_dir=tmp_path / 'bt', text_path=None) as store:
+        aggregates, delta = update_aggregates(store, build_index(store), pipeline)
+
+    assert len(delta.added) == 2
+    assert aggregates.results()['categories']['total'] == Counter(pos=1, neg=1)
+
+
+def test_sources_are_not_summed(tmp_path):
+    pages_dir = write_pages(tmp_path / 'bt', {'a': PAGES['a']})
+    text_path = tmp_path / 'bt.txt'
+    text_path.write_text(PAGES['a'] + '\n', encoding='utf-8')
+    pipeline = FusedPipeline([CategoryCounter()])
+
+    with build_corpus(tmp_path / 'corpus', pages_dir=pages_dir, text_path=text_path) as store:
+        aggregates, _ = update_aggregates(store, build_index(store), pipeline)
+
+    assert aggregates.results('bt')['categories']['total'] == Counter(pos=2)
+    with pytest.raises(ValueError):
+        aggregates.results()
@@ -0,0 +1,98 @@
+"""
+Конкорданс: границы окон, метки на краях и выделение ключевых слов;
+поиск FTS5 против позиционного индекса.
+"""
+import pytest
+
+from analysis.annotate import Annotator, section_tasks
+from analysis.concordance import Annotation, Concordance, batch_concordance
+from analysis.cooccur import KeywordHits
+from analysis.search import SearchIndex, build_search_index, fts5_available
+
+WORDS = 'a b c d e f g h'.split()
+
+
+def test_window_bounds():
+    concordance = Concordance(WORDS)
+
+    first = concordance.line(0, 2)
+    last = concordance.line(7, 2)
+    phrase = concordance.line(3, 1, width=2)
+
+    assert (first.start, first.end) == (0, 3)
+    assert (last.start, last.end) == (5, 8)
+    assert list(first.left(WORDS)) == [] and list(first.right(WORDS)) == ['b', 'c']
+    assert (list(phrase.left(WORDS)), list(phrase.hit(WORDS)), list(phrase.right(WORDS))) == (['c'], ['d', 'e'], ['f'])
+
+
+def test_tags_crossing_window_edges():
+    annotations = [Annotation(0, 2, 'x'), Annotation(2, 3, 'y'), Annotation(4, 6, 'z'), Annotation(7, 8, 'w')]
+    concordance = Concordance(WORDS, annotations)
+
+    line = concordance.line(4, 1)
+
+    # Окно [3, 6): метка [2, 3) кончается до окна, [4, 6) внутри, [0, 2) и [7, 8) снаружи
+    assert line.tags == (Annotation(4, 6, 'z'),)
+    assert concordance.line(2, 1).tags == (Annotation(0, 2, 'x'), Annotation(2, 3, 'y'))
+    assert list(concordance.line(1, 0).tokens(WORDS)) == [('b', 'x', True)]
+    assert list(line.tokens(WORDS)) == [('d', None, False), ('e', 'z', True), ('f', 'z', False)]
+
+
+def test_positions_outside_document_are_skipped():
+    concordance = Concordance(WORDS)
+
+    assert [line.position for line in concordance.lines([-1, 0, 7, 8], 1)] == [0, 7]
+
+
+def test_batch_concordance_reads_each_document_once():
+    documents = {0: WORDS, 1: 'c d x'.split()}
+    reads = []
+
+    def words_of(doc_id):
+        reads.append(doc_id)
+        return documents[doc_id]
+
+    result = batch_concordance(words_of, {'c d': {0: [2], 1: [0]}, 'x': {1: [2]}}, [1, 3])
+
+    assert sorted(reads) == [0, 1]
+    assert [(line.start, line.end) for line in result['c d'][1][0]] == [(1, 5)]
+    assert [(line.start, line.end) for line in result['c d'][3][1]] == [(0, 3)]
+
+
+@pytest.mark.skipif(not fts5_available(), reason='sqlite3 собран без FTS5')
+def test_search_offsets_match_index_positions(corpus, tmp_path):
+    store, index = corpus({
+        'a': 'Die Lage der Nation, die Lage ist ernst.',
+        'b': 'Über die Lage: lage_bericht und Lagebild.',
+        'c': 'Nichts.',
+    })
+
+    with build_search_index(store, tmp_path / 'search.sqlite3') as search:
+        for query in ['lage', 'die lage', 'über', 'lage_bericht', 'ernst', 'fehlt', 'die lage der nation']:
+            assert search.postings(query) == index.postings(query), query
+        assert search.postings('lage*') == {0: [1, 5], 1: [2, 3, 5]}
+
+
+@pytest.mark.skipif(not fts5_available(), reason='sqlite3 собран без FTS5')
+def test_search_index_rebuilt_for_new_corpus(corpus, tmp_path):
+    store, _ = corpus({'a': 'Die Lage ist ernst.'})
+    SearchIndex.open_or_build(store, tmp_path / 'search.sqlite3').close()
+
+    # Те же числа документов и токенов, другой текст
+    store, _ = corpus({'a': 'Die Lage ist gut.'})
+    with SearchIndex.open_or_build(store, tmp_path / 'search.sqlite3') as search:
+        assert search.postings('gut') == {0: [3]}
+        assert search.postings('ernst') == {}
+
+
+def test_multiword_keyword_is_highlighted(corpus):
+    store, index = corpus({'a': 'Wir sehen die Lage der Nation heute.'})
+    results = {'lage der nation': [KeywordHits(0, index.postings('lage der nation')[0], {})]}
+    annotator = Annotator(store.words, {}, 1)
+
+    section, = map(annotator.section, section_tasks(store, results))
+
+    line, = section.lines
+    assert [(line.words[span.start:span.end], span.keyword) for span in line.spans] == [
+        (('die',), False), (('lage', 'der', 'nation'), True), (('heute',), False),
+    ]
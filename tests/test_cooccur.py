@@ -0,0 +1,108 @@
+"""
+Категории в окнах вокруг ключевых слов: границы документа, пропуск
+центра, пересекающиеся окна и порядок категорий, как в исходном m2.
+"""
+import json
+import random
+
+from analysis.cooccur import CategoryPrefixSums, batch_cooccurrence, blocked_window_counts
+from analysis.lexicon import load_compiled
+
+WORDS = {'gut': 'pos', 'schön': 'pos', 'schlecht': 'neg', 'angst': 'fear'}
+
+
+def naive_counts(tokens, centers, size, words):
+    """
+    Подсчёт исходного m2: окна по порядку центров, слева направо, без центра.
+    """
+    counts = {}
+    for center in centers:
+        for i in range(max(center - size, 0), min(center + size + 1, len(tokens))):
+            category = words.get(tokens[i])
+            if i != center and category is not None:
+                counts[category] = counts.get(category, 0) + 1
+    return counts
+
+
+def test_windows_at_document_edges():
+    tokens = 'gut x angst y schlecht'.split()
+    sums = CategoryPrefixSums.from_words(tokens, WORDS)
+
+    assert sums.window_counts([0], 2) == {'fear': 1}
+    assert sums.window_counts([4], 2) == {'fear': 1}
+    assert sums.window_counts([2], 100) == {'pos': 1, 'neg': 1}
+    assert sums.window_counts([0], 0) == {}
+
+
+def test_center_is_not_counted():
+    tokens = 'gut gut x'.split()
+    sums = CategoryPrefixSums.from_words(tokens, WORDS)
+
+    assert sums.window_counts([0], 1) == {'pos': 1}
+    assert sums.window_counts([0, 1], 1) == {'pos': 2}
+
+
+def test_overlapping_windows_counted_separately():
+    tokens = 'x angst y z'.split()
+    sums = CategoryPrefixSums.from_words(tokens, WORDS)
+
+    assert sums.window_counts([0, 2, 3], 2) == {'fear': 3}
+
+
+def test_matches_naive_m2():
+    rng = random.Random(11)
+    vocabulary = list(WORDS) + ['x', 'y', 'z', 'w']
+    for _ in range(200):
+        tokens = rng.choices(vocabulary, k=rng.randint(1, 60))
+        centers = sorted(rng.sample(range(len(tokens)), rng.randint(1, min(5, len(tokens)))))
+        size = rng.randint(0, 8)
+        sums = CategoryPrefixSums.from_words(tokens, WORDS)
+
+        counts = sums.window_counts(centers, size)
+        expected = naive_counts(tokens, centers, size, WORDS)
+        # Сравниваются и значения, и порядок первой встречи
+        assert list(counts.items()) == list(expected.items())
+
+        first = next((center for center in centers if naive_counts(tokens, [center], size, WORDS)), None)
+        assert sums.first_hit(centers, size) == first
+
+
+def test_batch_cooccurrence(corpus, tmp_path):
+    store, index = corpus({
+        'a': 'Die Lage ist gut. Die Lage ist schlecht, sagt der Kanzler.',
+        'b': 'Angst vor der Lage.',
+        'c': 'Nichts davon.',
+    })
+    lexicon_path = tmp_path / 'es.json'
+    lexicon_path.write_text(json.dumps({'pos': ['gut'], 'neg': ['schlecht'], 'fear': ['angst']}), encoding='utf-8')
+    lexicon = load_compiled(lexicon_path, cache_dir=tmp_path)
+
+    results = batch_cooccurrence(store, index, ['Lage', 'der kanzler', 'fehlt'], lexicon, window_size=2)
+
+    assert [(hits.doc_id, hits.positions, hits.counts) for hits in results['lage']] == [
+        (0, [1, 5], {'pos': 2, 'neg': 1}), (1, [3], {}),
+    ]
+    assert [(hits.doc_id, hits.positions, hits.counts) for hits in results['der kanzler']] == [
+        (0, [9], {'neg': 1}),
+    ]
+    assert results['fehlt'] == []
+
+
+def test_blocked_counts_match_whole_stream():
+    rng = random.Random(5)
+    vocabulary = list(WORDS) + ['x', 'y', 'z', 'k']
+    for _ in range(100):
+        tokens = rng.choices(vocabulary, k=rng.randint(1, 80))
+        positions = {}
+        for i, token in enumerate(tokens):
+            if token == 'k':
+                positions.setdefault(token, []).append(i)
+        size = rng.randint(0, 10)
+
+        results = blocked_window_counts(tokens, WORDS, positions, size, block_size=rng.randint(1, 16))
+
+        for keyword, centers in positions.items():
+            first, counts = results[keyword]
+            expected = naive_counts(tokens, centers, size, WORDS)
+            assert list(counts.items()) == list(expected.items())
+            assert first == next((center for center in centers if naive_counts(tokens, [center], size, WORDS)), None)
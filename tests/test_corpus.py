@@ -0,0 +1,30 @@
+"""
+Хранилище корпуса: пересборка при смене или изменении входных данных.
+"""
+from analysis.corpus import CorpusStore, build_corpus, corpus_stale
+
+from conftest import write_pages
+
+
+def test_store_built_from_other_pages_is_stale(tmp_path):
+    first = write_pages(tmp_path / 'first', {'a': 'Erste Seite.'})
+    second = write_pages(tmp_path / 'second', {'a': 'Zweite Seite.'})
+    build_corpus(tmp_path / 'corpus', pages_dir=first, text_path=None).close()
+
+    assert not corpus_stale(tmp_path / 'corpus', first, None)
+    assert corpus_stale(tmp_path / 'corpus', second, None)
+    assert corpus_stale(tmp_path / 'corpus', first, tmp_path / 'bt.txt')
+
+    with CorpusStore.open_or_build(tmp_path / 'corpus', pages_dir=second, text_path=None) as store:
+        assert store.words(0) == ['zweite', 'seite']
+
+
+def test_removed_page_makes_store_stale(tmp_path):
+    pages_dir = write_pages(tmp_path / 'bt', {'a': 'Erste Seite.', 'b': 'Zweite Seite.'})
+    build_corpus(tmp_path / 'corpus', pages_dir=pages_dir, text_path=None).close()
+
+    (pages_dir / 'b.json').unlink()
+
+    assert corpus_stale(tmp_path / 'corpus', pages_dir, None)
+    with CorpusStore.open_or_build(tmp_path / 'corpus', pages_dir=pages_dir, text_path=None) as store:
+        assert len(store) == 1
@@ -0,0 +1,242 @@
+"""
+Обходчик медиатеки против локального HTTP-сервера: пул соединений,
+повторы, ограничение частоты, ошибки в итоге обхода и кэш ответов.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import pars.bundestag
+from pars.cache import DiskCache, MemoryCache
+from pars.columns import ColumnarCorpus
+from pars.crawler import FILTER_PATH, Crawler, RateLimiter
+from pars.manifest import CrawlManifest
+
+LISTING = '<a href="mediathek?videoid=1">1</a><a href="mediathek?videoid=2">2</a>'
+PAGES = {
+    '/mediathekoverlay?videoid=1': '<span class="bt-dachzeile">1. Januar</span>'
+                                   '<a href="/dokumente/textarchiv/a1">a1</a>',
+    '/mediathekoverlay?videoid=2': '<span class="bt-dachzeile">2. Januar</span>'
+                                   '<a href="/dokumente/textarchiv/a2">a2</a>',
+    '/dokumente/textarchiv/a1': '<html><article><h1>Erste</h1><p>Die USA sind gut.</p></article></html>',
+    '/dokumente/textarchiv/a2': '<html><article><h1>Zweite</h1><p>Schon wieder ja.</p></article></html>',
+}
+
+
+class StubSite:
+    """
+    Локальный сайт: страницы списка и статьи, ETag, заданные ошибки и
+    задержка ответа.
+
+    :val hits: Пути запросов в порядке поступления.
+    :val errors: Путь (или начало пути) -> коды ответов, выдаваемые по очереди
+        перед нормальным ответом.
+    :val delay: Задержка каждого ответа, секунд.
+    :val max_active: Наибольшее число одновременно обрабатываемых запросов.
+    """
+
+    def __init__(self):
+        self.hits: list[str] = []
+        self.errors: dict[str, list[int]] = {}
+        self.delay = 0.0
+        self.max_active = 0
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def body(self, path: str):
+        if path.startswith('/ajax/filterlist'):
+            return LISTING
+        return next((body for prefix, body in PAGES.items() if path.startswith(prefix)), None)
+
+    def handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with site._lock:
+                    site.hits.append(self.path)
+                    site._active += 1
+                    site.max_active = max(site.max_active, site._active)
+                    codes = next((codes for prefix, codes in site.errors.items()
+                                  if self.path.startswith(prefix) and codes), None)
+                    error = codes.pop(0) if codes else None
+                try:
+                    time.sleep(site.delay)
+                    body = site.body(self.path)
+                    if error is not None or body is None:
+                        self.send_response(error or 404)
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    etag = f'"{len(body)}-{hash(body)}"'
+                    if self.headers.get('If-None-Match') == etag:
+                        self.send_response(304)
+                        self.end_headers()
+                        return
+                    data = body.encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                finally:
+                    with site._lock:
+                        site._active -= 1
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def site():
+    stub = StubSite()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), stub.handler())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    stub.url = f'http://127.0.0.1:{server.server_port}'
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def plain_text(monkeypatch):
+    # Смысловая очистка требует данных NLTK; обходчику важен только сам текст
+    monkeypatch.setattr(pars.bundestag, 'clean_text', lambda text, strict=True: text)
+
+
+def make_crawler(site, tmp_path, **kwargs) -> Crawler:
+    kwargs.setdefault('per_host_rate', 0)
+    kwargs.setdefault('backoff', 0)
+    return Crawler(site.url, pages_dir=tmp_path, **kwargs)
+
+
+def listing_path(offset: int) -> str:
+    return FILTER_PATH.format(offset)
+
+
+def test_listing_failure_is_reported(site, tmp_path):
+    site.errors[listing_path(70)] = [404]
+    crawler = make_crawler(site, tmp_path, retries=0)
+
+    report = crawler.crawl([0, 70])
+
+    assert sorted(report.saved) == ['1', '2']
+    assert list(report.failed) == [site.url + listing_path(70)]
+
+
+def test_video_failure_does_not_stop_crawl(site, tmp_path):
+    site.errors['/mediathekoverlay?videoid=2'] = [404]
+    crawler = make_crawler(site, tmp_path, retries=0)
+
+    report = crawler.crawl([0])
+
+    assert report.saved == ['1']
+    assert list(report.failed) == ['2']
+    assert (tmp_path / 'bt.txt').read_text(encoding='utf-8') == 'Erste Die USA sind gut.\n'
+
+
+def test_retries_server_errors(site, tmp_path):
+    site.errors['/dokumente/textarchiv/a1'] = [503, 502]
+    crawler = make_crawler(site, tmp_path, retries=2)
+
+    report = crawler.crawl([0])
+
+    assert sorted(report.saved) == ['1', '2']
+    assert site.hits.count('/dokumente/textarchiv/a1') == 3
+
+
+def test_gives_up_after_retries(site, tmp_path):
+    site.errors['/dokumente/textarchiv/a1'] = [503, 503, 503]
+    crawler = make_crawler(site, tmp_path, retries=1)
+
+    report = crawler.crawl([0])
+
+    assert report.saved == ['2']
+    assert list(report.failed) == ['1']
+    assert site.hits.count('/dokumente/textarchiv/a1') == 2
+
+
+def test_pool_limits_concurrency(site, tmp_path):
+    site.delay = 0.05
+    crawler = make_crawler(site, tmp_path, max_workers=2)
+
+    crawler.list_video_ids(range(0, 6 * 70, 70))
+
+    assert site.max_active == 2
+
+
+def test_rate_limiter_spaces_requests_per_host():
+    limiter = RateLimiter(per_second=50)
+    started = time.monotonic()
+    for _ in range(6):
+        limiter.wait('http://a.example/page')
+    same_host = time.monotonic() - started
+
+    started = time.monotonic()
+    for host in 'bcdef':
+        limiter.wait(f'http://{host}.example/page')
+    other_hosts = time.monotonic() - started
+
+    # Шесть запросов к одному хосту — пять интервалов по 20 мс
+    assert same_host >= 0.09
+    assert other_hosts < 0.05
+
+
+def test_unchanged_articles_fill_cache(site, tmp_path):
+    # Первый обход без кэша, второй — с кэшем: неизменившиеся статьи
+    # (ответ 304) догружаются, и корпус пересобирается без сети
+    make_crawler(site, tmp_path, manifest=CrawlManifest(tmp_path / 'manifest.json')).crawl([0])
+    cache = MemoryCache()
+    manifest = CrawlManifest(tmp_path / 'manifest.json')
+
+    report = make_crawler(site, tmp_path, manifest=manifest, cache=cache).crawl([0])
+
+    assert sorted(report.unchanged) == ['1', '2']
+    assert sorted(cache.pages) == [site.url + '/dokumente/textarchiv/a1', site.url + '/dokumente/textarchiv/a2']
+
+    site.hits.clear()
+    report = make_crawler(site, tmp_path, manifest=CrawlManifest(tmp_path / 'manifest.json'), cache=cache).reprocess()
+    assert sorted(report.saved) == ['1', '2']
+    assert site.hits == []
+    assert sorted((tmp_path / 'bt.txt').read_text(encoding='utf-8').splitlines()) == [
+        'Erste Die USA sind gut.', 'Zweite Schon wieder ja.'
+    ]
+
+
+def test_parse_failure_skips_video(site, tmp_path, monkeypatch):
+    # Ссылка без href: разбор статьи падает в parse_relative_url
+    monkeypatch.setitem(PAGES, '/dokumente/textarchiv/a2', '<html><article><a name="x">Anker</a></article></html>')
+    crawler = make_crawler(site, tmp_path)
+
+    report = crawler.crawl([0])
+
+    assert report.saved == ['1']
+    assert list(report.failed) == ['2']
+    assert (tmp_path / 'bt.txt').read_text(encoding='utf-8') == 'Erste Die USA sind gut.\n'
+
+
+def test_recrawl_keeps_one_row_per_article(site, tmp_path):
+    make_crawler(site, tmp_path).crawl([0])
+    make_crawler(site, tmp_path).crawl([0])
+
+    with ColumnarCorpus(tmp_path / 'bt') as corpus:
+        assert sorted(corpus['url']) == [site.url + '/dokumente/textarchiv/a1', site.url + '/dokumente/textarchiv/a2']
+
+
+def test_disk_cache_concurrent_puts(tmp_path):
+    cache = DiskCache(tmp_path)
+    pages = [f'<html>{i}</html>' * 1000 for i in range(8)]
+
+    threads = [threading.Thread(target=cache.put, args=('http://a.example/page', page)) for page in pages]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cache.get('http://a.example/page') in pages
+    assert list(tmp_path.rglob('*.tmp')) == []
@@ -0,0 +1,96 @@
+"""
+Автомат словаря: многословные и перекрывающиеся фразы, категории
+списков и меток, обратный словарь и кэш скомпилированных словарей.
+"""
+import json
+import random
+
+from analysis._utils import tokenize
+from analysis.lexicon import PhraseMatcher, compile_lexicon, load_compiled, word_categories
+
+
+def naive_matches(tokens, lexicon):
+    """
+    Поиск всех фраз словаря перебором позиций.
+    """
+    found = set()
+    for category, phrases in lexicon.items():
+        for phrase in phrases:
+            parts = phrase.split()
+            for start in range(len(tokens) - len(parts) + 1):
+                if list(tokens[start:start + len(parts)]) == parts:
+                    found.add((category, start, start + len(parts)))
+    return found
+
+
+def test_overlapping_phrases():
+    matcher = compile_lexicon({'a': ['hin und'], 'b': ['und her'], 'c': ['hin und her'], 'd': ['und']})
+    tokens = 'hin und her und hin'.split()
+
+    assert sorted(matcher.finditer(tokens), key=lambda m: (m[1], m[2], m[0])) == [
+        ('a', 0, 2), ('c', 0, 3), ('d', 1, 2), ('b', 1, 3), ('d', 3, 4),
+    ]
+
+
+def test_partial_phrase_is_not_matched():
+    matcher = compile_lexicon({'a': ['festen Kurs halten']})
+
+    assert list(matcher.finditer('den festen kurs nicht halten'.split())) == []
+    assert list(matcher.finditer('einen festen kurs halten'.split())) == [('a', 1, 4)]
+
+
+def test_phrase_in_two_categories():
+    matcher = compile_lexicon({'a': ['gut'], 'b': ['Gut', 'sehr gut']})
+
+    assert matcher.count('sehr gut'.split()) == {'a': 1, 'b': 2}
+    assert matcher.categories == ['a', 'b']
+
+
+def test_list_lexicon_and_tags():
+    matcher = PhraseMatcher()
+    matcher.add_lexicon(['Ja', 'doch  mal'], tag='mp')
+    matcher.add_lexicon({'pos': ['ja']}, tag='es')
+
+    assert sorted(matcher.finditer('ja doch mal'.split()), key=str) == [
+        (('es', 'pos'), 0, 1), (('mp', 'doch mal'), 1, 3), (('mp', 'ja'), 0, 1),
+    ]
+
+
+def test_matches_naive_scan():
+    rng = random.Random(7)
+    vocabulary = ['a', 'b', 'c', 'd']
+    lexicon = {
+        category: [' '.join(rng.choices(vocabulary, k=rng.randint(1, 3))) for _ in range(3)]
+        for category in 'xyz'
+    }
+    matcher = compile_lexicon(lexicon)
+    for _ in range(50):
+        tokens = rng.choices(vocabulary, k=rng.randint(0, 40))
+        assert set(matcher.finditer(tokens)) == naive_matches(tokens, lexicon)
+
+
+def test_word_categories_last_wins():
+    assert word_categories({'a': ['Gut', 'schlecht'], 'b': [' gut ', '']}) == {'gut': 'b', 'schlecht': 'a'}
+    assert word_categories(['ja', 'doch']) == {'ja': 'ja', 'doch': 'doch'}
+
+
+def test_load_compiled_rebuilds_changed_file(tmp_path):
+    path = tmp_path / 'es.json'
+    path.write_text(json.dumps({'pos': ['gut']}), encoding='utf-8')
+    first = load_compiled(path, cache_dir=tmp_path / 'cache')
+    assert load_compiled(path, cache_dir=tmp_path / 'cache').digest == first.digest
+
+    path.write_text(json.dumps({'neg': ['gut']}), encoding='utf-8')
+    second = load_compiled(path, cache_dir=tmp_path / 'cache')
+
+    assert second.digest != first.digest
+    assert second.words == {'gut': 'neg'}
+    assert second.matcher.count(['gut']) == {'neg': 1}
+    assert len(list((tmp_path / 'cache').glob('*.pickle'))) == 1
+
+
+def test_punctuated_phrases_match_tokenized_text():
+    matcher = compile_lexicon({'a': ['ich-bewusst'], 'b': ['immer gereizt, verärgert oder']})
+    tokens = tokenize('Er ist ich-bewusst und immer gereizt, verärgert oder müde.')
+
+    assert sorted(matcher.finditer(tokens)) == [('a', 2, 4), ('b', 5, 9)]